@@ -1,193 +1,3114 @@
-from flask import Flask, render_template, redirect, url_for, request, jsonify, session, flash
+from flask import (Flask, render_template, redirect, url_for, request, jsonify, session, flash, g, Response,
+                   stream_with_context, before_render_template, template_rendered)
+from werkzeug.wsgi import ClosingIterator
+import base64
+import binascii
+import bisect
+import contextvars
+import cProfile
+import click
+import functools
+import gzip
+import hashlib
+import heapq
+import itertools
 import json
+import math
 import os
+import queue
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta, timezone # Ensure all are imported
 import uuid
 
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
 app = Flask(__name__)
 app.secret_key = 'dev_secret_key_123!'
 ADMIN_PASSWORD = "admin123"
 
-users = ["Veer", "Vardaan", "Avni", "Drishti"]
-DATA_DIR = "data"
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
+# Seeds the user registry of a fresh data directory; see UserRegistry.
+DEFAULT_USERS = ["Veer", "Vardaan", "Avni", "Drishti"]
+DATA_DIR = "data"
+USERS_FILE = os.path.join(DATA_DIR, "users.json")
+# "json" (one file per user) or "sqlite" (data/taskstar.db); see `flask migrate-to-sqlite`.
+STORAGE_BACKEND = os.environ.get("TASKSTAR_STORAGE", "json")
+SQLITE_FILENAME = "taskstar.db"
+# JSON backend: a journal is folded into its snapshot once it grows past this,
+# or past the snapshot's own size if that is larger (so bulk imports into a big
+# history don't rewrite the snapshot every few hundred tasks).
+JOURNAL_COMPACT_BYTES = int(os.environ.get("TASKSTAR_JOURNAL_COMPACT_BYTES", 256 * 1024))
+JOURNAL_ARCHIVE_DIRNAME = "journal_archive"
+# Star balances live with the user data; the history of star changes is an
+# append-only ledger (data/star_ledger/<user>.jsonl, or a table in SQLite).
+STAR_LEDGER_DIRNAME = "star_ledger"
+STAR_LEDGER_PAGE_SIZE = 50
+# Completed tasks finished more than this many days ago can be moved to
+# data/archive/ (`flask archive-tasks`, or daily when the env flag is set).
+ARCHIVE_DIRNAME = "archive"
+ARCHIVE_HORIZON_DAYS = int(os.environ.get("TASKSTAR_ARCHIVE_HORIZON_DAYS", 90))
+ARCHIVE_ON_DAILY_UPDATE = os.environ.get("TASKSTAR_ARCHIVE_ON_DAILY_UPDATE", "") == "1"
+
+TAB_THEME_COLORS = {
+    "Home": "#4a90e2",      # Blue
+    "Dashboard": "#417505", # Green
+    "Settings": "#777777",  # Grey
+    "Default": "#d0d0d0"
+}
+
+IST = timezone(timedelta(hours=5, minutes=30))
+STARS_PER_COMPLETION = 1
+
+# The daily 'done_yesterday' rollover runs in a background thread; the marker
+# file records the last IST date it ran for, shared by every worker.
+DAILY_UPDATE_MARKER_FILENAME = "daily_update.json"
+DAILY_UPDATE_POLL_SECONDS = 300
+
+# --- Task model ---
+# Field order of a task as written by add_task; files written with this order
+# round-trip byte-for-byte through Task.
+TASK_FIELDS = ("id", "description", "status", "created_at", "due_date", "completed_at",
+               "category", "priority", "color_label", "reflection_note", "reflection_emoji")
+_TASK_FIELD_SET = frozenset(TASK_FIELDS)
+DONE_STATUSES = ('completed', 'done_yesterday')
+
+def _parse_task_timestamp(value):
+    """(UTC epoch seconds, IST date, UTC date) for a stored ISO timestamp. Raises ValueError."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, TypeError) as e:
+        raise ValueError(f"not an ISO timestamp: {value!r}") from e
+    return parsed.timestamp(), parsed.astimezone(IST).date(), parsed.astimezone(timezone.utc).date()
+
+
+class Task:
+    """A loaded task with its timestamps parsed once, at load time.
+
+    Besides the JSON fields (as attributes), a task carries:
+      created_ts / completed_ts               UTC epoch seconds, or None
+      created_date_ist / completed_date_ist   IST calendar dates, or None
+      created_date_utc / completed_date_utc   UTC calendar dates, or None
+      created_ok / completed_ok               False if the stored string is malformed
+                                              (completed_ok is True when completed_at is empty)
+    Assigning created_at / completed_at re-parses them.
+
+    Tasks also answer the dict protocol (task['id'], task.get(), 'x' in task,
+    update(), keys()) so existing code keeps working, and to_dict() returns the
+    original key order plus any unknown keys, so a saved file is byte-for-byte
+    what was loaded.
+    """
+
+    __slots__ = ("id", "description", "status", "due_date", "category", "priority",
+                 "color_label", "reflection_note", "reflection_emoji",
+                 "_created_at", "_completed_at", "_extra", "_key_order",
+                 "created_ts", "created_date_ist", "created_date_utc", "created_ok",
+                 "completed_ts", "completed_date_ist", "completed_date_utc", "completed_ok")
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls.__new__(cls)
+        for field in TASK_FIELDS:
+            setattr(task, field, data.get(field))
+        task._extra = {k: v for k, v in data.items() if k not in _TASK_FIELD_SET}
+        keys = tuple(data)
+        task._key_order = None if keys == TASK_FIELDS else keys
+        return task
+
+    @property
+    def created_at(self):
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+        try:
+            self.created_ts, self.created_date_ist, self.created_date_utc = _parse_task_timestamp(value)
+            self.created_ok = True
+        except ValueError:
+            self.created_ts = self.created_date_ist = self.created_date_utc = None
+            self.created_ok = False
+
+    @property
+    def completed_at(self):
+        return self._completed_at
+
+    @completed_at.setter
+    def completed_at(self, value):
+        self._completed_at = value
+        self.completed_ts = self.completed_date_ist = self.completed_date_utc = None
+        self.completed_ok = True
+        if value:
+            try:
+                self.completed_ts, self.completed_date_ist, self.completed_date_utc = _parse_task_timestamp(value)
+            except ValueError:
+                self.completed_ok = False
+
+    def keys(self):
+        return self._key_order if self._key_order is not None else TASK_FIELDS
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key) if key in _TASK_FIELD_SET else self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key not in self.keys():
+            self._key_order = tuple(self.keys()) + (key,)
+        if key in _TASK_FIELD_SET:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Task, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Task({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys() else default
+
+    def items(self):
+        return ((key, self[key]) for key in self.keys())
+
+    def update(self, changes):
+        for key, value in changes.items():
+            self[key] = value
+
+    def copy(self):
+        return Task.from_dict(self.to_dict())
+
+    def to_dict(self):
+        if self._key_order is None:
+            return {field: getattr(self, field) for field in TASK_FIELDS}
+        return {key: self[key] for key in self._key_order}
+
+
+def as_task(task):
+    return task if isinstance(task, Task) else Task.from_dict(task)
+
+def load_tasks(raw_tasks):
+    return [Task.from_dict(raw) for raw in raw_tasks]
+
+def _json_default(obj):
+    if isinstance(obj, Task):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+TASK_STATUSES = ('pending',) + DONE_STATUSES
+
+def validate_task_record(raw):
+    """Check an imported task against the schema add_task writes and return it
+    as a Task. Missing optional fields become None; unknown keys are kept.
+    Raises ValueError describing the first problem found."""
+    if not isinstance(raw, dict):
+        raise ValueError("task must be a JSON object")
+    if not isinstance(raw.get('id'), str) or not raw['id']:
+        raise ValueError("'id' must be a non-empty string")
+    if not isinstance(raw.get('description'), str):
+        raise ValueError("'description' must be a string")
+    if raw.get('status') not in TASK_STATUSES:
+        raise ValueError(f"'status' must be one of {', '.join(TASK_STATUSES)}")
+    task = Task.from_dict({**{field: None for field in TASK_FIELDS}, **raw})
+    if not task.created_ok:
+        raise ValueError("'created_at' must be an ISO timestamp")
+    if not task.completed_ok:
+        raise ValueError("'completed_at' must be an ISO timestamp or null")
+    if task.due_date:
+        try:
+            date.fromisoformat(task.due_date)
+        except (TypeError, ValueError):
+            raise ValueError("'due_date' must be YYYY-MM-DD or null") from None
+    for field in ("category", "priority", "color_label", "reflection_note", "reflection_emoji"):
+        if isinstance(task[field], (dict, list)):
+            raise ValueError(f"'{field}' must be a scalar")
+    return task
+
+# --- Task queries ---
+TASK_PAGE_SIZE = 100
+MAX_TASK_PAGE_SIZE = 500
+
+def task_sort_key(task):
+    return (task.created_at or "", task.id)
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for anything it didn't produce."""
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(created_at, str) or not isinstance(task_id, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return (created_at, task_id)
+
+def task_filter(statuses=None, due_from=None, due_to=None, category=None):
+    """Predicate for the task query filters; due dates compare as ISO date strings."""
+    def matches(task):
+        if statuses and task.status not in statuses:
+            return False
+        if due_from and not (task.due_date and task.due_date >= due_from):
+            return False
+        if due_to and not (task.due_date and task.due_date <= due_to):
+            return False
+        if category and task.category != category:
+            return False
+        return True
+    return matches
+
+def page_sorted_tasks(keys, ordered, predicate, after=None, limit=TASK_PAGE_SIZE, newest_first=False):
+    """Page through tasks pre-sorted by task_sort_key.
+
+    `after` is the sort key of the last task on the previous page; bisect finds
+    where to resume, so page N costs the same as page 1. Returns (tasks, key of
+    the last task returned if there are more, else None).
+    """
+    if newest_first:
+        start = bisect.bisect_left(keys, after) if after is not None else len(keys)
+        positions = range(start - 1, -1, -1)
+    else:
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        positions = range(start, len(keys))
+    page = []
+    for i in positions:
+        if predicate(ordered[i]):
+            page.append(ordered[i])
+            if len(page) > limit:
+                break
+    next_key = task_sort_key(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_key
+
+
+class SortedTasks:
+    """A user's tasks sorted by task_sort_key, overall and per status.
+
+    Writes insert or remove single entries by bisection, so a write followed
+    by a read doesn't pay for a re-sort. Call discard() before changing a
+    task's created_at, id or status and add() after.
+    """
+
+    def __init__(self, tasks):
+        ordered = sorted(tasks, key=task_sort_key)
+        self.keys = [task_sort_key(task) for task in ordered]
+        self.tasks = ordered
+        self.by_status = {}  # status -> (keys, tasks)
+        for key, task in zip(self.keys, ordered):
+            keys, subset = self.by_status.setdefault(task.status, ([], []))
+            keys.append(key)
+            subset.append(task)
+
+    def get(self, status=None):
+        """(keys, tasks) for every task, or for the tasks with `status`."""
+        if status is None:
+            return self.keys, self.tasks
+        return self.by_status.get(status, ([], []))
+
+    def add(self, task):
+        key = task_sort_key(task)
+        for keys, tasks in ((self.keys, self.tasks), self.by_status.setdefault(task.status, ([], []))):
+            i = bisect.bisect_right(keys, key)
+            keys.insert(i, key)
+            tasks.insert(i, task)
+
+    def discard(self, task):
+        key = task_sort_key(task)
+        for keys, tasks in ((self.keys, self.tasks), self.by_status.get(task.status, ([], []))):
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and tasks[i] is task:
+                del keys[i]
+                del tasks[i]
+
+# --- Request instrumentation ---
+# Each request's wall time is split into phases: "storage" (task store reads
+# and writes), "render" (Jinja) and "compute" (everything else in the view).
+# Phases nest exclusively: time in an inner phase is not also counted in the
+# outer one, so a request's phases add up to its total. Outside a request
+# (CLI commands, the scheduler thread) `timed` is a no-op. The date and
+# aggregation helpers are marked "compute", so their work is not booked as
+# storage when a store call runs them (get_rollup rebuilding a rollup). That
+# includes the archive reads of the get_user_tasks_for_range generators they
+# consume.
+REQUEST_PHASES = ("storage", "compute", "render")
+_request_timer = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """Exclusive seconds per phase for the current request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(REQUEST_PHASES, 0.0)
+        self._stack = [[None, self.started, 0.0]]  # [phase, entered at, seconds in child phases]
+
+    def enter(self, phase):
+        self._stack.append([phase, time.perf_counter(), 0.0])
+
+    def exit(self):
+        phase, entered, children = self._stack.pop()
+        elapsed = time.perf_counter() - entered
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed - children
+        self._stack[-1][2] += elapsed
+
+    def finish(self):
+        """Close phases left open by an exception; returns the request's total seconds."""
+        while len(self._stack) > 1:
+            self.exit()
+        total = time.perf_counter() - self.started
+        self.phases["compute"] = max(0.0, total - sum(v for k, v in self.phases.items() if k != "compute"))
+        return total
+
+@contextmanager
+def timed(phase):
+    """Count the enclosed block, or every call of the decorated function, towards `phase`."""
+    timer = _request_timer.get()
+    if timer is None:
+        yield
+        return
+    timer.enter(phase)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+# --- Task Store ---
+USERS_LOCK = "users"
+
+def write_json_atomic(path, data):
+    """json.dump to a temp file next to `path`, fsync, then os.replace it in."""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def append_jsonl(path, entries):
+    """Append `entries` to a JSON-lines file with one fsync'd write. Call with
+    a lock held that serialises writers of `path`.
+
+    A torn last line left by a crash mid-append is truncated first, so the
+    file only ever holds whole lines. Returns (inode, size after the write).
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    payload = "".join(json.dumps(entry, default=_json_default) + "\n" for entry in entries).encode()
+    fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        st = os.fstat(fd)
+        end = _last_line_end(fd, st.st_size)
+        if end < st.st_size:
+            os.ftruncate(fd, end)
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return st.st_ino, end + len(payload)
+
+def _last_line_end(fd, size, block_size=8192):
+    # Offset just past the file's last newline (0 if it has none).
+    pos = size
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        newline = os.pread(fd, step, pos).rfind(b"\n")
+        if newline >= 0:
+            return pos + newline + 1
+    return 0
+
+def read_jsonl_page(path, before=None, limit=50, block_size=8192):
+    """Newest-first page of a JSON-lines file, read backwards from the end.
+
+    Returns up to `limit` entries that end at or before byte offset `before`
+    (default: the end of the file), and the offset to pass as `before` for
+    the next page, or None on the last page. Only the blocks holding the page
+    are read, so the cost doesn't depend on the file's length. A torn last
+    line (a crash mid-append) is skipped.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return [], None
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size if before is None else max(0, min(before, size))
+        pending = b""  # bytes from `pos` up to the oldest line boundary found so far
+        trim_tail = before is None
+        lines = []  # (start offset, raw line), newest first
+        while pos > 0 and len(lines) <= limit:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            pending = f.read(step) + pending
+            if trim_tail:
+                newline = pending.rfind(b"\n")
+                if newline == -1:
+                    pending = b""
+                    continue
+                pending = pending[:newline + 1]
+                trim_tail = False
+            parts = pending.split(b"\n")[:-1]
+            offset = pos + len(pending)
+            for line in reversed(parts[1:]):
+                offset -= len(line) + 1
+                lines.append((offset, line))
+            pending = pending[:len(parts[0]) + 1] if parts else b""
+        if pos == 0 and pending and len(lines) <= limit:
+            lines.append((0, pending[:-1]))
+    entries = []
+    for _, line in lines[:limit]:
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            print(f"Warning: Skipping unreadable entry in {path} ({e}).")
+    next_before = lines[limit - 1][0] if len(lines) > limit else None
+    return entries, next_before
+
+def iter_json_array(f, chunk_size=64 * 1024):
+    """Yield the items of the top-level JSON array in text file `f` one by one,
+    reading it in chunks so only about one item is held in memory at a time.
+    Raises ValueError if the file isn't a JSON array."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    expect = "["  # then "first" (an item or "]"), then alternately "," and "item"
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("unexpected end of JSON array")
+            chunk = f.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        char = buffer[pos]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("expected a JSON array")
+            pos, expect = pos + 1, "first"
+        elif char == "]" and expect in ("first", ","):
+            return
+        elif expect == ",":
+            if char != ",":
+                raise ValueError(f"expected ',' or ']' in JSON array, got {char!r}")
+            pos, expect = pos + 1, "item"
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            if end is None or (end == len(buffer) and not eof):
+                # The item may continue in the next chunk.
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield item
+            pos, expect = end, ","
+
+def user_lock_name(username):
+    return f"user_{username.lower()}"
+
+
+class StoreLocks:
+    """Named locks shared by the storage backends.
+
+    `locked(name)` is re-entrant for the current thread and exclusive across
+    threads and, through an fcntl lock file in DATA_DIR/.locks, across worker
+    processes. Use `user_lock_name(username)` for a user's tasks and
+    `USERS_LOCK` for the user/star data. When both are needed, take the user
+    lock first.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._thread_locks = {}  # lock name -> RLock
+        self._lock_fds = {}  # lock name -> (fd, depth), only touched while holding the RLock
+
+    @contextmanager
+    def locked(self, name):
+        thread_lock = self._thread_locks.setdefault(name, threading.RLock())
+        with thread_lock:
+            fd, depth = self._lock_fds.get(name, (None, 0))
+            if depth == 0 and fcntl is not None:
+                lock_dir = os.path.join(self.data_dir, ".locks")
+                os.makedirs(lock_dir, exist_ok=True)
+                fd = os.open(os.path.join(lock_dir, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            self._lock_fds[name] = (fd, depth + 1)
+            try:
+                yield
+            finally:
+                fd, depth = self._lock_fds[name]
+                if depth == 1:
+                    del self._lock_fds[name]
+                    if fd is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                        os.close(fd)
+                else:
+                    self._lock_fds[name] = (fd, depth - 1)
+
+
+class _JournaledFile:
+    """In-process state of one snapshot + journal pair (see TaskStore)."""
+
+    __slots__ = ("snapshot_stamp", "journal_ino", "offset", "data", "index", "sorted")
+
+    def __init__(self, snapshot_stamp, journal_ino, offset, data):
+        self.snapshot_stamp = snapshot_stamp
+        self.journal_ino = journal_ino
+        self.offset = offset  # bytes of the journal already replayed into `data`
+        self.data = data
+        self.index = {task.id: task for task in data} if isinstance(data, list) else None
+        self.sorted = None  # SortedTasks, built by the first query_tasks
+
+    # Task lists only: these keep `index` and `sorted` in step with `data`.
+    def add_task(self, task):
+        self.data.append(task)
+        self.index[task.id] = task
+        if self.sorted is not None:
+            self.sorted.add(task)
+
+    def update_task(self, task, changes):
+        if self.sorted is not None:
+            self.sorted.discard(task)
+        task.update(changes)
+        if self.sorted is not None:
+            self.sorted.add(task)
+
+    def pop_task(self, task_id):
+        """Drop a task from `index` and `sorted`; the caller removes it from `data`."""
+        task = self.index.pop(task_id, None)
+        if task is not None and self.sorted is not None:
+            self.sorted.discard(task)
+        return task
+
+
+def journal_entry(op, **fields):
+    return {"at": datetime.now(timezone.utc).isoformat(), "op": op, **fields}
+
+BATCH_OPERATIONS = {"add": 2, "update": 4, "delete": 2, "archive": 2}  # operation -> tuple length
+
+def check_batch_operations(operations):
+    """Raise ValueError unless every item is a well-formed apply_batch operation."""
+    for operation in operations:
+        if not operation or BATCH_OPERATIONS.get(operation[0]) != len(operation):
+            raise ValueError(f"Invalid batch operation: {operation!r}")
+
+class BatchResults(list):
+    """apply_batch's per-operation results; `stars` is the balance after its
+    star award, if any, and `version` the user's version after the write
+    (None if nothing changed)."""
+
+    def __init__(self, results, stars=None, version=None):
+        super().__init__(results)
+        self.stars = stars
+        self.version = version
+
+def star_ledger_entry(reason, amount, remaining_stars):
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "reason": reason,
+        "amount": amount,
+        "remaining_stars": remaining_stars
+    }
+
+
+class TaskStore(StoreLocks):
+    """JSON backend: one data/<user>_tasks.json per user plus data/users.json.
+
+    Tasks and stars are stored as a snapshot plus an append-only journal of
+    the mutations made since (data/<user>_journal.jsonl, data/users_journal.jsonl):
+    one JSON line per add / update / delete / star change. A mutation appends
+    its line instead of rewriting the snapshot, so its cost doesn't grow with
+    the task history. Every entry carries the full resulting state (the task,
+    or the star balance), so replaying an entry twice is harmless. Task entries
+    also carry their change to the daily rollup, whose snapshot
+    (<user>_rollup.json) records how much of the journal it already folds in;
+    the per-user version counters get their own journal.
+
+    The state is snapshot + replayed journal, cached in-process. A read only
+    parses the journal bytes appended since the last read; a replaced snapshot
+    (another worker compacted, or a manual edit) triggers a full reload.
+    Compaction writes a fresh snapshot and moves the old journal to
+    data/journal_archive/, which keeps the audit trail; it runs once a journal
+    outgrows both JOURNAL_COMPACT_BYTES and its snapshot, or via
+    `flask compact-journals`.
+
+    The returned objects are shared with the cache: callers that modify them
+    must save them back under the matching lock.
+
+    Snapshot writes are atomic (temp file + os.replace), so a crash can never
+    leave a truncated file behind. A crash mid-append leaves at most a torn
+    last journal line, which readers ignore and the next append truncates
+    (append_jsonl, shared with the star ledger).
+    """
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.archive = TaskArchive(data_dir)
+        self.recurring = RecurringTemplates(self)
+        self._cache = {}  # path -> (stamp, parsed data)
+        self._journaled = {}  # snapshot path -> _JournaledFile
+        self._versions_copy = None  # (state key, dict) handed out by get_versions
+
+    def task_file(self, username):
+        return os.path.join(self.data_dir, f"{username.lower()}_tasks.json")
+
+    def journal_file(self, username):
+        return os.path.join(self.data_dir, f"{username.lower()}_journal.jsonl")
+
+    @property
+    def users_file(self):
+        return os.path.join(self.data_dir, "users.json")
+
+    @property
+    def users_journal_file(self):
+        return os.path.join(self.data_dir, "users_journal.jsonl")
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+
+    def _stamp_or_none(self, path):
+        try:
+            return self._stamp(path)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, path, decode=None):
+        # Raises FileNotFoundError / json.JSONDecodeError like a plain json.load would.
+        # `decode` post-processes the parsed JSON; its result is what gets cached.
+        try:
+            stamp = self._stamp(path)
+        except FileNotFoundError:
+            self._cache.pop(path, None)
+            raise
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if decode is not None:
+            data = decode(data)
+        self._cache[path] = (stamp, data)
+        return data
+
+    def _write(self, path, data):
+        try:
+            write_json_atomic(path, data)
+            self._cache[path] = (self._stamp(path), data)
+        except BaseException:
+            self._cache.pop(path, None)
+            raise
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._cache.clear()
+            self._journaled.clear()
+        else:
+            self._cache.pop(path, None)
+            self._journaled.pop(path, None)
+
+    # --- Snapshot + journal ---
+    @staticmethod
+    def _read_journal(path, offset):
+        """Entries appended to `path` after byte `offset`, and the offset just
+        past the last complete line. A torn last line is left unread."""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = chunk.rfind(b"\n") + 1
+        entries = []
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"Warning: Skipping unreadable journal entry in {path} ({e}).")
+        return entries, offset + end
+
+    def _load_journaled(self, snapshot_path, journal_path, decode, empty, replay, resume=None):
+        """The cached _JournaledFile for `snapshot_path`, brought up to date.
+
+        `resume`, given the decoded snapshot, returns the (journal inode,
+        offset) it already folds in, or None; replay of that journal then
+        starts at the offset instead of the beginning.
+
+        Raises FileNotFoundError if neither the snapshot nor the journal
+        exists, json.JSONDecodeError if the snapshot is corrupt.
+        """
+        state = self._journaled.get(snapshot_path)
+        for _ in range(3):
+            snapshot_stamp = self._stamp_or_none(snapshot_path)
+            journal_stamp = self._stamp_or_none(journal_path)
+            journal_ino = journal_stamp[0] if journal_stamp else None
+            journal_size = journal_stamp[3] if journal_stamp else 0
+            if snapshot_stamp is None and journal_stamp is None:
+                self._journaled.pop(snapshot_path, None)
+                raise FileNotFoundError(snapshot_path)
+            if (state is not None and state.snapshot_stamp == snapshot_stamp
+                    and state.journal_ino == journal_ino and state.offset <= journal_size):
+                if state.offset < journal_size:
+                    entries, state.offset = self._read_journal(journal_path, state.offset)
+                    for entry in entries:
+                        replay(state, entry)
+                return state
+
+            self._journaled.pop(snapshot_path, None)
+            if snapshot_stamp is None:
+                data = empty()
+            else:
+                with open(snapshot_path, 'r') as f:
+                    data = decode(json.load(f))
+            state = _JournaledFile(snapshot_stamp, journal_ino, 0, data)
+            folded = resume(data) if resume is not None else None
+            if folded and folded[0] == journal_ino and folded[1] <= journal_size:
+                state.offset = folded[1]
+            entries, state.offset = self._read_journal(journal_path, state.offset)
+            for entry in entries:
+                replay(state, entry)
+            # A compaction between the stats and the reads makes us retry;
+            # replaying an already-folded entry is harmless, a missed one isn't.
+            journal_stamp = self._stamp_or_none(journal_path)
+            if (self._stamp_or_none(snapshot_path) == snapshot_stamp
+                    and (journal_stamp[0] if journal_stamp else None) == journal_ino):
+                self._journaled[snapshot_path] = state
+                return state
+        return state
+
+    def _append_journal(self, snapshot_path, journal_path, state, entries, fold=None):
+        """Append `entries` to the journal with one fsync'd write.
+
+        Call with the file's lock held and `state` freshly loaded and already
+        updated in memory. Compacts once the journal outgrows both
+        JOURNAL_COMPACT_BYTES and the snapshot (see _rotate for `fold`).
+        """
+        try:
+            state.journal_ino, state.offset = append_jsonl(journal_path, entries)
+        except BaseException:
+            self._journaled.pop(snapshot_path, None)
+            raise
+        snapshot_size = state.snapshot_stamp[3] if state.snapshot_stamp else 0
+        if state.offset >= max(JOURNAL_COMPACT_BYTES, snapshot_size):
+            self._rotate(snapshot_path, journal_path, state.data, fold)
+
+    def _archive_journal(self, journal_path):
+        if not os.path.exists(journal_path):
+            return
+        archive_dir = os.path.join(self.data_dir, JOURNAL_ARCHIVE_DIRNAME)
+        os.makedirs(archive_dir, exist_ok=True)
+        name = os.path.basename(journal_path)[:-len(".jsonl")]
+        suffix = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        os.replace(journal_path, os.path.join(archive_dir, f"{name}.{suffix}.jsonl"))
+
+    @staticmethod
+    def _journal_end(path):
+        """(inode, offset just past the last complete line) of a journal; (None, 0) if there is none."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None, 0
+        try:
+            st = os.fstat(fd)
+            return st.st_ino, _last_line_end(fd, st.st_size)
+        finally:
+            os.close(fd)
+
+    def _rotate(self, snapshot_path, journal_path, data, fold=None):
+        """Write `data` as the new snapshot and archive the journal it folds in.
+
+        `fold` runs between the two, for state derived from the same journal
+        (the daily rollup) that must be snapshotted before the journal goes.
+        """
+        try:
+            write_json_atomic(snapshot_path, data)
+            if fold is not None:
+                fold()
+            self._archive_journal(journal_path)
+            state = _JournaledFile(self._stamp(snapshot_path), None, 0, data)
+        except BaseException:
+            self._journaled.pop(snapshot_path, None)
+            raise
+        self._journaled[snapshot_path] = state
+        return state
+
+    @staticmethod
+    def _replay_task_entry(state, entry):
+        task_id = entry.get("id")
+        existing = state.index.get(task_id)
+        if entry.get("op") in ("add", "update"):
+            if existing is None:
+                state.add_task(Task.from_dict(entry["task"]))
+            else:
+                state.update_task(existing, entry["task"])
+        elif entry.get("op") in ("delete", "archive") and existing is not None:
+            state.pop_task(task_id)
+            state.data[:] = [task for task in state.data if task is not existing]
+
+    @staticmethod
+    def _replay_users_entry(state, entry):
+        if entry.get("op") == "stars":
+            user_entry = state.data.setdefault(entry["user"], {"stars": 0})
+            user_entry["stars"] = entry["stars"]
+
+    @staticmethod
+    def _replay_rollup_entry(state, entry):
+        if "rollup" in entry:
+            apply_activity_changes(state.data["days"], decode_rollup_delta(entry["rollup"]))
+
+    @staticmethod
+    def _replay_versions_entry(state, entry):
+        if entry.get("op") == "versions":
+            state.data.update(entry["versions"])
+
+    def _task_state(self, username):
+        snapshot_path, journal_path = self.task_file(username), self.journal_file(username)
+        return self._load_journaled(snapshot_path, journal_path, load_tasks, list, self._replay_task_entry)
+
+    def _task_state_for_write(self, username):
+        # Call with the user's lock held.
+        try:
+            return self._task_state(username)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            print(f"Warning: Task file for user {username} is not valid JSON ({e}). Treating it as empty.")
+        return self._rotate_tasks(username, [])
+
+    def _rotate_tasks(self, username, tasks, rescan=False):
+        # The rollup snapshot is rewritten in between, so it covers the rollup
+        # deltas of the journal being archived; `rescan` rebuilds it from `tasks`.
+        return self._rotate(self.task_file(username), self.journal_file(username), tasks,
+                            lambda: self._fold_rollup(username, tasks if rescan else None))
+
+    def _users_state(self):
+        return self._load_journaled(self.users_file, self.users_journal_file, lambda raw: raw, dict,
+                                    self._replay_users_entry)
+
+    def compact(self, username=None):
+        """Fold a journal into a fresh snapshot: the user's tasks, or users.json
+        when `username` is None. Returns the number of journal bytes folded."""
+        if username is None:
+            lock_name, journal_path = USERS_LOCK, self.users_journal_file
+            load = self._users_state
+            rotate = lambda data: self._rotate(self.users_file, journal_path, data)
+        else:
+            lock_name, journal_path = user_lock_name(username), self.journal_file(username)
+            load = lambda: self._task_state(username)
+            rotate = lambda data: self._rotate_tasks(username, data)
+        with self.locked(lock_name):
+            try:
+                state = load()
+            except FileNotFoundError:
+                return 0
+            folded = state.offset
+            if folded or os.path.exists(journal_path):
+                rotate(state.data)
+        return folded
+
+    # --- Tasks ---
+    @timed("storage")
+    def get_tasks(self, username):
+        try:
+            return self._task_state(username).data
+        except FileNotFoundError:
+            return []
+        except json.JSONDecodeError as e:
+            print(f"Warning: Task file for user {username} is not valid JSON ({e}). Treating it as empty.")
+            return []
+
+    def iter_tasks(self, username):
+        """Yield the user's tasks one at a time, streamed from the snapshot on
+        disk with the journal applied, without loading the whole list."""
+        with self.locked(user_lock_name(username)):
+            # Take the snapshot and the (small) journal as one consistent pair;
+            # the open file keeps reading this snapshot even if a compaction
+            # replaces it meanwhile.
+            entries, _ = self._read_journal(self.journal_file(username), 0)
+            try:
+                snapshot = open(self.task_file(username), 'r')
+            except FileNotFoundError:
+                snapshot = None
+        overrides = {}  # task id -> final task dict, or None once deleted
+        for entry in entries:
+            if entry.get("op") in ("add", "update"):
+                overrides[entry.get("id")] = entry["task"]
+            elif entry.get("op") in ("delete", "archive"):
+                overrides[entry.get("id")] = None
+        seen = set()
+        if snapshot is not None:
+            with snapshot:
+                for raw in iter_json_array(snapshot):
+                    task_id = raw.get("id")
+                    if task_id in overrides:
+                        seen.add(task_id)
+                        raw = overrides[task_id]
+                        if raw is None:
+                            continue
+                    yield Task.from_dict(raw)
+        for task_id, raw in overrides.items():
+            if task_id not in seen and raw is not None:
+                yield Task.from_dict(raw)
+
+    @timed("storage")
+    def save_tasks(self, username, tasks):
+        tasks = [as_task(task) for task in tasks]
+        with self.locked(user_lock_name(username)):
+            self._rotate_tasks(username, tasks, rescan=True)
+            self._bump_versions([username])
+
+    @timed("storage")
+    def find_task(self, username, task_id):
+        try:
+            return self._task_state(username).index.get(task_id)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @timed("storage")
+    def apply_batch(self, username, operations, award_stars=None):
+        """Apply a list of task operations under one lock with one journal append.
+
+        Operations are ("add", task), ("update", task_id, changes, only_if_status),
+        ("delete", task_id) and ("archive", task_id). Each journal entry carries
+        the change it makes to the daily rollup (see _rollup_state). Archiving
+        removes the task like a delete but leaves the rollup alone, since the
+        task now lives in the TaskArchive. Returns one result per operation: the added,
+        updated or removed task, or None if the task doesn't exist (or its
+        status isn't `only_if_status`, or, for an add, its id is taken).
+
+        `award_stars` maps those results to a star delta, added to the user's
+        balance before the lock is released so no other write to the user
+        lands in between; the new balance is the results' `stars`. Tasks and
+        stars are still two journal appends, in that order. Either way the
+        user's version moves by one, to the results' `version`.
+        """
+        check_batch_operations(operations)
+        results, entries, removed = [], [], set()
+        stars = version = None
+        with self.locked(user_lock_name(username)):
+            state = self._task_state_for_write(username)
+            for operation in operations:
+                task = None
+                if operation[0] == "add":
+                    task = as_task(operation[1])
+                    if task.id in state.index:
+                        results.append(None)
+                        continue
+                    state.add_task(task)
+                    entries.append(with_rollup_delta(journal_entry("add", id=task.id, task=task), None, task))
+                elif operation[0] == "update":
+                    _, task_id, changes, only_if_status = operation
+                    task = state.index.get(task_id)
+                    if task is not None and (only_if_status is None or task.get('status') == only_if_status):
+                        old_task = task.copy()
+                        state.update_task(task, changes)
+                        entries.append(with_rollup_delta(
+                            journal_entry("update", id=task_id, changes=changes, task=task), old_task, task))
+                    else:
+                        task = None
+                else:
+                    task = state.pop_task(operation[1])
+                    if task is not None:
+                        removed.add(id(task))
+                        entry = journal_entry(operation[0], id=operation[1])
+                        entries.append(with_rollup_delta(entry, task, None) if operation[0] == "delete" else entry)
+                results.append(task)
+            if removed:
+                state.data[:] = [task for task in state.data if id(task) not in removed]
+            if entries:
+                self._append_journal(self.task_file(username), self.journal_file(username), state, entries,
+                                     lambda: self._fold_rollup(username))
+            delta = award_stars(results) if award_stars is not None else 0
+            if delta:
+                stars = self._add_stars(username, delta)
+            if entries or delta:
+                version = self._bump_versions([username])[username.lower()]
+        return BatchResults(results, stars, version)
+
+    def add_task(self, username, task):
+        return self.apply_batch(username, [("add", task)])[0]
+
+    def update_task(self, username, task_id, changes, only_if_status=None):
+        """Apply `changes` to one task. Returns the updated task, or None if it
+        doesn't exist (or its status isn't `only_if_status`)."""
+        return self.apply_batch(username, [("update", task_id, changes, only_if_status)])[0]
+
+    def update_tasks(self, username, changes_by_id):
+        """Apply {task_id: changes} with a single journal append. Returns the updated tasks."""
+        operations = [("update", task_id, changes, None) for task_id, changes in changes_by_id.items() if changes]
+        return [task for task in self.apply_batch(username, operations) if task is not None]
+
+    def delete_task(self, username, task_id):
+        """Remove one task. Returns the removed task, or None if it wasn't there."""
+        return self.apply_batch(username, [("delete", task_id)])[0]
+
+    def _sorted_tasks(self, username):
+        # Built once per loaded state, then kept sorted by the writes and
+        # journal replays that go through the state.
+        try:
+            state = self._task_state(username)
+            if state.sorted is None:
+                with self.locked(user_lock_name(username)):  # no write may slip in mid-build
+                    state = self._task_state(username)
+                    if state.sorted is None:
+                        state.sorted = SortedTasks(state.data)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return SortedTasks([])
+        return state.sorted
+
+    @timed("storage")
+    def query_tasks(self, username, statuses=None, due_from=None, due_to=None, category=None,
+                    after=None, limit=TASK_PAGE_SIZE, newest_first=False):
+        """One page of a user's tasks ordered by (created_at, id); see page_sorted_tasks."""
+        sorted_tasks = self._sorted_tasks(username)
+        if statuses and len(statuses) == 1:
+            keys, ordered = sorted_tasks.get(statuses[0])
+            statuses = None
+        else:
+            keys, ordered = sorted_tasks.get()
+        predicate = task_filter(statuses, due_from, due_to, category)
+        return page_sorted_tasks(keys, ordered, predicate, after, limit, newest_first)
+
+    def rollup_file(self, username):
+        return os.path.join(self.data_dir, f"{username.lower()}_rollup.json")
+
+    def _save_rollup(self, username, buckets):
+        # Call with the user's lock held: the snapshot folds in the whole task journal as it stands.
+        journal_ino, offset = self._journal_end(self.journal_file(username))
+        write_json_atomic(self.rollup_file(username), {
+            "format": ROLLUP_FORMAT,
+            "folded": [journal_ino, offset],
+            "days": {day.isoformat(): buckets[day] for day in sorted(buckets)},
+        })
+
+    def _rollup_state(self, username):
+        # The rollup snapshot plus the "rollup" deltas of the task journal
+        # entries it doesn't fold in yet; a missing snapshot is rebuilt by the caller.
+        rollup_path = self.rollup_file(username)
+
+        def missing():
+            raise FileNotFoundError(rollup_path)
+        return self._load_journaled(rollup_path, self.journal_file(username), decode_rollup, missing,
+                                    self._replay_rollup_entry, resume=lambda data: data["folded"])
+
+    def _fold_rollup(self, username, tasks=None):
+        # Runs mid-rotation, after the task snapshot is written and before the journal is archived.
+        buckets = None
+        if tasks is None:
+            try:
+                buckets = self._rollup_state(username).data["days"]
+            except (FileNotFoundError, ValueError):
+                tasks = self.get_tasks(username)
+        if buckets is None:
+            buckets = bucket_task_activity(self.archive.with_archived(username, tasks))
+        self._save_rollup(username, buckets)
+
+    @timed("storage")
+    def get_rollup(self, username):
+        """Per-IST-day {"created", "completed", "closed"} counts, see bucket_task_activity.
+
+        The result is shared with the cache and must not be modified.
+        """
+        try:
+            return self._rollup_state(username).data["days"]
+        except (FileNotFoundError, ValueError):  # missing, corrupt or outdated
+            return self.rebuild_rollup(username)
+
+    def rebuild_rollup(self, username):
+        with self.locked(user_lock_name(username)):
+            buckets = bucket_task_activity(self.archive.with_archived(username, self.get_tasks(username)))
+            self._save_rollup(username, buckets)
+        return buckets
+
+    def ensure_user(self, username):
+        if not os.path.exists(self.task_file(username)):
+            self.save_tasks(username, [])
+
+    def delete_user(self, username):
+        with self.locked(user_lock_name(username)):
+            self._archive_journal(self.journal_file(username))
+            for path in (self.task_file(username), self.rollup_file(username), self.star_ledger_file(username)):
+                self.invalidate(path)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.archive.delete_user(username)
+            self.recurring.delete_user(username)
+            self._bump_versions([username])
+
+    @timed("storage")
+    def get_user_data(self):
+        return self._users_state().data
+
+    @timed("storage")
+    def save_user_data(self, data, changed_users=None):
+        """Write users.json; `changed_users` limits which version counters are bumped."""
+        with self.locked(USERS_LOCK):
+            self._rotate(self.users_file, self.users_journal_file, data)
+            self._bump_versions(changed_users if changed_users is not None else list(data))
+
+    @timed("storage")
+    def add_stars(self, username, delta, reason=None, only_if_covered=False):
+        """Add `delta` (may be negative) to a user's star balance. Returns the
+        new balance and the user's version after the write.
+
+        With a `reason` the change is also recorded in the star ledger. With
+        `only_if_covered` a change that would leave the balance below zero is
+        refused and None returned.
+        """
+        with self.locked(USERS_LOCK):
+            stars = self._add_stars(username, delta, reason, only_if_covered)
+            if stars is None:
+                return None
+            return stars, self._bump_versions([username])[username.lower()]
+
+    def _add_stars(self, username, delta, reason=None, only_if_covered=False):
+        # add_stars without the version bump.
+        with self.locked(USERS_LOCK):
+            try:
+                state = self._users_state()
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = self._rotate(self.users_file, self.users_journal_file, {})
+            entry = state.data.setdefault(username, {"stars": 0})
+            stars = entry.get("stars", 0) + delta
+            if only_if_covered and stars < 0:
+                return None
+            entry["stars"] = stars
+            self._append_journal(self.users_file, self.users_journal_file, state,
+                                 [journal_entry("stars", user=username, delta=delta, stars=stars)])
+            if reason is not None:
+                self.append_star_ledger(username, [star_ledger_entry(reason, delta, stars)])
+            return stars
+
+    def star_ledger_file(self, username):
+        return os.path.join(self.data_dir, STAR_LEDGER_DIRNAME, f"{username.lower()}.jsonl")
+
+    @timed("storage")
+    def append_star_ledger(self, username, entries):
+        with self.locked(USERS_LOCK):
+            append_jsonl(self.star_ledger_file(username), entries)
+
+    @timed("storage")
+    def get_star_ledger(self, username, before=None, limit=STAR_LEDGER_PAGE_SIZE):
+        """Newest-first page of a user's star history, and the `before` cursor
+        for the next page (None on the last one)."""
+        return read_jsonl_page(self.star_ledger_file(username), before, limit)
+
+    # Per-user version counters, bumped after every write that changes what a
+    # user's pages show (tasks or stars). Used for ETags and cache keys. Kept
+    # as versions.json plus a journal of the bumped counters, like users.json.
+    @property
+    def versions_file(self):
+        return os.path.join(self.data_dir, "versions.json")
+
+    @property
+    def versions_journal_file(self):
+        return os.path.join(self.data_dir, "versions_journal.jsonl")
+
+    def _versions_state(self):
+        return self._load_journaled(self.versions_file, self.versions_journal_file, lambda raw: raw, dict,
+                                    self._replay_versions_entry)
+
+    @timed("storage")
+    def get_versions(self):
+        """{user: version}. A new dict whenever a counter moved, the same one otherwise."""
+        try:
+            state = self._versions_state()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        key = (state.snapshot_stamp, state.journal_ino, state.offset)
+        cached = self._versions_copy
+        if cached is None or cached[0] != key:
+            cached = self._versions_copy = (key, dict(state.data))
+        return cached[1]
+
+    def get_version(self, username):
+        return self.get_versions().get(username.lower(), 0)
+
+    def bump_version(self, username):
+        """Mark the user changed for version-keyed caches; for data kept outside the task files."""
+        self._bump_versions([username])
+
+    def _bump_versions(self, usernames):
+        """Bump the users' version counters; returns {user key: new version}."""
+        if not usernames:
+            return {}
+        with self.locked("versions"):
+            try:
+                state = self._versions_state()
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = self._rotate(self.versions_file, self.versions_journal_file, {})
+            bumped = {}
+            for username in usernames:
+                user_key = username.lower()
+                bumped[user_key] = state.data.get(user_key, 0) + 1
+            state.data.update(bumped)
+            self._append_journal(self.versions_file, self.versions_journal_file, state,
+                                 [journal_entry("versions", versions=bumped)])
+            return bumped
+
+
+class SqliteTaskStore(StoreLocks):
+    """SQLite backend exposing the same interface as TaskStore.
+
+    Tasks live in one table keyed on (user, id) with secondary indexes on
+    status, completed_at and created_at, so single-task mutations are indexed
+    row updates instead of rewriting a user's whole history. The full task
+    dict is kept in `data` (JSON) so the schema stays free-form; the indexed
+    columns are copies of the matching fields.
+
+    get_tasks() caches each user's list in-process and revalidates it
+    against a per-user version counter bumped in the same transaction as
+    every mutation.
+
+    Every mutation also appends a row to `events`, in the same format as the
+    JSON backend's journal entries, as an audit trail. Rows are updated in
+    place, so there is nothing to compact.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            id TEXT NOT NULL,
+            status TEXT,
+            created_at TEXT NOT NULL DEFAULT '',
+            completed_at TEXT,
+            due_date TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user, id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks(user, status);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_completed_at ON tasks(user, completed_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_created_at ON tasks(user, created_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_created_id ON tasks(user, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created_id ON tasks(user, status, created_at, id);
+        CREATE TABLE IF NOT EXISTS users (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            stars INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            user TEXT NOT NULL,
+            day TEXT NOT NULL,
+            created INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user, day)
+        );
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            op TEXT NOT NULL,
+            task_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_events_user ON events(user, seq);
+        CREATE TABLE IF NOT EXISTS star_ledger (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_star_ledger_user ON star_ledger(user, seq);
+    """
+    # PRAGMA user_version: 1 = tasks.created_at holds '' instead of NULL.
+    # Databases created before that keep the nullable column, so the
+    # migration rewrites their NULLs once; writes normalise from then on.
+    # 2 = daily_rollup follows ROLLUP_FORMAT 2; older rows are dropped and
+    # rebuilt by the next get_rollup.
+    SCHEMA_VERSION = 2
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.archive = TaskArchive(data_dir)
+        self.recurring = RecurringTemplates(self)
+        self._local = threading.local()
+        self._cache = {}  # user key -> (version, tasks)
+
+    @property
+    def db_path(self):
+        return os.path.join(self.data_dir, SQLITE_FILENAME)
+
+    @property
+    def conn(self):
+        # One connection per thread; reconnect after a fork or a data_dir change.
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid() or local.path != self.db_path:
+            os.makedirs(self.data_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._migrate(conn)
+            local.conn, local.pid, local.path = conn, os.getpid(), self.db_path
+        return local.conn
+
+    def _migrate(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version < 1:
+                conn.execute("UPDATE tasks SET created_at = '' WHERE created_at IS NULL")
+            if version < 2:
+                conn.execute("DELETE FROM daily_rollup")
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def _transaction(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _user_key(username):
+        return username.lower()
+
+    @staticmethod
+    def _row_values(user_key, task):
+        return (user_key, task['id'], task.get('status'), task.get('created_at') or '',
+                task.get('completed_at'), task.get('due_date'), json.dumps(task.to_dict()))
+
+    def _bump_version(self, conn, user_key):
+        conn.execute(
+            "INSERT INTO user_versions (user, version) VALUES (?, 1) "
+            "ON CONFLICT(user) DO UPDATE SET version = version + 1", (user_key,))
+        return conn.execute("SELECT version FROM user_versions WHERE user = ?", (user_key,)).fetchone()[0]
+
+    @staticmethod
+    def _log_event(conn, user_key, entry):
+        conn.execute("INSERT INTO events (user, op, task_id, data) VALUES (?, ?, ?, ?)",
+                     (user_key, entry["op"], entry.get("id"), json.dumps(entry, default=_json_default)))
+
+    def _version(self, user_key):
+        row = self.conn.execute("SELECT version FROM user_versions WHERE user = ?", (user_key,)).fetchone()
+        return row[0] if row else 0
+
+    @timed("storage")
+    def get_versions(self):
+        return dict(self.conn.execute("SELECT user, version FROM user_versions"))
+
+    def get_version(self, username):
+        return self._version(self._user_key(username))
+
+    def bump_version(self, username):
+        with self._transaction() as conn:
+            self._bump_version(conn, self._user_key(username))
+
+    def invalidate(self, path=None):
+        self._cache.clear()
+        self._local.conn = None
+
+    @timed("storage")
+    def get_tasks(self, username):
+        user_key = self._user_key(username)
+        version = self._version(user_key)
+        cached = self._cache.get(user_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        rows = self.conn.execute("SELECT data FROM tasks WHERE user = ? ORDER BY seq", (user_key,))
+        tasks = [Task.from_dict(json.loads(row[0])) for row in rows]
+        self._cache[user_key] = (version, tasks)
+        return tasks
+
+    def iter_tasks(self, username):
+        rows = self.conn.execute("SELECT data FROM tasks WHERE user = ? ORDER BY seq", (self._user_key(username),))
+        for (data,) in rows:
+            yield Task.from_dict(json.loads(data))
+
+    @timed("storage")
+    def save_tasks(self, username, tasks):
+        tasks = [as_task(task) for task in tasks]
+        user_key = self._user_key(username)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE user = ?", (user_key,))
+            conn.executemany(
+                "INSERT INTO tasks (user, id, status, created_at, completed_at, due_date, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._row_values(user_key, task) for task in tasks))
+            self._replace_rollup(conn, user_key, bucket_task_activity(self.archive.with_archived(username, tasks)))
+            self._bump_version(conn, user_key)
+        self._cache.pop(user_key, None)
+
+    @timed("storage")
+    def find_task(self, username, task_id):
+        row = self.conn.execute("SELECT data FROM tasks WHERE user = ? AND id = ?",
+                                (self._user_key(username), task_id)).fetchone()
+        return Task.from_dict(json.loads(row[0])) if row else None
+
+    def _apply(self, conn, user_key, operation):
+        # One apply_batch operation inside an open transaction.
+        if operation[0] == "add":
+            task = as_task(operation[1])
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO tasks (user, id, status, created_at, completed_at, due_date, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._row_values(user_key, task)).rowcount
+            if not inserted:
+                return None
+            self._log_event(conn, user_key, journal_entry("add", id=task['id'], task=task))
+            self._update_rollup(conn, user_key, None, task)
+            return task
+        task_id = operation[1]
+        row = conn.execute("SELECT data FROM tasks WHERE user = ? AND id = ?", (user_key, task_id)).fetchone()
+        if row is None:
+            return None
+        task = Task.from_dict(json.loads(row[0]))
+        if operation[0] in ("delete", "archive"):
+            conn.execute("DELETE FROM tasks WHERE user = ? AND id = ?", (user_key, task_id))
+            self._log_event(conn, user_key, journal_entry(operation[0], id=task_id))
+            if operation[0] == "delete":
+                self._update_rollup(conn, user_key, task, None)
+            return task
+        _, _, changes, only_if_status = operation
+        if only_if_status is not None and task.get('status') != only_if_status:
+            return None
+        old_task = task.copy()
+        task.update(changes)
+        conn.execute(
+            "UPDATE tasks SET status = ?, created_at = ?, completed_at = ?, due_date = ?, data = ? WHERE user = ? AND id = ?",
+            (task.get('status'), task.get('created_at') or '', task.get('completed_at'), task.get('due_date'),
+             json.dumps(task.to_dict()), user_key, task_id))
+        self._log_event(conn, user_key, journal_entry("update", id=task_id, changes=changes, task=task))
+        self._update_rollup(conn, user_key, old_task, task)
+        return task
+
+    @timed("storage")
+    def apply_batch(self, username, operations, award_stars=None):
+        """Same contract as TaskStore.apply_batch, stars included, in one transaction."""
+        check_batch_operations(operations)
+        user_key = self._user_key(username)
+        stars = version = None
+        with self._transaction() as conn:
+            results = [self._apply(conn, user_key, operation) for operation in operations]
+            delta = award_stars(results) if award_stars is not None else 0
+            if delta:
+                stars = self._add_stars(conn, username, delta)
+            if delta or any(result is not None for result in results):
+                version = self._bump_version(conn, user_key)
+        self._cache.pop(user_key, None)
+        return BatchResults(results, stars, version)
+
+    def add_task(self, username, task):
+        return self.apply_batch(username, [("add", task)])[0]
+
+    def update_task(self, username, task_id, changes, only_if_status=None):
+        return self.apply_batch(username, [("update", task_id, changes, only_if_status)])[0]
+
+    def update_tasks(self, username, changes_by_id):
+        operations = [("update", task_id, changes, None) for task_id, changes in changes_by_id.items() if changes]
+        return [task for task in self.apply_batch(username, operations) if task is not None]
+
+    def delete_task(self, username, task_id):
+        return self.apply_batch(username, [("delete", task_id)])[0]
+
+    @timed("storage")
+    def query_tasks(self, username, statuses=None, due_from=None, due_to=None, category=None,
+                    after=None, limit=TASK_PAGE_SIZE, newest_first=False):
+        sql, params = self._page_query(username, statuses, due_from, due_to, category, after, limit, newest_first)
+        tasks = [Task.from_dict(json.loads(row[0])) for row in self.conn.execute(sql, params)]
+        next_key = task_sort_key(tasks[limit - 1]) if len(tasks) > limit else None
+        return tasks[:limit], next_key
+
+    def _page_query(self, username, statuses, due_from, due_to, category, after, limit, newest_first):
+        """(sql, params) for one query_tasks page, fetching one row extra."""
+        clauses, params = ["user = ?"], [self._user_key(username)]
+        if statuses:
+            clauses.append("status IN (%s)" % ",".join("?" * len(statuses)))
+            params.extend(statuses)
+        if due_from:
+            clauses.append("due_date >= ?")
+            params.append(due_from)
+        if due_to:
+            clauses.append("due_date <= ?")
+            params.append(due_to)
+        if category:
+            clauses.append("json_extract(data, '$.category') = ?")
+            params.append(category)
+        if after is not None:
+            # Bare columns (created_at is never NULL), so the keyset walks
+            # idx_tasks_user_created_id / idx_tasks_user_status_created_id.
+            clauses.append("(created_at, id) %s (?, ?)" % ("<" if newest_first else ">"))
+            params.extend(after)
+        direction = "DESC" if newest_first else "ASC"
+        sql = ("SELECT data FROM tasks WHERE %s ORDER BY created_at %s, id %s LIMIT ?"
+               % (" AND ".join(clauses), direction, direction))
+        return sql, params + [limit + 1]
+
+    def _replace_rollup(self, conn, user_key, buckets):
+        conn.execute("DELETE FROM daily_rollup WHERE user = ?", (user_key,))
+        conn.executemany(
+            "INSERT INTO daily_rollup (user, day, created, completed, closed) VALUES (?, ?, ?, ?, ?)",
+            ((user_key, day.isoformat(), c["created"], c["completed"], c["closed"]) for day, c in buckets.items()))
+
+    def _update_rollup(self, conn, user_key, old_task, new_task):
+        changes = activity_changes(old_task, new_task)
+        days = {}
+        for (day, field), delta in changes.items():
+            days.setdefault(day, {"created": 0, "completed": 0, "closed": 0})[field] += delta
+        for day, delta in days.items():
+            conn.execute(
+                "INSERT INTO daily_rollup (user, day, created, completed, closed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user, day) DO UPDATE SET created = created + excluded.created, "
+                "completed = completed + excluded.completed, closed = closed + excluded.closed",
+                (user_key, day.isoformat(), delta["created"], delta["completed"], delta["closed"]))
+            conn.execute(
+                "DELETE FROM daily_rollup WHERE user = ? AND day = ? AND created = 0 AND completed = 0 AND closed = 0",
+                (user_key, day.isoformat()))
+
+    @timed("storage")
+    def get_rollup(self, username):
+        user_key = self._user_key(username)
+        rows = self.conn.execute(
+            "SELECT day, created, completed, closed FROM daily_rollup WHERE user = ?", (user_key,)).fetchall()
+        if not rows and self.conn.execute("SELECT 1 FROM tasks WHERE user = ? LIMIT 1", (user_key,)).fetchone():
+            return self.rebuild_rollup(username)
+        return {date.fromisoformat(day): {"created": created, "completed": completed, "closed": closed}
+                for day, created, completed, closed in rows}
+
+    def rebuild_rollup(self, username):
+        user_key = self._user_key(username)
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT data FROM tasks WHERE user = ?", (user_key,)).fetchall()
+            active = [Task.from_dict(json.loads(row[0])) for row in rows]
+            buckets = bucket_task_activity(self.archive.with_archived(username, active))
+            self._replace_rollup(conn, user_key, buckets)
+        return buckets
+
+    def ensure_user(self, username):
+        pass  # No per-user file to create.
+
+    def delete_user(self, username):
+        user_key = self._user_key(username)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE user = ?", (user_key,))
+            conn.execute("DELETE FROM daily_rollup WHERE user = ?", (user_key,))
+            conn.execute("DELETE FROM star_ledger WHERE user = ?", (user_key,))
+            self._bump_version(conn, user_key)
+        self._cache.pop(user_key, None)
+        self.archive.delete_user(username)
+        self.recurring.delete_user(username)
+
+    @timed("storage")
+    def get_user_data(self):
+        data = {}
+        for name, stars, extra in self.conn.execute("SELECT name, stars, data FROM users ORDER BY seq"):
+            data[name] = {"stars": stars, **json.loads(extra)}
+        return data
+
+    @timed("storage")
+    def save_user_data(self, data, changed_users=None):
+        with self._transaction() as conn:
+            for name in (changed_users if changed_users is not None else list(data)):
+                self._bump_version(conn, self._user_key(name))
+            conn.execute("DELETE FROM users WHERE name NOT IN (%s)" % ",".join("?" * len(data)), list(data))
+            for name, entry in data.items():
+                extra = {k: v for k, v in entry.items() if k != "stars"}
+                conn.execute(
+                    "INSERT INTO users (name, stars, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET stars = excluded.stars, data = excluded.data",
+                    (name, entry.get("stars", 0), json.dumps(extra)))
+
+    @timed("storage")
+    def add_stars(self, username, delta, reason=None, only_if_covered=False):
+        with self._transaction() as conn:
+            stars = self._add_stars(conn, username, delta, reason, only_if_covered)
+            if stars is None:
+                return None
+            return stars, self._bump_version(conn, self._user_key(username))
+
+    def _add_stars(self, conn, username, delta, reason=None, only_if_covered=False):
+        # add_stars inside an open transaction, without the version bump.
+        user_key = self._user_key(username)
+        row = conn.execute("SELECT stars FROM users WHERE name = ?", (username,)).fetchone()
+        stars = (row[0] if row else 0) + delta
+        if only_if_covered and stars < 0:
+            return None
+        conn.execute(
+            "INSERT INTO users (name, stars, data) VALUES (?, ?, '{}') "
+            "ON CONFLICT(name) DO UPDATE SET stars = excluded.stars", (username, stars))
+        if reason is not None:
+            self._insert_star_ledger(conn, user_key, [star_ledger_entry(reason, delta, stars)])
+        self._log_event(conn, user_key, journal_entry("stars", user=username, delta=delta, stars=stars))
+        return stars
+
+    @staticmethod
+    def _insert_star_ledger(conn, user_key, entries):
+        conn.executemany("INSERT INTO star_ledger (user, data) VALUES (?, ?)",
+                         ((user_key, json.dumps(entry)) for entry in entries))
+
+    @timed("storage")
+    def append_star_ledger(self, username, entries):
+        with self._transaction() as conn:
+            self._insert_star_ledger(conn, self._user_key(username), entries)
+
+    @timed("storage")
+    def get_star_ledger(self, username, before=None, limit=STAR_LEDGER_PAGE_SIZE):
+        clauses, params = ["user = ?"], [self._user_key(username)]
+        if before is not None:
+            clauses.append("seq < ?")
+            params.append(before)
+        rows = self.conn.execute(
+            "SELECT seq, data FROM star_ledger WHERE %s ORDER BY seq DESC LIMIT ?" % " AND ".join(clauses),
+            params + [limit + 1]).fetchall()
+        next_before = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], next_before
+
+    def compact(self, username=None):
+        return 0  # Rows are updated in place; `events` is kept as the audit trail.
+
+
+class TaskArchive:
+    """Old completed tasks moved out of the active store (see archive_old_tasks).
+
+    One gzip NDJSON file per user per month of completion (IST):
+    data/archive/<user>/<YYYY-MM>.ndjson.gz. Files are only ever appended to,
+    one gzip member per archive run, and readers open just the months a date
+    range touches. Used by both storage backends.
+
+    Tasks are written here before they leave the active store, so after an
+    interrupted run a task can show up in both, or twice in one file; readers
+    skip those copies.
+    """
+
+    SUFFIX = ".ndjson.gz"
 
-TAB_THEME_COLORS = {
-    "Home": "#4a90e2",      # Blue
-    "Dashboard": "#417505", # Green
-    "Settings": "#777777",  # Grey
-    "Default": "#d0d0d0"
-}
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def user_dir(self, username):
+        return os.path.join(self.data_dir, ARCHIVE_DIRNAME, username.lower())
+
+    def month_file(self, username, month):
+        return os.path.join(self.user_dir(username), f"{month}{self.SUFFIX}")
+
+    def months(self, username):
+        try:
+            names = os.listdir(self.user_dir(username))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(self.SUFFIX)] for name in names if name.endswith(self.SUFFIX))
+
+    def stamp(self, username):
+        """Changes whenever the user's archive does; for caches built from it."""
+        stamps = []
+        for month in self.months(username):
+            try:
+                st = os.stat(self.month_file(username, month))
+            except FileNotFoundError:
+                continue
+            stamps.append((month, st.st_size, st.st_mtime_ns))
+        return tuple(stamps)
+
+    def append(self, username, tasks):
+        """Append completed tasks to their month files. Call with the user's lock held."""
+        by_month = {}
+        for task in tasks:
+            by_month.setdefault(task.completed_date_ist.strftime('%Y-%m'), []).append(task)
+        os.makedirs(self.user_dir(username), exist_ok=True)
+        for month, month_tasks in sorted(by_month.items()):
+            payload = "".join(json.dumps(task.to_dict()) + "\n" for task in month_tasks).encode()
+            with open(self.month_file(username, month), 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                    f.write(payload)
+                raw.flush()
+                os.fsync(raw.fileno())
+
+    def iter_tasks(self, username, start=None, end=None):
+        """Archived tasks from the months overlapping [start, end] (IST dates,
+        None for an open end). Callers filter the exact dates themselves."""
+        first = start.strftime('%Y-%m') if start else None
+        last = end.strftime('%Y-%m') if end else None
+        for month in self.months(username):
+            if (first and month < first) or (last and month > last):
+                continue
+            path = self.month_file(username, month)
+            seen = set()
+            try:
+                with gzip.open(path, 'rt') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            raw = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            print(f"Warning: Skipping unreadable archived task in {path} ({e}).")
+                            continue
+                        if raw.get("id") in seen:
+                            continue
+                        seen.add(raw.get("id"))
+                        yield Task.from_dict(raw)
+            except (EOFError, OSError) as e:
+                # A member cut short by a crash mid-append; everything before it was read.
+                print(f"Warning: Archive file {path} ends early ({e}).")
+
+    def with_archived(self, username, active_tasks, start=None, end=None):
+        """The active tasks followed by archived ones from iter_tasks(start, end),
+        skipping archived copies of tasks that are still active."""
+        active_ids = set()
+        for task in active_tasks:
+            active_ids.add(task.id)
+            yield task
+        for task in self.iter_tasks(username, start, end):
+            if task.id not in active_ids:
+                yield task
+
+    def delete_user(self, username):
+        shutil.rmtree(self.user_dir(username), ignore_errors=True)
+
+
+class RecurringTemplates:
+    """Recurring task templates, one data/<user>_recurring.json per user (a
+    JSON list). Used by both storage backends; occurrences themselves are not
+    stored until completed (see the Recurring tasks section).
+
+    Reads are cached on the file's stat stamp. Writes take the user's lock and
+    bump the user's version, so page caches, ETags and event streams notice.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._cache = {}  # path -> (stamp, templates)
+
+    def file(self, username):
+        return os.path.join(self.store.data_dir, f"{username.lower()}_recurring.json")
+
+    def get(self, username):
+        path = self.file(username)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(path, None)
+            return []
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(path, 'r') as f:
+                templates = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Warning: Could not read recurring tasks in {path} ({e}).")
+            return cached[1] if cached else []
+        self._cache[path] = (stamp, templates)
+        return templates
+
+    def find(self, username, template_id):
+        return next((t for t in self.get(username) if t["id"] == template_id), None)
+
+    def _save(self, username, templates):
+        write_json_atomic(self.file(username), templates)
+        self.store.bump_version(username)
+
+    def add(self, username, template):
+        with self.store.locked(user_lock_name(username)):
+            self._save(username, self.get(username) + [template])
+        return template
+
+    def remove(self, username, template_id):
+        """Remove a template. Returns it, or None if it wasn't there."""
+        with self.store.locked(user_lock_name(username)):
+            templates = self.get(username)
+            removed = next((t for t in templates if t["id"] == template_id), None)
+            if removed is not None:
+                self._save(username, [t for t in templates if t is not removed])
+        return removed
+
+    def delete_user(self, username):
+        path = self.file(username)
+        self._cache.pop(path, None)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def make_task_store(data_dir, backend=None):
+    backend = backend or STORAGE_BACKEND
+    if backend == "sqlite":
+        return SqliteTaskStore(data_dir)
+    if backend != "json":
+        raise ValueError(f"Unknown TASKSTAR_STORAGE backend '{backend}' (expected 'json' or 'sqlite').")
+    return TaskStore(data_dir)
+
+
+# --- Tenants ---
+# One deployment can serve many households ("tenants"), each with its own data
+# directory laid out like DATA_DIR: TENANTS_DIR/<tenant>/ (create one with
+# `flask create-tenant`). A request picks its tenant by URL prefix
+# (/t/<tenant>/...) or, with TASKSTAR_TENANT_DOMAIN set, by subdomain
+# (<tenant>.<domain>); anything else is the default tenant, served from
+# DATA_DIR as before. TenantMiddleware resolves it before Flask sees the
+# request and moves the prefix into SCRIPT_NAME, so routes and url_for()
+# need no changes.
+#
+# Everything built on a data directory is per tenant: the store (and with it
+# the user registry), the leaderboard, search and due-date indexes and the
+# event broker. Their module-level names are TenantLocal proxies that resolve
+# to the current tenant's object. The page cache is shared, keyed by tenant.
+#
+# Tenants can be spread over nodes with TENANT_MAP_FILE, the same file on
+# every node: {"tenants": {"<tenant>": {"node": "https://b.example",
+# "read_only": false}}}. A node whose TASKSTAR_NODE_URL differs from a
+# tenant's "node" redirects its requests there (307). To move a tenant
+# without downtime, set "read_only" (writes get a 503 with Retry-After,
+# reads go on), copy its directory to the new node, then point "node" at it
+# and drop "read_only". Nodes reread the map whenever the file changes.
+TENANTS_DIR = os.environ.get("TASKSTAR_TENANTS_DIR", os.path.join(DATA_DIR, "tenants"))
+TENANT_DOMAIN = os.environ.get("TASKSTAR_TENANT_DOMAIN", "")
+TENANT_MAP_FILE = os.environ.get("TASKSTAR_TENANT_MAP", os.path.join(DATA_DIR, "tenant_map.json"))
+NODE_URL = os.environ.get("TASKSTAR_NODE_URL", "").rstrip("/")
+TENANT_URL_PREFIX = "/t/"
+TENANT_READ_ONLY_RETRY_SECONDS = 30
+_TENANT_NAME_RE = re.compile(r"[a-z0-9][a-z0-9-]{0,39}")
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Tenant:
+    """The per-tenant objects; None is the default tenant's name."""
+
+    def __init__(self, name, data_dir):
+        self.name = name
+        self.data_dir = data_dir
+        self.task_store = make_task_store(data_dir)
+        self.leaderboard = Leaderboard()
+        self.search_index = SearchIndex()
+        self.due_index = DueIndex()
+        self.event_broker = EventBroker(EVENTS_QUEUE_SIZE)
+
+
+class Tenants:
+    """Tenant objects, created on first use and kept for the life of the worker."""
+
+    def __init__(self):
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def data_dir(name):
+        return DATA_DIR if name is None else os.path.join(TENANTS_DIR, name)
+
+    @staticmethod
+    def exists(name):
+        return name is None or os.path.isdir(os.path.join(TENANTS_DIR, name))
+
+    def get(self, name):
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            with self._lock:
+                tenant = self._tenants.get(name)
+                if tenant is None:
+                    tenant = self._tenants[name] = Tenant(name, self.data_dir(name))
+        return tenant
+
+    def local_names(self):
+        """The default tenant plus every tenant directory this node serves."""
+        try:
+            names = sorted(name for name in os.listdir(TENANTS_DIR)
+                           if _TENANT_NAME_RE.fullmatch(name) and os.path.isdir(os.path.join(TENANTS_DIR, name)))
+        except FileNotFoundError:
+            names = []
+        return [None] + [name for name in names if tenant_map.node_for(name) is None]
+
+
+tenants = Tenants()
+_current_tenant = contextvars.ContextVar("taskstar_tenant", default=None)
+
+
+def current_tenant():
+    return _current_tenant.get() or tenants.get(None)
+
+
+@contextmanager
+def use_tenant(name):
+    token = _current_tenant.set(tenants.get(name))
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+class TenantLocal:
+    """Module-level stand-in for a per-tenant object, e.g. `task_store`."""
+
+    def __init__(self, attr):
+        object.__setattr__(self, "_attr", attr)
+
+    def __getattr__(self, name):
+        return getattr(getattr(current_tenant(), self._attr), name)
+
+    def __setattr__(self, name, value):
+        setattr(getattr(current_tenant(), self._attr), name, value)
+
+
+task_store = TenantLocal("task_store")
 
-IST = timezone(timedelta(hours=5, minutes=30))
 
-# Global variable to track the last run date of the daily update
-LAST_DAILY_UPDATE_RUN_DATE = None
+class TenantMap:
+    """TENANT_MAP_FILE, reread when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._cached = (None, {})  # (stat stamp, tenants)
+
+    def _tenants(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._cached[0] != stamp:
+            try:
+                with open(self.path, 'r') as f:
+                    self._cached = (stamp, json.load(f).get("tenants", {}))
+            except (json.JSONDecodeError, AttributeError) as e:
+                print(f"Warning: Could not read tenant map {self.path} ({e}); keeping the last one.")
+        return self._cached[1]
+
+    def node_for(self, name):
+        """The base URL of the node serving `name`, or None if that is this node."""
+        node = (self._tenants().get(name) or {}).get("node", "").rstrip("/")
+        return node if node and node != NODE_URL else None
+
+    def is_read_only(self, name):
+        return bool((self._tenants().get(name) or {}).get("read_only"))
+
+
+tenant_map = TenantMap(TENANT_MAP_FILE)
+
+
+def resolve_tenant(path, host):
+    """(tenant name or None, URL prefix, remaining path) for a request.
+
+    Raises LookupError for a tenant name that isn't valid.
+    """
+    if path.startswith(TENANT_URL_PREFIX):
+        name, _, rest = path[len(TENANT_URL_PREFIX):].partition("/")
+        if not _TENANT_NAME_RE.fullmatch(name):
+            raise LookupError(f"Invalid tenant '{name}'.")
+        return name, TENANT_URL_PREFIX + name, "/" + rest
+    if TENANT_DOMAIN:
+        hostname = host.rsplit(":", 1)[0].lower()
+        if hostname.endswith("." + TENANT_DOMAIN):
+            name = hostname[:-len(TENANT_DOMAIN) - 1]
+            if not _TENANT_NAME_RE.fullmatch(name):
+                raise LookupError(f"Invalid tenant '{name}'.")
+            return name, "", path
+    return None, "", path
+
+
+def tenant_is_local(name):
+    return tenant_map.node_for(name) is None and Tenants.exists(name)
+
+
+class TenantMiddleware:
+    """Routes each request to its tenant (see the Tenants section)."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    @staticmethod
+    def _error(status, message, headers=None):
+        return Response(json.dumps({"success": False, "message": message}), status=status,
+                        mimetype='application/json', headers=headers)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        try:
+            name, prefix, rest = resolve_tenant(path, environ.get('HTTP_HOST', ''))
+        except LookupError as e:
+            return self._error(404, str(e))(environ, start_response)
+        if name is not None:
+            node = tenant_map.node_for(name)
+            if node is not None:
+                query = environ.get('QUERY_STRING')
+                location = node + environ.get('SCRIPT_NAME', '') + path + (f"?{query}" if query else "")
+                return Response(status=307, headers={"Location": location})(environ, start_response)
+            if tenant_map.is_read_only(name) and environ.get('REQUEST_METHOD') not in _SAFE_METHODS:
+                return self._error(503, f"Tenant '{name}' is read-only while it is being moved; try again shortly.",
+                                   {"Retry-After": str(TENANT_READ_ONLY_RETRY_SECONDS)})(environ, start_response)
+            if not Tenants.exists(name):
+                return self._error(404, f"Tenant '{name}' not found.")(environ, start_response)
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+            environ['PATH_INFO'] = rest
+        _current_tenant.set(tenants.get(name))
+        # Streamed responses (/events) still need the tenant after this returns;
+        # it is cleared once the server closes the response.
+        return ClosingIterator(self.wsgi_app(environ, start_response), lambda: _current_tenant.set(None))
+
+
+app.wsgi_app = TenantMiddleware(app.wsgi_app)
+
+
+# --- User registry ---
+USER_REGISTRY_FILENAME = "user_registry.json"
+
+
+class UserRegistry:
+    """The users, shared by every worker through data/user_registry.json.
+
+    The file holds {"version": n, "users": [names in display order]}. add(),
+    remove() and replace() rewrite it under USERS_LOCK and bump the version.
+    Readers keep the parsed list keyed on the file's stat stamp, so an access
+    costs one os.stat and a change made by another worker is seen on the next
+    one. `name in users` is a set lookup. Used by both storage backends; it
+    follows `task_store`, so pointing that at another data directory brings
+    its users along.
+
+    A missing file is seeded from users.json (every user with star data) or,
+    for a fresh data directory, DEFAULT_USERS.
+
+    `users` reads like the old list: iterate it, index it, len() it.
+    """
+
+    def __init__(self):
+        self._cache = {}  # path -> (stamp, version, names tuple, names frozenset)
+
+    @property
+    def path(self):
+        return os.path.join(task_store.data_dir, USER_REGISTRY_FILENAME)
+
+    def _seed(self, path):
+        with task_store.locked(USERS_LOCK):
+            if os.path.exists(path):
+                return
+            try:
+                names = list(task_store.get_user_data())
+            except (FileNotFoundError, json.JSONDecodeError):
+                names = []
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_json_atomic(path, {"version": 1, "users": names or list(DEFAULT_USERS)})
+
+    def _state(self):
+        path = self.path
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._seed(path)
+            st = os.stat(path)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            names = tuple(data["users"])
+            state = (stamp, data["version"], names, frozenset(names))
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            if cached is None:
+                raise
+            print(f"Warning: Could not read {path} ({e}); keeping the last user list.")
+            return cached
+        self._cache[path] = state
+        return state
+
+    def _write(self, names):
+        # Call with USERS_LOCK held.
+        write_json_atomic(self.path, {"version": self.version + 1, "users": list(names)})
+
+    @property
+    def version(self):
+        return self._state()[1]
+
+    def names(self):
+        return self._state()[2]
+
+    def __iter__(self):
+        return iter(self._state()[2])
+
+    def __len__(self):
+        return len(self._state()[2])
+
+    def __getitem__(self, index):
+        return self._state()[2][index]
+
+    def __contains__(self, name):
+        return name in self._state()[3]
+
+    def add(self, name):
+        """Append `name`; False if it is already registered."""
+        with task_store.locked(USERS_LOCK):
+            if name in self:
+                return False
+            self._write(self.names() + (name,))
+            return True
+
+    def remove(self, name):
+        """Drop `name`; False if it wasn't registered."""
+        with task_store.locked(USERS_LOCK):
+            if name not in self:
+                return False
+            self._write(tuple(n for n in self.names() if n != name))
+            return True
+
+    def replace(self, names):
+        with task_store.locked(USERS_LOCK):
+            self._write(names)
+
+
+users = UserRegistry()
 
 # --- Helper Functions ---
 def get_user_tasks(username):
-    task_file = os.path.join(DATA_DIR, f"{username.lower()}_tasks.json")
-    try:
-        with open(task_file, 'r') as f:
-            tasks = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        tasks = []
-    return tasks
+    return task_store.get_tasks(username)
 
 def save_user_tasks(username, tasks):
-    task_file = os.path.join(DATA_DIR, f"{username.lower()}_tasks.json")
-    with open(task_file, 'w') as f:
-        json.dump(tasks, f, indent=4)
+    task_store.save_tasks(username, tasks)
+
+def _user_data_is_complete(data):
+    return all(isinstance(data.get(u), dict) and "stars" in data[u] for u in users) and not any(
+        isinstance(entry, dict) and "star_history" in entry for entry in data.values()
+    )
 
 def get_all_user_data():
     try:
-        with open(USERS_FILE, 'r') as f:
-            data = json.load(f)
+        data = task_store.get_user_data()
+        if _user_data_is_complete(data):
+            return data
     except (FileNotFoundError, json.JSONDecodeError):
-        data = {user: {"stars": 0, "star_history": []} for user in users}
-        save_all_user_data(data)
-        return data
+        pass
 
-    updated = False
-    for user_name_loop in users:
-        if user_name_loop not in data:
-            data[user_name_loop] = {"stars": 0, "star_history": []}
-            updated = True
-        else:
-            if "stars" not in data[user_name_loop]:
+    # Defaults need to be written: redo the load under the lock so a concurrent
+    # star update from another worker isn't overwritten.
+    with task_store.locked(USERS_LOCK):
+        try:
+            data = task_store.get_user_data()
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {user: {"stars": 0} for user in users}
+            save_all_user_data(data)
+            return data
+
+        updated = False
+        for user_name_loop in users:
+            if user_name_loop not in data:
+                data[user_name_loop] = {"stars": 0}
+                updated = True
+            elif "stars" not in data[user_name_loop]:
                 data[user_name_loop]["stars"] = 0
                 updated = True
-            if "star_history" not in data[user_name_loop]:
-                data[user_name_loop]["star_history"] = []
+        # Older users.json files carry each user's star_history inline; move it
+        # to the star ledger once so users.json only holds balances.
+        for name, entry in data.items():
+            if isinstance(entry, dict) and "star_history" in entry:
+                history = entry.pop("star_history")
+                if history:
+                    task_store.append_star_ledger(name, history)
                 updated = True
-    if updated:
-        save_all_user_data(data)
-    return data
+        if updated:
+            save_all_user_data(data)
+        return data
 
-def save_all_user_data(data):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+def save_all_user_data(data, changed_users=None):
+    task_store.save_user_data(data, changed_users=changed_users)
 
 def update_tasks_done_yesterday_logic():
+    """Move tasks completed yesterday (UTC) to 'done_yesterday', one write per changed user.
+
+    Returns (tasks moved, users changed).
+    """
     today_utc = datetime.now(timezone.utc).date()
     yesterday_utc = today_utc - timedelta(days=1)
     tasks_updated_count = 0
+    users_changed_count = 0
     for username_val in users:
-        user_tasks = get_user_tasks(username_val)
-        user_tasks_changed = False
-        for task in user_tasks:
-            if task.get('status') == 'completed' and task.get('completed_at'):
-                try:
-                    completed_dt = datetime.fromisoformat(task['completed_at'].replace('Z', '+00:00'))
-                    completed_date_utc = completed_dt.astimezone(timezone.utc).date()
-                    if completed_date_utc == yesterday_utc:
-                        task['status'] = 'done_yesterday'
-                        user_tasks_changed = True
-                        tasks_updated_count +=1
-                except ValueError as e:
-                    print(f"Warning: Malformed completed_at for task {task.get('id')} for user {username_val}. Error: {e}. Value: {task.get('completed_at')}")
-                    continue
-            if user_tasks_changed:
-                save_user_tasks(username_val, user_tasks)
-    return tasks_updated_count
+        with task_store.locked(user_lock_name(username_val)):
+            changes_by_id = {}
+            for task in get_user_tasks(username_val):
+                if task.status == 'completed' and task.completed_at:
+                    if not task.completed_ok:
+                        print(f"Warning: Malformed completed_at for task {task.id} for user {username_val}. Value: {task.completed_at}")
+                        continue
+                    if task.completed_date_utc == yesterday_utc:
+                        changes_by_id[task.id] = {'status': 'done_yesterday'}
+            if changes_by_id:
+                tasks_updated_count += len(task_store.update_tasks(username_val, changes_by_id))
+                users_changed_count += 1
+    return tasks_updated_count, users_changed_count
+
+def archive_old_tasks(username, horizon_days=ARCHIVE_HORIZON_DAYS, today_ist=None):
+    """Move the user's completed / done_yesterday tasks finished (IST) more than
+    `horizon_days` ago into the TaskArchive. Returns the number moved.
+    Recurring occurrences stay until they can no longer be completed."""
+    today_ist = today_ist or datetime.now(IST).date()
+    cutoff = today_ist - timedelta(days=horizon_days)
+    with task_store.locked(user_lock_name(username)):
+        old_tasks = [task for task in get_user_tasks(username)
+                     if task.status in DONE_STATUSES and task.completed_date_ist is not None
+                     and task.completed_date_ist < cutoff and not occurrence_completable(task.id, today_ist)]
+        if not old_tasks:
+            return 0
+        task_store.archive.append(username, old_tasks)
+        task_store.apply_batch(username, [("archive", task.id) for task in old_tasks])
+    return len(old_tasks)
+
+def get_user_tasks_for_range(username, start_ist=None, end_ist=None):
+    """Active tasks plus archived ones from the months touching [start_ist, end_ist].
 
+    For analytics that scan tasks over a date range; archive files for other
+    months are never opened. Callers still filter on the exact dates.
+    """
+    return task_store.archive.with_archived(username, get_user_tasks(username), start_ist, end_ist)
+
+# The helpers below take lists of Task objects (as returned by get_user_tasks)
+# and use their pre-parsed date fields.
+@timed("compute")
 def get_completed_on_date_ist(user_tasks, target_date_ist):
     count = 0
     for task in user_tasks:
-        if task.get('status') in ['completed', 'done_yesterday'] and task.get('completed_at'):
-            try:
-                completed_dt_utc = datetime.fromisoformat(task['completed_at'].replace('Z', '+00:00'))
-                completed_dt_ist = completed_dt_utc.astimezone(IST)
-                if completed_dt_ist.date() == target_date_ist:
-                    count += 1
-            except ValueError:
-                continue
+        if task.status in DONE_STATUSES and task.completed_at and task.completed_date_ist == target_date_ist:
+            count += 1
     return count
 
+@timed("compute")
 def get_pending_tasks_on_date_ist(user_tasks, target_date_ist):
     pending_count = 0
     for task in user_tasks:
-        try:
-            created_dt_utc = datetime.fromisoformat(task['created_at'].replace('Z', '+00:00'))
-            created_dt_ist = created_dt_utc.astimezone(IST)
-
-            if created_dt_ist.date() <= target_date_ist:
-                is_completed_on_or_before_target = False
-                if task.get('completed_at'):
-                    completed_dt_utc_task = datetime.fromisoformat(task['completed_at'].replace('Z', '+00:00'))
-                    completed_dt_ist_task = completed_dt_utc_task.astimezone(IST)
-                    if completed_dt_ist_task.date() <= target_date_ist:
-                        is_completed_on_or_before_target = True
-
-                if not is_completed_on_or_before_target:
-                    pending_count += 1
-        except ValueError:
-            print(f"Warning: Malformed created_at or completed_at for task {task.get('id')}. Skipping for pending count on date {target_date_ist}.")
+        if not (task.created_ok and task.completed_ok):
+            print(f"Warning: Malformed created_at or completed_at for task {task.id}. Skipping for pending count on date {target_date_ist}.")
             continue
+
+        if task.created_date_ist <= target_date_ist:
+            closed_day = pending_closed_date_ist(task)
+            if closed_day is None or closed_day > target_date_ist:
+                pending_count += 1
     return pending_count
 
+def pending_closed_date_ist(task):
+    """The IST date a task stops counting as pending, or None while it is open.
+
+    A task is pending from its creation date until it is completed. A
+    recurring occurrence is pending on its own day only, however late it
+    gets completed, like one that never is (see unmaterialized_pending_counts).
+    """
+    created_day, completed_day = task.created_date_ist, task.completed_date_ist
+    if task.get('recurring_id'):
+        if completed_day is not None and completed_day <= created_day:
+            return created_day
+        return created_day + timedelta(days=1)
+    if completed_day is None:
+        return None
+    return max(created_day, completed_day)
+
+@timed("compute")
 def get_tasks_completed_this_week_ist(user_tasks, start_of_week_ist, today_ist):
     count = 0
     end_of_today_ist = today_ist
     for task in user_tasks:
-        if task.get('status') in ['completed', 'done_yesterday'] and task.get('completed_at'):
-            try:
-                completed_dt_utc = datetime.fromisoformat(task['completed_at'].replace('Z', '+00:00'))
-                completed_dt_ist = completed_dt_utc.astimezone(IST)
-                if start_of_week_ist <= completed_dt_ist.date() <= end_of_today_ist:
-                    count += 1
-            except ValueError:
-                continue
+        if task.status in DONE_STATUSES and task.completed_at and task.completed_date_ist is not None:
+            if start_of_week_ist <= task.completed_date_ist <= end_of_today_ist:
+                count += 1
+    return count
+
+# --- Activity aggregation ---
+# The helpers above answer one question per full scan. The insights and home
+# pages need a dozen answers per user, so instead walk the tasks once and
+# bucket them by IST date; every count is then a lookup or a prefix sum.
+def task_activity_contribution(task):
+    """The (ist_date, field) increments one task makes to the activity buckets.
+
+    "completed" counts completions on that date, as get_completed_on_date_ist does.
+    "created"/"closed" feed pending_counts_as_of: a task enters the pending set
+    on its creation date and leaves it on pending_closed_date_ist.
+    Tasks with malformed timestamps are skipped the same way the scan helpers skip them.
+    """
+    if not task.completed_ok:
+        return []
+    parts = []
+    completed_day = task.completed_date_ist
+    if completed_day is not None and task.status in DONE_STATUSES:
+        parts.append((completed_day, "completed"))
+    created_day = task.created_date_ist
+    if created_day is None:
+        return parts
+    parts.append((created_day, "created"))
+    closed_day = pending_closed_date_ist(task)
+    if closed_day is not None:
+        parts.append((closed_day, "closed"))
+    return parts
+
+def activity_changes(old_task=None, new_task=None):
+    """{(ist_date, field): delta} moving the buckets from counting `old_task` to `new_task`."""
+    changes = {}
+    if old_task is not None:
+        for key in task_activity_contribution(old_task):
+            changes[key] = changes.get(key, 0) - 1
+    if new_task is not None:
+        for key in task_activity_contribution(new_task):
+            changes[key] = changes.get(key, 0) + 1
+    return {key: delta for key, delta in changes.items() if delta}
+
+def apply_activity_changes(buckets, changes):
+    """Add activity_changes output to `buckets`, dropping days left empty."""
+    for (day, field), delta in changes.items():
+        bucket = buckets.get(day)
+        if bucket is None:
+            bucket = buckets[day] = {"created": 0, "completed": 0, "closed": 0}
+        bucket[field] += delta
+        if not any(bucket.values()):
+            del buckets[day]
+
+# The JSON store journals rollup changes as {"YYYY-MM-DD": {field: delta}}.
+# ROLLUP_FORMAT changes whenever what a task contributes does, so stored
+# rollups counted the old way get rebuilt.
+ROLLUP_FORMAT = 2  # 2: occurrences are pending on their own day only
+def with_rollup_delta(entry, old_task=None, new_task=None):
+    """Add the rollup change of replacing `old_task` by `new_task` to a task journal entry."""
+    days = {}
+    for (day, field), delta in activity_changes(old_task, new_task).items():
+        days.setdefault(day.isoformat(), {})[field] = delta
+    if days:
+        entry["rollup"] = days
+    return entry
+
+def decode_rollup_delta(days):
+    return {(date.fromisoformat(day), field): delta for day, fields in days.items() for field, delta in fields.items()}
+
+def decode_rollup(raw):
+    """A parsed <user>_rollup.json as {"folded": [journal inode, offset] or None, "days": buckets}.
+
+    Raises ValueError for a rollup counted by other rules (an older
+    ROLLUP_FORMAT, or the bare {day: counts} map from before the journal
+    carried deltas); callers rebuild it.
+    """
+    if not isinstance(raw, dict) or raw.get("format") != ROLLUP_FORMAT:
+        raise ValueError("rollup written under older counting rules")
+    return {"folded": raw["folded"], "days": {date.fromisoformat(day): counts for day, counts in raw["days"].items()}}
+
+@timed("compute")
+def bucket_task_activity(user_tasks):
+    """Return {ist_date: {"created": n, "completed": n, "closed": n}} in one pass."""
+    buckets = {}
+    for task in user_tasks:
+        for day, field in task_activity_contribution(task):
+            bucket = buckets.get(day)
+            if bucket is None:
+                bucket = buckets[day] = {"created": 0, "completed": 0, "closed": 0}
+            bucket[field] += 1
+    return buckets
+
+def completed_on(buckets, target_date_ist):
+    bucket = buckets.get(target_date_ist)
+    return bucket["completed"] if bucket else 0
+
+def completed_between(buckets, start_date_ist, end_date_ist):
+    count = 0
+    day = start_date_ist
+    while day <= end_date_ist:
+        count += completed_on(buckets, day)
+        day += timedelta(days=1)
     return count
 
-@app.before_request
-def run_daily_updates_if_needed():
-    global LAST_DAILY_UPDATE_RUN_DATE
-    # It's important to use a consistent timezone for checking the date.
-    # Since update_tasks_done_yesterday_logic uses UTC for its primary date logic,
-    # we should probably use UTC date here for consistency of "day".
-    # Or, use IST date if we want the trigger to be based on IST midnight.
-    # Let's use IST date for the trigger, as the app is IST-centric for users.
-    today_ist_date = datetime.now(IST).date()
-
-    if LAST_DAILY_UPDATE_RUN_DATE != today_ist_date:
-        print(f"Running daily 'done_yesterday' update. Previous run: {LAST_DAILY_UPDATE_RUN_DATE}, Today (IST): {today_ist_date}")
-        try:
-            tasks_updated_count = update_tasks_done_yesterday_logic()
-            LAST_DAILY_UPDATE_RUN_DATE = today_ist_date
-            print(f"Daily update complete. {tasks_updated_count} tasks moved to 'done_yesterday'. Last run date set to: {LAST_DAILY_UPDATE_RUN_DATE}")
-        except Exception as e:
-            print(f"Error during automatic daily update: {e}")
-            # Optionally, you could prevent setting LAST_DAILY_UPDATE_RUN_DATE if it fails,
-            # so it tries again on the next request. For now, we'll set it to avoid constant retries on errors.
-            # However, for robustness, error handling here could be more sophisticated.
-            # If the error is critical, maybe don't update the date to retry.
-            # If it's a minor task-specific error, updating the date might be okay.
-            # The current update_tasks_done_yesterday_logic has some internal error handling (prints warnings).
-            LAST_DAILY_UPDATE_RUN_DATE = today_ist_date # Still update to prevent spamming logs if one task is problematic
-            print(f"Daily update attempted, but an error occurred. Last run date set to: {LAST_DAILY_UPDATE_RUN_DATE} to prevent immediate retry.")
+@timed("compute")
+def pending_counts_as_of(buckets, target_dates_ist):
+    """Pending count at the end of each target date, via one prefix sum over the buckets."""
+    results = {}
+    targets = sorted(set(target_dates_ist))
+    running = 0
+    bucket_days = sorted(buckets)
+    i = 0
+    for target in targets:
+        while i < len(bucket_days) and bucket_days[i] <= target:
+            bucket = buckets[bucket_days[i]]
+            running += bucket["created"] - bucket["closed"]
+            i += 1
+        results[target] = running
+    return results
+
+# --- Recurring tasks ---
+# A recurring template ("water the plants", daily) stands for one task per
+# day it occurs on. Those occurrences are computed, never stored, until one
+# is completed: completing occurrence id "<template id>@<YYYY-MM-DD>" stores
+# a completed task under that id, created at the start of that IST day. So
+# storage grows with templates plus completions, not with calendar days, and
+# a completed occurrence counts in the rollups like any task.
+#
+# An occurrence counts as pending on its own day only, whether it is
+# completed late or never: the insights and home counts add each shown day's
+# unmaterialized occurrences, a stored one leaves the pending set the day
+# after its own (pending_closed_date_ist), and missed days don't pile up. Views list the
+# occurrences of the days they show (task_view: today).
+RECURRING_FREQUENCIES = ("daily", "weekly")
+RECURRING_MAX_INTERVAL = 52
+RECURRING_MAX_WINDOW_DAYS = 62
+OCCURRENCE_ID_SEPARATOR = "@"
+
+
+def occurrence_id(template_id, day):
+    return f"{template_id}{OCCURRENCE_ID_SEPARATOR}{day.isoformat()}"
+
+def parse_occurrence_id(task_id):
+    """(template id, date) for an occurrence id, else None."""
+    template_id, sep, day = task_id.rpartition(OCCURRENCE_ID_SEPARATOR)
+    if not sep or not template_id:
+        return None
+    try:
+        return template_id, date.fromisoformat(day)
+    except ValueError:
+        return None
+
+def occurrence_completable(task_id, today_ist):
+    """Whether `task_id` is an occurrence that can still be completed.
+
+    A completed occurrence is only known to be done while it is in the
+    active store, so the window never reaches past ARCHIVE_HORIZON_DAYS, and
+    archive_old_tasks keeps occurrences inside it whatever its horizon.
+    """
+    parsed = parse_occurrence_id(task_id)
+    if parsed is None:
+        return False
+    window = min(RECURRING_MAX_WINDOW_DAYS, ARCHIVE_HORIZON_DAYS)
+    return today_ist - timedelta(days=window) <= parsed[1] <= today_ist
+
+def make_recurring_template(description, freq, start_date, interval=1, weekdays=None, until=None, category=None):
+    """A validated template dict. Raises ValueError on bad input.
+
+    `weekdays` (0 = Monday) only applies to weekly templates and defaults to
+    the start date's weekday; `interval` repeats every N days or weeks.
+    """
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("Task description cannot be empty.")
+    if freq not in RECURRING_FREQUENCIES:
+        raise ValueError(f"'freq' must be one of: {', '.join(RECURRING_FREQUENCIES)}.")
+    start = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+    if until is not None and date.fromisoformat(until) < start:
+        raise ValueError("'until' is before the start date.")
+    if not isinstance(interval, int) or not 1 <= interval <= RECURRING_MAX_INTERVAL:
+        raise ValueError(f"'interval' must be between 1 and {RECURRING_MAX_INTERVAL}.")
+    template = {
+        "id": str(uuid.uuid4()),
+        "description": description.strip(),
+        "freq": freq,
+        "interval": interval,
+        "start_date": start.isoformat(),
+        "until": until,
+        "category": category,
+        "created_at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+    }
+    if freq == "weekly":
+        weekdays = sorted(set(weekdays)) if weekdays else [start.weekday()]
+        if not all(isinstance(d, int) and 0 <= d <= 6 for d in weekdays):
+            raise ValueError("'weekdays' must be numbers from 0 (Monday) to 6 (Sunday).")
+        template["weekdays"] = weekdays
+    return template
+
+def recurring_occurs_on(template, day):
+    start = date.fromisoformat(template["start_date"])
+    if day < start or (template.get("until") and day > date.fromisoformat(template["until"])):
+        return False
+    interval = template.get("interval", 1)
+    if template["freq"] == "daily":
+        return (day - start).days % interval == 0
+    weeks = ((day - timedelta(days=day.weekday())) - (start - timedelta(days=start.weekday()))).days // 7
+    return weeks % interval == 0 and day.weekday() in template.get("weekdays", [start.weekday()])
+
+def occurrence_task(template, day):
+    """The task dict an occurrence stands for (pending, due and created on `day`)."""
+    created = datetime.combine(day, datetime.min.time(), tzinfo=IST).astimezone(timezone.utc)
+    task = new_task(template["description"], day.isoformat())
+    task.update(id=occurrence_id(template["id"], day),
+                created_at=created.isoformat().replace('+00:00', 'Z'),
+                category=template.get("category"),
+                recurring_id=template["id"])
+    return task
+
+def get_occurrences(username, start_ist, end_ist):
+    """[(day, template, task)] for every occurrence in [start_ist, end_ist], by day.
+
+    `task` is the stored task once the occurrence was completed (a Task), or
+    the unstored pending occurrence (a dict) otherwise. Costs one lookup per
+    occurrence, whatever the size of the task history.
+    """
+    templates = task_store.recurring.get(username)
+    occurrences = []
+    day = start_ist
+    while day <= end_ist:
+        for template in templates:
+            if recurring_occurs_on(template, day):
+                stored = task_store.find_task(username, occurrence_id(template["id"], day))
+                occurrences.append((day, template, stored if stored is not None else occurrence_task(template, day)))
+        day += timedelta(days=1)
+    return occurrences
+
+@timed("compute")
+def unmaterialized_pending_counts(username, target_dates_ist):
+    """{date: occurrences on that date not completed}; added to the pending counts for that date only."""
+    templates = task_store.recurring.get(username)
+    counts = {}
+    for day in set(target_dates_ist):
+        counts[day] = sum(1 for template in templates if recurring_occurs_on(template, day)
+                          and task_store.find_task(username, occurrence_id(template["id"], day)) is None)
+    return counts
+
+def completed_occurrence(username, task_id, completed_at, today_ist=None):
+    """The completed task to store for an occurrence, or None if `task_id` is
+    not an occurrence on or before today."""
+    if not occurrence_completable(task_id, today_ist or datetime.now(IST).date()):
+        return None
+    template_id, day = parse_occurrence_id(task_id)
+    template = task_store.recurring.find(username, template_id)
+    if template is None or not recurring_occurs_on(template, day):
+        return None
+    task = occurrence_task(template, day)
+    task.update(status='completed', completed_at=completed_at)
+    return task
+
+def materialize_occurrence(username, task_id, completed_at, today_ist=None):
+    """Store a completed occurrence. Returns the task, or None if `task_id` is
+    not an occurrence on or before today, or it was already completed."""
+    task = completed_occurrence(username, task_id, completed_at, today_ist)
+    if task is None:
+        return None
+    return task_store.add_task(username, task)  # None if the id is already stored
+
+def complete_operations(username, task_id, completed_at):
+    """apply_batch operations completing `task_id`; at most one of them applies.
+
+    A pending task is updated. A recurring occurrence is stored the first
+    time it is completed, by an add that fails once its id is taken.
+    """
+    operations = [("update", task_id, {'status': 'completed', 'completed_at': completed_at}, 'pending')]
+    occurrence = completed_occurrence(username, task_id, completed_at)
+    if occurrence is not None:
+        operations.append(("add", occurrence))
+    return operations
+
+# --- Daily update scheduler ---
+# The rollover used to run in a before_request hook, so the first request after
+# IST midnight paid for it, once per worker. It now runs on a background thread
+# in every worker; the marker file plus a store lock make sure only one of them
+# does the work for a given IST date.
+_daily_scheduler_pid = None
+
+def daily_update_marker_path():
+    return os.path.join(task_store.data_dir, DAILY_UPDATE_MARKER_FILENAME)
+
+def read_daily_update_marker():
+    try:
+        with open(daily_update_marker_path(), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def run_daily_update(force=False):
+    """Run the rollover for today's IST date unless another worker already did.
+
+    Returns the marker dict for the run, or None when it was skipped.
+    """
+    today_ist_date = datetime.now(IST).date().isoformat()
+    if not force and read_daily_update_marker().get("last_run_date") == today_ist_date:
+        return None
+    with task_store.locked("daily_update"):
+        # Re-check under the lock: a worker that waited here finds the marker
+        # already written by the one that ran.
+        if not force and read_daily_update_marker().get("last_run_date") == today_ist_date:
+            return None
+        started = datetime.now(timezone.utc)
+        marker = {"last_run_date": today_ist_date, "started_at": started.isoformat(), "error": None}
+        try:
+            marker["tasks_updated"], marker["users_changed"] = update_tasks_done_yesterday_logic()
+            if ARCHIVE_ON_DAILY_UPDATE:
+                marker["tasks_archived"] = sum(archive_old_tasks(username) for username in users)
+        except Exception as e:
+            # Still record the date so a persistent error doesn't retry every poll;
+            # the error is surfaced through /daily_update_status.
+            print(f"Error during daily update: {e}")
+            marker["tasks_updated"], marker["users_changed"], marker["error"] = 0, 0, str(e)
+        finished = datetime.now(timezone.utc)
+        marker["finished_at"] = finished.isoformat()
+        marker["duration_seconds"] = round((finished - started).total_seconds(), 3)
+        write_json_atomic(daily_update_marker_path(), marker)
+    if marker["tasks_updated"] or marker.get("tasks_archived"):
+        page_cache.invalidate()
+        for username in users:
+            publish_event("sync", username)
+    print(f"Daily update for {today_ist_date}: {marker['tasks_updated']} tasks moved to 'done_yesterday' "
+          f"across {marker['users_changed']} users in {marker['duration_seconds']}s."
+          + (f" {marker['tasks_archived']} tasks archived." if "tasks_archived" in marker else ""))
+    return marker
+
+def _seconds_until_next_ist_midnight():
+    now = datetime.now(IST)
+    next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=IST)
+    return (next_midnight - now).total_seconds()
+
+def _daily_update_loop():
+    while True:
+        for tenant_name in tenants.local_names():
+            try:
+                with use_tenant(tenant_name):
+                    run_daily_update()
+            except Exception as e:
+                print(f"Error in daily update scheduler{f' (tenant {tenant_name})' if tenant_name else ''}: {e}")
+        # Wake at midnight, and at least every poll interval in case the clock jumps.
+        time.sleep(max(1, min(DAILY_UPDATE_POLL_SECONDS, _seconds_until_next_ist_midnight() + 1)))
+
+def start_daily_update_scheduler():
+    global _daily_scheduler_pid
+    if _daily_scheduler_pid == os.getpid():
+        return
+    _daily_scheduler_pid = os.getpid()
+    threading.Thread(target=_daily_update_loop, name="daily-update", daemon=True).start()
+
+@app.before_request
+def ensure_daily_update_scheduler():
+    # Cheap after the first request; also restarts the thread in forked workers.
+    if _daily_scheduler_pid != os.getpid():
+        start_daily_update_scheduler()
+
+@app.route('/daily_update_status')
+def daily_update_status():
+    marker = read_daily_update_marker()
+    return jsonify({
+        "last_run": marker or None,
+        "scheduler_running_in_this_worker": _daily_scheduler_pid == os.getpid(),
+        "next_check_in_seconds": round(min(DAILY_UPDATE_POLL_SECONDS, _seconds_until_next_ist_midnight()), 1)
+    })
+
+
+# --- Page cache ---
+# index, dashboard and insights only change when a task or star count changes
+# or the date rolls over. Rendered pages are cached under a key made of the page
+# name, the tenant and the URL prefix it was reached under (script_root, which
+# pages embed in their links), whether pages stream live updates, the per-user
+# version counters of everyone shown, and the IST and UTC dates, so another
+# worker's write (which bumps the versions) also misses.
+# Mutating routes additionally call page_cache.invalidate() to free memory early.
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("TASKSTAR_PAGE_CACHE_BYTES", 8 * 1024 * 1024))
+
+
+class PageCache:
+    """Byte-bounded LRU of rendered pages with hit/miss counters."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> bytes
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+
+page_cache = PageCache(PAGE_CACHE_MAX_BYTES)
+
+def cached_page(page_name):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (page_name, current_tenant().name, request.script_root, live_updates_enabled(),
+                   users_etag(page_name, users, datetime.now(IST).date()),
+                   datetime.now(timezone.utc).date())
+            body = page_cache.get(key)
+            if body is not None:
+                return app.response_class(body, mimetype='text/html')
+            rendered = view(*args, **kwargs)
+            if isinstance(rendered, str):
+                page_cache.put(key, rendered.encode('utf-8'))
+            return rendered
+        return wrapper
+    return decorator
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(page_cache.stats())
+
+
+# --- Metrics and profiling ---
+# Counters are per worker process; Prometheus scrapes each worker and sums.
+# With TASKSTAR_PROFILE_SAMPLE_RATE set (0..1), that fraction of requests runs
+# under cProfile and the stats are written to data/profiles/ for
+# `python -m pstats` or snakeviz. Streamed bodies (exports) finish after the
+# profile is stopped, so only their setup is captured.
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_SAMPLE_RATE = float(os.environ.get("TASKSTAR_PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIRNAME = "profiles"
+
+
+def _prometheus_labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class RequestMetrics:
+    """Request counts, latency histograms and phase totals, rendered in Prometheus text format."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = {}   # (endpoint, method, status) -> count
+        self.durations = {}  # endpoint -> [count per bucket..., count over the last bucket]
+        self.duration_sums = {}  # endpoint -> (seconds, count)
+        self.phase_seconds = {}  # (endpoint, phase) -> seconds
+        self.profiles_written = 0
+
+    def observe(self, endpoint, method, status, total, phases):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            counts = self.durations.setdefault(endpoint, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, total)] += 1
+            seconds, count = self.duration_sums.get(endpoint, (0.0, 0))
+            self.duration_sums[endpoint] = (seconds + total, count + 1)
+            for phase, value in phases.items():
+                self.phase_seconds[(endpoint, phase)] = self.phase_seconds.get((endpoint, phase), 0.0) + value
+
+    def count_profile(self):
+        with self._lock:
+            self.profiles_written += 1
+
+    def render(self, cache_stats):
+        out = ["# HELP taskstar_requests_total Requests handled by this worker.",
+               "# TYPE taskstar_requests_total counter"]
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                out.append(f"taskstar_requests_total{_prometheus_labels(endpoint=endpoint, method=method, status=status)} {count}")
+            out += ["# HELP taskstar_request_duration_seconds Request wall time, excluding streamed bodies.",
+                    "# TYPE taskstar_request_duration_seconds histogram"]
+            for endpoint, counts in sorted(self.durations.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    out.append(f"taskstar_request_duration_seconds_bucket{_prometheus_labels(endpoint=endpoint, le=bound)} {cumulative}")
+                seconds, count = self.duration_sums[endpoint]
+                out.append(f"taskstar_request_duration_seconds_sum{_prometheus_labels(endpoint=endpoint)} {seconds:.6f}")
+                out.append(f"taskstar_request_duration_seconds_count{_prometheus_labels(endpoint=endpoint)} {count}")
+            out += ["# HELP taskstar_request_phase_seconds_total Request time by phase (storage, compute, render).",
+                    "# TYPE taskstar_request_phase_seconds_total counter"]
+            for (endpoint, phase), seconds in sorted(self.phase_seconds.items()):
+                out.append(f"taskstar_request_phase_seconds_total{_prometheus_labels(endpoint=endpoint, phase=phase)} {seconds:.6f}")
+            out += ["# HELP taskstar_profiles_written_total Sampled request profiles written to disk.",
+                    "# TYPE taskstar_profiles_written_total counter",
+                    f"taskstar_profiles_written_total {self.profiles_written}"]
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            out += [f"# TYPE taskstar_page_cache_{name}_total counter",
+                    f"taskstar_page_cache_{name}_total {cache_stats[name]}"]
+        for name in ("entries", "bytes", "max_bytes"):
+            out += [f"# TYPE taskstar_page_cache_{name} gauge", f"taskstar_page_cache_{name} {cache_stats[name]}"]
+        return "\n".join(out) + "\n"
+
+
+request_metrics = RequestMetrics(REQUEST_DURATION_BUCKETS)
+
+@app.before_request
+def start_request_instrumentation():
+    g.request_timer = RequestTimer()
+    _request_timer.set(g.request_timer)
+    g.profiler = None
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is already active
+            return
+        g.profiler = profiler
+
+@app.after_request
+def record_request_metrics(response):
+    timer = g.get('request_timer')
+    if timer is None:
+        return response
+    total = timer.finish()
+    request_metrics.observe(request.endpoint or "unmatched", request.method, str(response.status_code),
+                            total, timer.phases)
+    response.headers['Server-Timing'] = ", ".join(
+        [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timer.phases.items()]
+        + [f"total;dur={total * 1000:.2f}"])
+    return response
+
+@app.teardown_request
+def finish_request_instrumentation(exc):
+    _request_timer.set(None)
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    directory = os.path.join(task_store.data_dir, PROFILE_DIRNAME)
+    filename = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{request.endpoint or 'unmatched'}-{os.getpid()}.prof"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, filename))
+        request_metrics.count_profile()
+    except OSError as e:
+        print(f"Warning: could not write request profile {filename}: {e}")
+
+def _enter_render_phase(sender, template, context, **extra):
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.enter("render")
+
+def _exit_render_phase(sender, template, context, **extra):
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.exit()
+
+before_render_template.connect(_enter_render_phase, app)
+template_rendered.connect(_exit_render_phase, app)
+
+@app.route('/metrics')
+def metrics():
+    return Response(request_metrics.render(page_cache.stats()), mimetype='text/plain; version=0.0.4')
+
+
+# --- Live events ---
+# Open pages subscribe to /events (server-sent events) and patch themselves.
+# Mutations in this worker are pushed straight to its streams with the task
+# or star data. Writes made by other workers (or events dropped because a
+# stream fell behind) are caught by polling the per-user version counters:
+# a stream that sees a version it hasn't had an event for sends a "sync"
+# event and the page refetches that user from the JSON API.
+EVENTS_POLL_SECONDS = 2
+EVENTS_QUEUE_SIZE = 256
+# Streams end after this long and the browser reconnects, so a worker thread
+# isn't held forever by a client that went away without closing.
+EVENTS_MAX_STREAM_SECONDS = 600
+EVENTS_RETRY_MS = 3000
+# Each open stream holds a WSGI worker thread for up to
+# EVENTS_MAX_STREAM_SECONDS, so streaming needs a server that can spare
+# them: the threaded dev server, gunicorn's gthread or gevent workers, or
+# asgi.py (which serves /events on its event loop). On gunicorn's default
+# sync workers a few open pages would take every worker. "auto" streams
+# only when the WSGI server reports itself multithreaded; "1" always
+# streams (e.g. gevent workers, which don't), "0" never. Pages that can't
+# stream poll /api/versions every LIVE_POLL_SECONDS instead.
+LIVE_UPDATES = os.environ.get("TASKSTAR_LIVE_UPDATES", "auto")
+LIVE_POLL_SECONDS = 15
+
+
+class EventBroker:
+    """Fans events out to this worker's open /events streams."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def subscribe(self, subscription=None):
+        """Register a queue for events; anything with put_nowait() raising queue.Full will do."""
+        if subscription is None:
+            subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            self._next_id += 1
+            event = dict(event, id=self._next_id)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                pass  # the stream's version poll turns the gap into a "sync" event
+
+
+event_broker = TenantLocal("event_broker")
+
+@app.template_global()
+def live_updates_enabled():
+    """Whether pages should hold an /events stream (see LIVE_UPDATES)."""
+    if LIVE_UPDATES == "auto":
+        return bool(request.environ.get("wsgi.multithread"))
+    return LIVE_UPDATES == "1"
+
+def publish_event(kind, username, **fields):
+    """Push a "task", "stars" or "sync" event for `username` to this worker's streams."""
+    if not event_broker.has_subscribers():
+        return
+    event_broker.publish({"type": kind, "user": username, "version": task_store.get_version(username), **fields})
+
+def publish_users_changed():
+    # Users added or removed: pages reload, since their layout depends on the list.
+    if event_broker.has_subscribers():
+        event_broker.publish({"type": "users", "user": None, "version": None, "users": list(users),
+                              "users_version": users.version})
+
+def format_sse(event, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event['type']}", "data: " + json.dumps(event, default=_json_default), "", ""]
+    return "\n".join(lines)
+
+
+class EventStream:
+    """What one /events connection has sent so far, shared by the WSGI route and asgi.py."""
+
+    def __init__(self, versions):
+        self.users_version = users.version
+        self.seen = {name.lower(): versions.get(name.lower(), 0) for name in users}
+
+    def hello(self):
+        return f"retry: {EVENTS_RETRY_MS}\n" + format_sse(
+            {"type": "hello", "versions": {name: self.seen.get(name.lower(), 0) for name in users}})
+
+    def render(self, events):
+        out = []
+        for event in events:
+            if event.get("user") is not None:
+                key = event["user"].lower()
+                self.seen[key] = max(self.seen.get(key, 0), event["version"])
+            elif event["type"] == "users":
+                self.users_version = max(self.users_version, event["users_version"])
+            out.append(format_sse(event, event["id"]))
+        return "".join(out)
+
+    def sync_events(self, versions):
+        """A sync event for each user whose version moved past what this stream has
+        sent, or a users event if another worker added or removed a user."""
+        users_version = users.version
+        if users_version > self.users_version:
+            self.users_version = users_version
+            return format_sse({"type": "users", "user": None, "version": None, "users": list(users),
+                               "users_version": users_version})
+        out = []
+        for name in users:
+            version = versions.get(name.lower(), 0)
+            if version > self.seen.get(name.lower(), 0):
+                self.seen[name.lower()] = version
+                out.append(format_sse({"type": "sync", "user": name, "version": version}))
+        return "".join(out)
+
+@app.route('/events')
+def events():
+    if not live_updates_enabled():
+        return Response(status=204)  # tells EventSource not to reconnect
+
+    def stream():
+        subscription = event_broker.subscribe()
+        try:
+            state = EventStream(task_store.get_versions())
+            yield state.hello()
+            started = last_poll = time.monotonic()
+            while time.monotonic() - started < EVENTS_MAX_STREAM_SECONDS:
+                pending = []
+                try:
+                    pending.append(subscription.get(timeout=EVENTS_POLL_SECONDS))
+                    while True:
+                        pending.append(subscription.get_nowait())
+                except queue.Empty:
+                    pass
+                out = state.render(pending)
+                if time.monotonic() - last_poll >= EVENTS_POLL_SECONDS:
+                    last_poll = time.monotonic()
+                    out += state.sync_events(task_store.get_versions())
+                # An empty poll still writes a comment, which is how a closed
+                # connection is noticed.
+                yield out or ": keepalive\n\n"
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # --- Routes ---
-@app.route('/')
-def index():
+@timed("compute")
+def build_home_summary(today_ist):
     home_dashboard_data = {}
     user_data_global = get_all_user_data()
-
-    today_ist = datetime.now(IST).date()
     yesterday_ist = today_ist - timedelta(days=1)
 
     for user_name in users:
-        user_tasks = get_user_tasks(user_name)
+        # Served from the persisted daily rollup: O(days), no task file is read.
+        activity = task_store.get_rollup(user_name)
 
-        # Current pending count for the main summary cards
-        current_total_pending_count = 0
-        for task in user_tasks:
-            if task.get('status') == 'pending':
-                 current_total_pending_count +=1
+        # Current pending count for the main summary cards, today's open recurring tasks included
+        current_total_pending_count = (pending_counts_as_of(activity, [today_ist])[today_ist]
+                                       + unmaterialized_pending_counts(user_name, [today_ist])[today_ist])
 
-        completed_today_count = get_completed_on_date_ist(user_tasks, today_ist)
-        completed_yesterday_count = get_completed_on_date_ist(user_tasks, yesterday_ist)
+        completed_today_count = completed_on(activity, today_ist)
+        completed_yesterday_count = completed_on(activity, yesterday_ist)
 
         home_dashboard_data[user_name] = {
             "stars": user_data_global.get(user_name, {}).get("stars", 0),
@@ -195,15 +3116,42 @@ def index():
             "completed_today": completed_today_count,
             "completed_yesterday": completed_yesterday_count
         }
+    return home_dashboard_data
 
+@app.route('/')
+@cached_page('index')
+def index():
+    today_ist = datetime.now(IST).date()
     return render_template("index.html",
-                           home_dashboard_data=home_dashboard_data,
+                           home_dashboard_data=build_home_summary(today_ist),
+                           due_widget=build_due_widget(today_ist),
+                           due_widget_size=DUE_WIDGET_SIZE,
                            users=users,
                            active_tab="Home",
                            tab_theme_colors=TAB_THEME_COLORS,
                            current_date_str=today_ist.strftime('%A, %B %d, %Y'),
                            admin_mode=session.get('is_admin_mode', False))
 
+def task_query_args(args):
+    """Filters shared by the task view and the task page API. Raises ValueError on bad input."""
+    statuses = [value for value in args.get('status', '').split(',') if value]
+    for bound in ('due_from', 'due_to'):
+        if args.get(bound):
+            date.fromisoformat(args[bound])
+    return {
+        "statuses": statuses or None,
+        "due_from": args.get('due_from') or None,
+        "due_to": args.get('due_to') or None,
+        "category": args.get('category') or None,
+    }
+
+def task_page_limit(args):
+    return max(1, min(args.get('limit', TASK_PAGE_SIZE, type=int), MAX_TASK_PAGE_SIZE))
+
+# The view pages each section separately: pending oldest-first as before, the
+# history sections newest-first so recent work shows up on the first page.
+TASK_VIEW_SECTIONS = (("pending", False), ("completed", True), ("done_yesterday", True))
+
 @app.route('/task_view')
 def main_app_view():
     requested_user_param = request.args.get('user')
@@ -216,13 +3164,38 @@ def main_app_view():
     else:
         target_users_to_load.extend(users)
 
+    try:
+        filters = task_query_args(request.args)
+        limit = task_page_limit(request.args)
+        cursors = {status: decode_cursor(request.args[f"{status}_cursor"])
+                   for status, _ in TASK_VIEW_SECTIONS if request.args.get(f"{status}_cursor")}
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main_app_view', user=display_single_user))
+    filter_params = {k: v for k, v in request.args.items() if k in ('status', 'due_from', 'due_to', 'category', 'limit')}
+
     all_users_display_data = {}
     user_data_global = get_all_user_data()
+    today_ist = datetime.now(IST).date()
 
     for user_name in target_users_to_load:
-        tasks = get_user_tasks(user_name)
+        tasks = []
+        more_links = {}
+        for status, newest_first in TASK_VIEW_SECTIONS:
+            if filters["statuses"] and status not in filters["statuses"]:
+                continue
+            page, next_key = task_store.query_tasks(
+                user_name, statuses=[status], due_from=filters["due_from"], due_to=filters["due_to"],
+                category=filters["category"], after=cursors.get(status), limit=limit, newest_first=newest_first)
+            tasks.extend(page)
+            if next_key is not None:
+                more_links[status] = url_for('main_app_view', user=user_name, **filter_params,
+                                             **{f"{status}_cursor": encode_cursor(next_key)})
         all_users_display_data[user_name] = {
             "tasks": tasks,
+            "recurring_today": [(template, as_task(task)) for _, template, task
+                                in get_occurrences(user_name, today_ist, today_ist)],
+            "more_links": more_links,
             "stars": user_data_global.get(user_name, {}).get("stars", 0)
         }
 
@@ -230,6 +3203,7 @@ def main_app_view():
                            all_users_data=all_users_display_data,
                            users=users,
                            display_user=display_single_user,
+                           filters=filter_params,
                            active_tab="Tasks",
                            tab_theme_colors=TAB_THEME_COLORS,
                            admin_mode = session.get('is_admin_mode', False))
@@ -272,30 +3246,28 @@ def add_user_admin():
     new_username_formatted = new_username.capitalize()
 
 
-    if new_username_formatted in users:
+    # Register the user for every worker; add() re-checks under the lock.
+    if not users.add(new_username_formatted):
         flash(f"User '{new_username_formatted}' already exists.", 'error')
         return redirect(url_for('index'))
 
-    # Update the global users list
-    users.append(new_username_formatted)
-
     # Update users.json
-    all_user_data = get_all_user_data() # Ensures we have the latest data
-    if new_username_formatted not in all_user_data:
-        all_user_data[new_username_formatted] = {"stars": 0, "star_history": []}
-        save_all_user_data(all_user_data)
+    with task_store.locked(USERS_LOCK):
+        all_user_data = get_all_user_data() # Ensures we have the latest data
+        if new_username_formatted not in all_user_data:
+            all_user_data[new_username_formatted] = {"stars": 0}
+            save_all_user_data(all_user_data)
 
     # Create user-specific task file
-    new_user_task_file = os.path.join(DATA_DIR, f"{new_username_formatted.lower()}_tasks.json")
-    if not os.path.exists(new_user_task_file):
-        with open(new_user_task_file, 'w') as f:
-            json.dump([], f)
+    task_store.ensure_user(new_username_formatted)
 
     # Also update TAB_THEME_COLORS if we want new users to have a default color on tabs
     # For now, they will use the 'Default' color. This could be enhanced later.
     # Example: TAB_THEME_COLORS[new_username_formatted] = TAB_THEME_COLORS['Default']
 
 
+    page_cache.invalidate()
+    publish_users_changed()
     flash(f"User '{new_username_formatted}' added successfully.", 'success')
     return redirect(url_for('index'))
 
@@ -315,57 +3287,62 @@ def delete_user_admin(username):
 
 
     try:
-        # Remove from global list
-        if username in users:
-            users.remove(username)
+        # Unregister first, for every worker, so get_all_user_data() won't re-add the user.
+        users.remove(username)
 
         # Remove from users.json data
-        all_user_data = get_all_user_data() # get_all_user_data might re-add if based on old global users list
-                                            # So, it's critical that global `users` list is updated first.
-                                            # Or, modify get_all_user_data to not auto-add if a specific flag is passed.
-                                            # For now, let's assume get_all_user_data will reflect the current global `users` list.
-                                            # A safer way is to load, modify, save directly.
-
-        current_users_json_path = os.path.join(DATA_DIR, "users.json")
-        loaded_user_data_direct = {}
-        try:
-            with open(current_users_json_path, 'r') as f:
-                loaded_user_data_direct = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # This case means users.json is missing/corrupt, which get_all_user_data would have tried to fix.
-            # If it's still an issue, deleting a user from a non-existent/corrupt main file is problematic.
-            flash("Error: Main user data file is missing or corrupt. Cannot delete user.", "error")
-            # Attempt to restore users list if removal failed at this stage
-            if username not in users: users.append(username) # Rollback global list change
-            return redirect(url_for('index'))
+        with task_store.locked(USERS_LOCK):
+            loaded_user_data_direct = {}
+            try:
+                loaded_user_data_direct = task_store.get_user_data()
+            except (FileNotFoundError, json.JSONDecodeError):
+                # This case means users.json is missing/corrupt, which get_all_user_data would have tried to fix.
+                # If it's still an issue, deleting a user from a non-existent/corrupt main file is problematic.
+                flash("Error: Main user data file is missing or corrupt. Cannot delete user.", "error")
+                # Attempt to restore users list if removal failed at this stage
+                users.add(username) # Rollback the registry change
+                return redirect(url_for('index'))
 
-        if username in loaded_user_data_direct:
-            del loaded_user_data_direct[username]
-            save_all_user_data(loaded_user_data_direct) # save_all_user_data writes the passed dict
+            if username in loaded_user_data_direct:
+                del loaded_user_data_direct[username]
+                save_all_user_data(loaded_user_data_direct) # save_all_user_data writes the passed dict
 
         # Delete user's task file
-        user_task_file = os.path.join(DATA_DIR, f"{username.lower()}_tasks.json")
-        if os.path.exists(user_task_file):
-            os.remove(user_task_file)
+        task_store.delete_user(username)
 
         # Remove from TAB_THEME_COLORS if present
         if username in TAB_THEME_COLORS:
             del TAB_THEME_COLORS[username]
 
+        page_cache.invalidate()
+        publish_users_changed()
         flash(f"User '{username}' and their tasks have been deleted.", 'success')
         return redirect(url_for('index')) # Redirect to a general page
 
     except Exception as e:
-        # Attempt to rollback global users list if error occurred after its modification
-        if username not in users:
-            users.append(username)
-            users.sort() # Or maintain original order if important and known
+        # Attempt to rollback the registry if the error occurred after its modification
+        users.add(username)
 
         flash(f"An error occurred while deleting user '{username}': {str(e)}", 'error')
         # Determine a safe redirect, maybe to task_view for the user if they still exist, or index
         return redirect(url_for('index'))
 
 
+def new_task(description, due_date):
+    return {
+        "id": str(uuid.uuid4()),
+        "description": description,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        "due_date": due_date,
+        "completed_at": None,
+        "category": None,
+        "priority": None,
+        "color_label": None,
+        "reflection_note": None,
+        "reflection_emoji": None
+    }
+
 @app.route('/add_task/<username>', methods=['POST'])
 def add_task(username):
     if username not in users:
@@ -390,23 +3367,27 @@ def add_task(username):
     else:
         due_date_to_save = datetime.now(IST).date().isoformat()
 
-    new_task_id = str(uuid.uuid4())
-    new_task = {
-        "id": new_task_id,
-        "description": task_description,
-        "status": "pending",
-        "created_at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
-        "due_date": due_date_to_save,
-        "completed_at": None,
-        "category": None,
-        "priority": None,
-        "color_label": None,
-        "reflection_note": None,
-        "reflection_emoji": None
-    }
-    current_tasks = get_user_tasks(username)
-    current_tasks.append(new_task)
-    save_user_tasks(username, current_tasks)
+    repeat = request.form.get('task_repeat')
+    if repeat:
+        # "daily", "weekly" (on the due date's weekday) or "weekdays" (Monday to Friday).
+        try:
+            template = make_recurring_template(task_description, "weekly" if repeat == "weekdays" else repeat,
+                                               due_date_to_save, weekdays=[0, 1, 2, 3, 4] if repeat == "weekdays" else None)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('main_app_view', user=username))
+        task_store.recurring.add(username, template)
+        page_cache.invalidate()
+        publish_event("sync", username)
+        flash('Recurring task added.', 'success')
+        return redirect(url_for('main_app_view', user=username))
+
+    applied = task_store.apply_batch(username, [("add", new_task(task_description, due_date_to_save))])
+    added = applied[0]
+    search_index.record(username, applied.version, upserts=[added])
+    due_index.record(username, applied.version, upserts=[added])
+    page_cache.invalidate()
+    publish_event("task", username, action="added", task=added)
     flash('Task added successfully.', 'success')
     return redirect(url_for('main_app_view', user=username))
 
@@ -418,15 +3399,34 @@ def delete_task(username, task_id):
     if not session.get('is_admin_mode', False):
         flash('You need to be in admin mode to delete tasks.', 'error')
         return redirect(url_for('main_app_view', user=username))
-    tasks = get_user_tasks(username)
-    tasks_after_deletion = [task for task in tasks if task['id'] != task_id]
-    if len(tasks_after_deletion) < len(tasks):
-        save_user_tasks(username, tasks_after_deletion)
+    applied = task_store.apply_batch(username, [("delete", task_id)])
+    if applied[0] is not None:
+        search_index.record(username, applied.version, deletes=[task_id])
+        due_index.record(username, applied.version, deletes=[task_id])
+        page_cache.invalidate()
+        publish_event("task", username, action="deleted", task={"id": task_id})
         flash('Task deleted successfully.', 'success')
     else:
         flash('Task not found or already deleted.', 'error')
     return redirect(url_for('main_app_view', user=username))
 
+@app.route('/delete_recurring/<username>/<template_id>', methods=['POST'])
+def delete_recurring(username, template_id):
+    if username not in users:
+        flash(f"User '{username}' not found.", "error")
+        return redirect(url_for('index'))
+    if not session.get('is_admin_mode', False):
+        flash('You need to be in admin mode to stop recurring tasks.', 'error')
+        return redirect(url_for('main_app_view', user=username))
+    # Completed occurrences stay; only future ones stop appearing.
+    if task_store.recurring.remove(username, template_id) is not None:
+        page_cache.invalidate()
+        publish_event("sync", username)
+        flash('Recurring task stopped.', 'success')
+    else:
+        flash('Recurring task not found.', 'error')
+    return redirect(url_for('main_app_view', user=username))
+
 @app.route('/edit_task_form/<username>/<task_id>', methods=['GET'])
 def edit_task_form(username, task_id):
     if username not in users:
@@ -435,8 +3435,7 @@ def edit_task_form(username, task_id):
     if not session.get('is_admin_mode', False):
         flash('You need to be in admin mode to edit tasks.', 'error')
         return redirect(url_for('main_app_view', user=username))
-    tasks = get_user_tasks(username)
-    task_to_edit = next((task for task in tasks if task['id'] == task_id), None)
+    task_to_edit = task_store.find_task(username, task_id)
     if task_to_edit:
         return render_template('edit_task.html', username=username, task=task_to_edit, users=users, tab_theme_colors=TAB_THEME_COLORS, active_tab="EditTask")
     else:
@@ -454,22 +3453,19 @@ def update_task(username, task_id):
     new_description = request.form.get('task_description')
     if not new_description:
         flash('Task description cannot be empty.', 'error')
-        tasks = get_user_tasks(username)
-        task_to_edit = next((task for task in tasks if task['id'] == task_id), None)
+        task_to_edit = task_store.find_task(username, task_id)
         if task_to_edit:
              return render_template('edit_task.html', username=username, task=task_to_edit, users=users, tab_theme_colors=TAB_THEME_COLORS, active_tab="EditTask")
         else:
              flash('Original task not found, cannot update.', 'error')
              return redirect(url_for('main_app_view', user=username))
-    tasks = get_user_tasks(username)
-    task_updated = False
-    for task in tasks:
-        if task['id'] == task_id:
-            task['description'] = new_description
-            task_updated = True
-            break
-    if task_updated:
-        save_user_tasks(username, tasks)
+    applied = task_store.apply_batch(username, [("update", task_id, {'description': new_description}, None)])
+    task_updated = applied[0]
+    if task_updated is not None:
+        search_index.record(username, applied.version, upserts=[task_updated])
+        due_index.record(username, applied.version, upserts=[task_updated])
+        page_cache.invalidate()
+        publish_event("task", username, action="updated", task=task_updated)
         flash('Task updated successfully.', 'success')
     else:
         flash('Task not found or could not be updated.', 'error')
@@ -480,26 +3476,23 @@ def complete_task(username, task_id):
     if username not in users:
         return jsonify({"success": False, "message": "User not found"}), 404
 
-    current_user_tasks_val = get_user_tasks(username)
-    task_to_complete = None
-    for t in current_user_tasks_val:
-        if t['id'] == task_id and t['status'] == 'pending':
-            task_to_complete = t
-            break
+    stars_to_award = STARS_PER_COMPLETION
+
+    completed_at = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    applied = task_store.apply_batch(
+        username, complete_operations(username, task_id, completed_at),
+        award_stars=lambda results: stars_to_award if any(task is not None for task in results) else 0)
+    task_to_complete = next((task for task in applied if task is not None), None)
 
     if not task_to_complete:
         return jsonify({"success": False, "message": "Task not found or not pending."}), 404
 
-    stars_to_award = 1
-
-    task_to_complete['status'] = 'completed'
-    task_to_complete['completed_at'] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-
-    save_user_tasks(username, current_user_tasks_val)
-
-    user_data_all_users = get_all_user_data()
-    user_data_all_users[username]["stars"] = user_data_all_users.get(username, {}).get("stars", 0) + stars_to_award
-    save_all_user_data(user_data_all_users)
+    new_stars = applied.stars
+    leaderboard.record(username, applied.version, stars=new_stars, completions=1)
+    search_index.record(username, applied.version, upserts=[task_to_complete])
+    due_index.record(username, applied.version, upserts=[task_to_complete])
+    page_cache.invalidate()
+    publish_event("task", username, action="completed", task=task_to_complete, stars=new_stars)
 
     return jsonify({
         "success": True,
@@ -512,63 +3505,463 @@ def trigger_daily_update():
     if not session.get('is_admin_mode', False): # Corrected to global admin check
         flash('You need to be in admin mode to perform this action.', 'error')
         return redirect(request.referrer or url_for('index'))
-    count = update_tasks_done_yesterday_logic()
-    flash(f"{count} tasks updated to 'done_yesterday'.", 'info')
+    marker = run_daily_update(force=True)
+    flash(f"{marker['tasks_updated']} tasks updated to 'done_yesterday'.", 'info')
     return redirect(request.referrer or url_for('index'))
 
+# --- Leaderboard ---
+# Users ranked by star balance and by tasks completed this UTC week, kept in
+# sorted lists so /api/leaderboard reads the top K without sorting or
+# scanning tasks; the dashboard reads every user's values. complete_task and
+# handle_purchase update their user's entry in place, with the version their
+# write returned. Any other change (another worker's write, a batch, a
+# delete) shows up as a per-user version the entry wasn't built at, and only
+# that user is recomputed on the next read. A full rebuild runs when the week
+# rolls over and every LEADERBOARD_MAX_AGE_SECONDS.
+LEADERBOARD_METRICS = ("stars", "weekly_completions")
+LEADERBOARD_DEFAULT_LIMIT = 10
+LEADERBOARD_MAX_SIZE = 100
+LEADERBOARD_MAX_AGE_SECONDS = 300
+
+
+def start_of_week_utc(today_utc=None):
+    today_utc = today_utc or datetime.now(timezone.utc).date()
+    return today_utc - timedelta(days=today_utc.weekday())
+
+
+class RankedIndex:
+    """Names kept sorted by a value, highest first; ties by name."""
+
+    def __init__(self):
+        self.values = {}
+        self._order = []  # (-value, name)
+
+    def set(self, name, value):
+        self.discard(name)
+        self.values[name] = value
+        bisect.insort(self._order, (-value, name))
+
+    def discard(self, name):
+        old = self.values.pop(name, None)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, (-old, name))]
+
+    def top(self, k):
+        return [(name, -negated) for negated, name in self._order[:k]]
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.indexes = {metric: RankedIndex() for metric in LEADERBOARD_METRICS}
+        self._versions = {}  # user -> store version the entry reflects
+        self._synced_versions = None
+        self._synced_users_version = None
+        self._week_start = None
+        self._rebuilt_at = 0.0
+
+    @timed("compute")
+    def _compute(self, username, week_start):
+        week_end = week_start + timedelta(days=6)
+        count = 0
+        # A UTC date spans two IST dates; widen the range so archived tasks from
+        # the neighbouring month are included when the week straddles one.
+        for task in get_user_tasks_for_range(username, week_start - timedelta(days=1), week_end + timedelta(days=1)):
+            if task.status in DONE_STATUSES and task.completed_date_utc is not None \
+                    and week_start <= task.completed_date_utc <= week_end:
+                count += 1
+        return {"stars": get_all_user_data().get(username, {}).get("stars", 0), "weekly_completions": count}
+
+    def _store(self, username, values, version):
+        for metric, value in values.items():
+            self.indexes[metric].set(username, value)
+        self._versions[username] = version
+
+    def sync(self):
+        """Bring the entries up to date with the store; cheap when nothing changed."""
+        week_start = start_of_week_utc()
+        versions = task_store.get_versions()
+        users_version = users.version
+        with self._lock:
+            full = week_start != self._week_start or time.monotonic() - self._rebuilt_at > LEADERBOARD_MAX_AGE_SECONDS
+            if not full and (versions is self._synced_versions or versions == self._synced_versions) \
+                    and users_version == self._synced_users_version and len(self._versions) == len(users):
+                return
+            if full:
+                self.indexes = {metric: RankedIndex() for metric in LEADERBOARD_METRICS}
+                self._versions.clear()
+                self._week_start, self._rebuilt_at = week_start, time.monotonic()
+            for username in [name for name in self._versions if name not in users]:
+                for index in self.indexes.values():
+                    index.discard(username)
+                del self._versions[username]
+            for username in users:
+                version = versions.get(username.lower(), 0)
+                if self._versions.get(username) != version:
+                    # `version` was read before computing, so a write landing
+                    # meanwhile leaves the entry stale rather than wrong.
+                    self._store(username, self._compute(username, week_start), version)
+            self._synced_versions = versions
+            self._synced_users_version = users_version
+
+    def record(self, username, version, stars=None, completions=0):
+        """Apply a change this worker just made, if the entry was current before it.
+
+        `version` is the user's version the store returned for the write,
+        which moved it by exactly one.
+        """
+        with self._lock:
+            if self._versions.get(username) != version - 1 or self._week_start != start_of_week_utc():
+                self._versions.pop(username, None)  # recomputed on the next sync
+                return
+            if stars is not None:
+                self.indexes["stars"].set(username, stars)
+            if completions:
+                index = self.indexes["weekly_completions"]
+                index.set(username, index.values.get(username, 0) + completions)
+            self._versions[username] = version
+
+    def values(self):
+        """{user: {"stars", "weekly_completions"}} for every user."""
+        self.sync()
+        with self._lock:
+            return {name: {m: self.indexes[m].values.get(name, 0) for m in LEADERBOARD_METRICS} for name in users}
+
+    def top(self, metric, k):
+        """[{"rank", "user", "stars", "weekly_completions"}] for the top `k` by `metric`."""
+        self.sync()
+        with self._lock:
+            return [{"rank": rank, "user": name,
+                     **{m: self.indexes[m].values.get(name, 0) for m in LEADERBOARD_METRICS}}
+                    for rank, (name, _) in enumerate(self.indexes[metric].top(k), start=1)]
+
+
+leaderboard = TenantLocal("leaderboard")
+
+
+# --- Search ---
+# An in-memory inverted index over every user's tasks, archived ones
+# included: term -> {doc: weight}, plus the sorted vocabulary for prefix
+# lookups. It is kept current like the leaderboard. The task routes index
+# the tasks they touch, at the version their write returned. Any other write
+# moves the user's version, and the next query re-indexes that user's active
+# tasks; every SEARCH_MAX_AGE_SECONDS all of them are. Archived tasks are
+# indexed separately and only re-read when the user's archive files change.
+# Each worker builds its index lazily on the first query.
+SEARCH_FIELD_WEIGHTS = {"description": 3.0, "category": 2.0, "reflection_note": 1.0}
+SEARCH_PREFIX_FACTOR = 0.5  # a prefix match counts half as much as the whole word
+SEARCH_MIN_PREFIX = 2       # shorter query words only match whole words
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_AGE_SECONDS = 300
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+
+def search_tokens(text):
+    return _SEARCH_TOKEN_RE.findall(text.casefold()) if isinstance(text, str) else []
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}      # term -> {doc_id: weight}
+        self._terms = []         # sorted vocabulary
+        self._docs = {}          # doc_id -> (username, Task, archived)
+        self._doc_terms = {}     # doc_id -> terms it was posted under
+        self._user_docs = {}     # (username, archived) -> {task_id: doc_id}
+        self._versions = {}      # username -> store version the active docs reflect
+        self._archive_stamps = {}
+        self._synced_versions = None
+        self._synced_users_version = None
+        self._rebuilt_at = 0.0
+        self._next_id = 0
+
+    def _add(self, username, task, archived):
+        docs = self._user_docs.setdefault((username, archived), {})
+        if task.id in docs:
+            self._remove(docs.pop(task.id))
+        weights = {}
+        for field, field_weight in SEARCH_FIELD_WEIGHTS.items():
+            for term in search_tokens(getattr(task, field)):
+                weights[term] = weights.get(term, 0.0) + field_weight
+        self._next_id += 1
+        doc_id = self._next_id
+        docs[task.id] = doc_id
+        self._docs[doc_id] = (username, task, archived)
+        self._doc_terms[doc_id] = list(weights)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[doc_id] = weight
+
+    def _remove(self, doc_id):
+        del self._docs[doc_id]
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _drop_user(self, username, archived):
+        for doc_id in self._user_docs.pop((username, archived), {}).values():
+            self._remove(doc_id)
+
+    def _index_user(self, username, version):
+        self._drop_user(username, False)
+        for task in get_user_tasks(username):
+            self._add(username, task, False)
+        self._versions[username] = version
+        stamp = task_store.archive.stamp(username)
+        if self._archive_stamps.get(username) != stamp:
+            self._drop_user(username, True)
+            for task in task_store.archive.iter_tasks(username):
+                self._add(username, task, True)
+            self._archive_stamps[username] = stamp
+
+    def _sync(self):
+        versions = task_store.get_versions()
+        users_version = users.version
+        full = time.monotonic() - self._rebuilt_at > SEARCH_MAX_AGE_SECONDS
+        if not full and (versions is self._synced_versions or versions == self._synced_versions) \
+                and users_version == self._synced_users_version and len(self._versions) == len(users):
+            return
+        if full:
+            self._versions = {name: None for name in self._versions}  # re-index every user's active tasks
+            self._rebuilt_at = time.monotonic()
+        for username in [name for name in self._versions if name not in users]:
+            self._drop_user(username, False)
+            self._drop_user(username, True)
+            del self._versions[username]
+            self._archive_stamps.pop(username, None)
+        for username in users:
+            version = versions.get(username.lower(), 0)
+            if self._versions.get(username) != version:
+                self._index_user(username, version)
+        self._synced_versions = versions
+        self._synced_users_version = users_version
+
+    def record(self, username, version, upserts=(), deletes=()):
+        """Index tasks this worker just wrote, if the user's docs were current
+        before the write that returned `version` (see Leaderboard.record)."""
+        with self._lock:
+            if self._versions.get(username) != version - 1:
+                self._versions.pop(username, None)  # re-indexed on the next query
+                return
+            for task in upserts:
+                self._add(username, as_task(task), False)
+            docs = self._user_docs.get((username, False), {})
+            for task_id in deletes:
+                if task_id in docs:
+                    self._remove(docs.pop(task_id))
+            self._versions[username] = version
+
+    def _matching_terms(self, word):
+        """(term, factor) for the whole word and, if long enough, words it prefixes."""
+        if len(word) < SEARCH_MIN_PREFIX:
+            return [(word, 1.0)] if word in self._postings else []
+        start = bisect.bisect_left(self._terms, word)
+        end = bisect.bisect_left(self._terms, word + "\U0010ffff")
+        return [(term, 1.0 if term == word else SEARCH_PREFIX_FACTOR) for term in self._terms[start:end]]
+
+    def search(self, query, usernames=None, statuses=None, limit=SEARCH_DEFAULT_LIMIT):
+        """Tasks matching every word of `query` (each as a word prefix), best first.
+
+        A document scores, per query word, its best matching term's field
+        weight x idf (halved for prefix matches); scores add up across words.
+        Returns [(score, username, Task)].
+        """
+        words = list(dict.fromkeys(search_tokens(query)))
+        if not words:
+            return []
+        with self._lock:
+            self._sync()
+            total_docs = max(1, len(self._docs))
+            # Most selective word first; later words then only probe the docs still in the running.
+            matches = sorted((self._matching_terms(word) for word in words),
+                             key=lambda terms: sum(len(self._postings[term]) for term, _ in terms))
+            scores = None
+            for terms in matches:
+                word_scores = {}
+                for term, factor in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_docs / len(postings))
+                    if scores is not None and len(scores) < len(postings):
+                        candidates = ((doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings)
+                    else:
+                        candidates = postings.items()
+                    for doc_id, weight in candidates:
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        score = weight * factor * idf
+                        if score > word_scores.get(doc_id, 0.0):
+                            word_scores[doc_id] = score
+                if scores is not None:
+                    word_scores = {doc_id: scores[doc_id] + score for doc_id, score in word_scores.items()}
+                scores = word_scores
+                if not scores:
+                    return []
+            best = {}  # (username, task id) -> (score, created_at, username, task); active copies win
+            for doc_id, score in scores.items():
+                username, task, archived = self._docs[doc_id]
+                if (usernames and username not in usernames) or (statuses and task.status not in statuses):
+                    continue
+                key = (username, task.id)
+                if archived and key in best:
+                    continue
+                if archived and task.id in self._user_docs.get((username, False), {}):
+                    continue
+                best[key] = (score, task.created_ts or 0.0, username, task)
+        ranked = heapq.nlargest(limit, best.values(), key=lambda hit: (hit[0], hit[1]))
+        return [(round(score, 4), username, task) for score, _, username, task in ranked]
+
+
+search_index = TenantLocal("search_index")
+
+
+# --- Due dates ---
+# Pending tasks with a due date, per user, in a list sorted by (due date,
+# created time, id). Overdue and upcoming queries bisect each user's list for
+# the date range and merge the slices lazily, so a query touches only the
+# entries it returns (plus a bisect per user). The lists are kept current
+# like the search index: task routes record what they changed at the version
+# their write returned, other writes are picked up through the per-user
+# versions.
+DUE_UPCOMING_DAYS = 7
+DUE_WIDGET_SIZE = 5
+DUE_DEFAULT_LIMIT = 50
+DUE_MAX_LIMIT = 500
+
+
+def task_due_key(task):
+    """(due date ISO string, created_ts, id) for a pending task with a valid due date, else None."""
+    if task.status != 'pending' or not task.due_date:
+        return None
+    try:
+        due = date.fromisoformat(task.due_date)
+    except (TypeError, ValueError):
+        return None
+    return (due.isoformat(), task.created_ts or 0.0, task.id)
+
+
+class DueIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # username -> sorted [(due, created_ts, task_id)]
+        self._tasks = {}     # username -> {task_id: (key, Task)}
+        self._versions = {}  # username -> store version the entries reflect
+        self._synced_versions = None
+        self._synced_users_version = None
+
+    def _set(self, username, task):
+        entries, tasks = self._entries[username], self._tasks[username]
+        old = tasks.pop(task.id, None)
+        if old is not None:
+            del entries[bisect.bisect_left(entries, old[0])]
+        key = task_due_key(task)
+        if key is not None:
+            bisect.insort(entries, key)
+            tasks[task.id] = (key, task)
+
+    def _index_user(self, username, version):
+        tasks = {}
+        for task in get_user_tasks(username):
+            key = task_due_key(task)
+            if key is not None:
+                tasks[task.id] = (key, task)
+        self._entries[username] = sorted(key for key, _ in tasks.values())
+        self._tasks[username] = tasks
+        self._versions[username] = version
+
+    def _sync(self):
+        versions = task_store.get_versions()
+        users_version = users.version
+        if (versions is self._synced_versions or versions == self._synced_versions) \
+                and users_version == self._synced_users_version and len(self._versions) == len(users):
+            return
+        for username in [name for name in self._versions if name not in users]:
+            del self._entries[username], self._tasks[username], self._versions[username]
+        for username in users:
+            version = versions.get(username.lower(), 0)
+            if self._versions.get(username) != version:
+                self._index_user(username, version)
+        self._synced_versions = versions
+        self._synced_users_version = users_version
+
+    def record(self, username, version, upserts=(), deletes=()):
+        """Apply tasks this worker just wrote, if the user's entries were current
+        before the write that returned `version` (see Leaderboard.record)."""
+        with self._lock:
+            if self._versions.get(username) != version - 1:
+                self._versions.pop(username, None)  # re-read on the next query
+                return
+            for task in upserts:
+                self._set(username, as_task(task))
+            tasks, entries = self._tasks[username], self._entries[username]
+            for task_id in deletes:
+                old = tasks.pop(task_id, None)
+                if old is not None:
+                    del entries[bisect.bisect_left(entries, old[0])]
+            self._versions[username] = version
+
+    def between(self, start=None, end=None, usernames=None, limit=DUE_DEFAULT_LIMIT):
+        """Pending tasks due in [start, end] (dates, either open), soonest first.
+
+        Returns (total, [(username, Task)]) with at most `limit` tasks.
+        """
+        low = (start.isoformat(),) if start else ()
+        high = (end.isoformat(), math.inf) if end else ("\uffff",)
+        with self._lock:
+            self._sync()
+            total = 0
+            slices = []
+            for username in usernames or users:
+                entries = self._entries.get(username, [])
+                lo, hi = bisect.bisect_left(entries, low), bisect.bisect_right(entries, high)
+                total += hi - lo
+                slices.append(zip(map(entries.__getitem__, range(lo, hi)), itertools.repeat(username)))
+            picked = [(username, self._tasks[username][key[2]][1])
+                      for key, username in itertools.islice(heapq.merge(*slices), limit)]
+        return total, picked
+
+    def overdue(self, today_ist, usernames=None, limit=DUE_DEFAULT_LIMIT):
+        return self.between(end=today_ist - timedelta(days=1), usernames=usernames, limit=limit)
+
+    def upcoming(self, today_ist, days=DUE_UPCOMING_DAYS, usernames=None, limit=DUE_DEFAULT_LIMIT):
+        return self.between(today_ist, today_ist + timedelta(days=days), usernames=usernames, limit=limit)
+
+
+due_index = TenantLocal("due_index")
+
+
+def due_payload(total, picked):
+    return {"total": total, "tasks": [{"user": username, "task": task.to_dict()} for username, task in picked]}
+
+
+def build_due_widget(today_ist):
+    return {"overdue": due_payload(*due_index.overdue(today_ist, limit=DUE_WIDGET_SIZE)),
+            "upcoming": due_payload(*due_index.upcoming(today_ist, limit=DUE_WIDGET_SIZE))}
+
 @app.route('/dashboard') # This is the old analytics dashboard
+@cached_page('dashboard')
 def dashboard():
-    all_user_data_map = get_all_user_data() # This is guaranteed to have entries for all in global `users`
-    leaderboard_data = []
-    # Iterate through the global `users` list to build the leaderboard
-    # This ensures only active users are displayed and in the correct global `users` order (before sorting by stars)
-    for user_name_active in users:
-        user_detail = all_user_data_map.get(user_name_active) # Should always find an entry due to get_all_user_data
-        if user_detail and isinstance(user_detail, dict):
-            leaderboard_data.append((user_name_active, user_detail.get("stars", 0)))
-        else:
-            # Fallback if data is somehow missing or malformed for an active user (should be rare)
-            leaderboard_data.append((user_name_active, 0))
-            print(f"Warning: Could not retrieve details for active user '{user_name_active}' for leaderboard. Defaulting to 0 stars.")
-
-    leaderboard_data.sort(key=lambda x: x[1], reverse=True)
+    # Both cards read the maintained leaderboard values: no task scan.
+    values = leaderboard.values()
+    # Every user, by stars; ties keep the `users` order.
+    leaderboard_data = sorted(((name, values[name]["stars"]) for name in users), key=lambda x: x[1], reverse=True)
 
-    task_completion_data_list = []
     user_colors = {
         "Veer": "blue", "Vardaan": "green",
         "Avni": "red", "Drishti": "orange"
     }
-    today_utc = datetime.now(timezone.utc).date() # Changed to utc for consistency with task completion
-    start_of_week_utc = today_utc - timedelta(days=today_utc.weekday())
-    end_of_week_utc = start_of_week_utc + timedelta(days=6)
-
-    for user_name_for_graph in users:
-        user_tasks = get_user_tasks(user_name_for_graph)
-        completed_this_week_count = 0
-        for task_item_graph in user_tasks:
-            if task_item_graph.get('status') in ['completed', 'done_yesterday'] and task_item_graph.get('completed_at'):
-                try:
-                    completed_dt = datetime.fromisoformat(task_item_graph['completed_at'].replace('Z', '+00:00'))
-                    completed_date = completed_dt.astimezone(timezone.utc).date()
-                    if start_of_week_utc <= completed_date <= end_of_week_utc:
-                        completed_this_week_count += 1
-                except ValueError:
-                    continue
-
-        task_completion_data_list.append({
-            'user': user_name_for_graph,
-            'count': completed_this_week_count,
-            'color': user_colors.get(user_name_for_graph, 'grey')
-        })
-        max_completed_count = 0 # This was inside loop, should be outside or handled differently
-        if completed_this_week_count > max_completed_count: # This logic is flawed for overall max
-            max_completed_count = completed_this_week_count
-
-    # Corrected max_completed_count logic
-    overall_max_completed_count = 0
-    for item in task_completion_data_list:
-        if item['count'] > overall_max_completed_count:
-            overall_max_completed_count = item['count']
+    task_completion_data_list = [{
+        'user': name,
+        'count': values[name]["weekly_completions"],
+        'color': user_colors.get(name, 'grey')
+    } for name in users]
+    overall_max_completed_count = max((item['count'] for item in task_completion_data_list), default=0)
 
     return render_template("dashboard.html",
                            leaderboard_data=leaderboard_data,
@@ -586,7 +3979,7 @@ def settings():
     all_user_details = get_all_user_data()
 
     return render_template("settings.html",
-                           users=users,
+                           users=users.names(),
                            all_user_details=all_user_details,
                            active_tab="Settings",
                            tab_theme_colors=TAB_THEME_COLORS,
@@ -611,73 +4004,74 @@ def handle_purchase(username):
         return jsonify({"success": False, "message": "Invalid item type."}), 400
 
     cost = STAR_COSTS[item_type]
-    all_user_data = get_all_user_data()
-    user_current_data = all_user_data.get(username)
-
-    if not user_current_data:
-        return jsonify({"success": False, "message": "User data couldn't be loaded."}), 500
-
-    current_stars = user_current_data.get("stars", 0)
-
-    if current_stars < cost:
-        return jsonify({
-            "success": False,
-            "message": f"Not enough stars. You need {cost}, but have {current_stars}.",
-            "currentStars": current_stars
-        }), 400 # Bad request (client error)
-
-    # Deduct stars and record history
-    user_current_data["stars"] -= cost
-    purchase_reason = f"Changed {item_type}"
-    if item_type == "displayName":
-        purchase_reason = f"Changed display name to '{value}'"
-    elif item_type == "accentColor":
-        purchase_reason = f"Changed accent color to '{value}'"
-    elif item_type == "avatar":
-        purchase_reason = "Changed avatar" # Value might be a URL, too long for a short reason
-
-    user_current_data.setdefault("star_history", []).append({
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "reason": purchase_reason,
-        "amount": -cost,
-        "remaining_stars": user_current_data["stars"]
-    })
+    with task_store.locked(USERS_LOCK):
+        all_user_data = get_all_user_data()
+        user_current_data = all_user_data.get(username)
 
-    # Note: Actual application of display name, avatar URL, accent color
-    # is handled client-side via localStorage in the current setup.
-    # If these needed to be persisted server-side beyond star deduction,
-    # you would update all_user_data[username] with these values here.
-    # e.g., all_user_data[username]['display_name_override'] = value
+        if not user_current_data:
+            return jsonify({"success": False, "message": "User data couldn't be loaded."}), 500
 
-    save_all_user_data(all_user_data)
+        current_stars = user_current_data.get("stars", 0)
+
+        if current_stars < cost:
+            return jsonify({
+                "success": False,
+                "message": f"Not enough stars. You need {cost}, but have {current_stars}.",
+                "currentStars": current_stars
+            }), 400 # Bad request (client error)
+
+        # Deduct stars and record history in the star ledger
+        purchase_reason = f"Changed {item_type}"
+        if item_type == "displayName":
+            purchase_reason = f"Changed display name to '{value}'"
+        elif item_type == "accentColor":
+            purchase_reason = f"Changed accent color to '{value}'"
+        elif item_type == "avatar":
+            purchase_reason = "Changed avatar" # Value might be a URL, too long for a short reason
+
+        new_stars, version = task_store.add_stars(username, -cost, reason=purchase_reason, only_if_covered=True)
+        leaderboard.record(username, version, stars=new_stars)
+
+        # Note: Actual application of display name, avatar URL, accent color
+        # is handled client-side via localStorage in the current setup.
+        # If these needed to be persisted server-side beyond star deduction,
+        # you would update all_user_data[username] with these values here.
+        # e.g., all_user_data[username]['display_name_override'] = value
+    page_cache.invalidate()
+    publish_event("stars", username, stars=new_stars)
 
     return jsonify({
         "success": True,
         "message": f"{item_type.replace('_', ' ')} updated successfully! {cost} stars deducted.",
-        "newStars": user_current_data["stars"],
+        "newStars": new_stars,
         "itemType": item_type,
         "value": value
     })
 
 
-@app.route('/insights')
-def insights_page():
+@timed("compute")
+def build_insights_data(today_ist):
     insights_data = {}
     user_data_global = get_all_user_data()
 
-    today_ist = datetime.now(IST).date()
     start_of_week_ist = today_ist - timedelta(days=today_ist.weekday())
     yesterday_ist = today_ist - timedelta(days=1)
 
+    week_days_ist = [start_of_week_ist + timedelta(days=d) for d in range(7)]
+
     for user_name in users:
-        user_tasks = get_user_tasks(user_name)
+        activity = task_store.get_rollup(user_name)
+        pending_by_day = pending_counts_as_of(activity, week_days_ist + [today_ist])
+        # Open recurring occurrences count as pending on their own day only.
+        for day, count in unmaterialized_pending_counts(user_name, week_days_ist + [today_ist]).items():
+            pending_by_day[day] += count
 
         # Pending count for insights should be as of today_ist
-        current_pending_count = get_pending_tasks_on_date_ist(user_tasks, today_ist)
+        current_pending_count = pending_by_day[today_ist]
 
-        completed_today_count = get_completed_on_date_ist(user_tasks, today_ist)
-        completed_yesterday_count = get_completed_on_date_ist(user_tasks, yesterday_ist)
-        tasks_this_week_count = get_tasks_completed_this_week_ist(user_tasks, start_of_week_ist, today_ist)
+        completed_today_count = completed_on(activity, today_ist)
+        completed_yesterday_count = completed_on(activity, yesterday_ist)
+        tasks_this_week_count = completed_between(activity, start_of_week_ist, today_ist)
 
         total_relevant_for_efficiency = tasks_this_week_count + current_pending_count
         current_efficiency = (tasks_this_week_count / total_relevant_for_efficiency) * 100 if total_relevant_for_efficiency > 0 else 0.0
@@ -685,12 +4079,11 @@ def insights_page():
         daily_activity_list = []
         max_bar_value_for_user = 0
 
-        for d in range(7):
-            current_day_in_loop_ist = start_of_week_ist + timedelta(days=d)
+        for current_day_in_loop_ist in week_days_ist:
             day_label = current_day_in_loop_ist.strftime('%a')
 
-            completed_on_this_day = get_completed_on_date_ist(user_tasks, current_day_in_loop_ist)
-            pending_on_this_day = get_pending_tasks_on_date_ist(user_tasks, current_day_in_loop_ist)
+            completed_on_this_day = completed_on(activity, current_day_in_loop_ist)
+            pending_on_this_day = pending_by_day[current_day_in_loop_ist]
 
             daily_activity_list.append({
                 'day': day_label,
@@ -709,19 +4102,628 @@ def insights_page():
             "daily_activity": daily_activity_list,
             "max_bar_height_value": max(1, max_bar_value_for_user)
         }
+    return insights_data
 
+@app.route('/insights')
+@cached_page('insights')
+def insights_page():
+    today_ist = datetime.now(IST).date()
     return render_template("insights.html",
-                           insights_data=insights_data,
+                           insights_data=build_insights_data(today_ist),
                            users_list_for_order=users,
                            current_date_str=today_ist.strftime('%A, %B %d, %Y'))
 
-if __name__ == '__main__':
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+
+# --- JSON API ---
+# Read-only endpoints for polling front-ends and monitoring. Every response
+# carries a strong ETag built from the per-user version counters (plus the IST
+# date where the numbers depend on it), so an If-None-Match hit is answered
+# with a 304 before any task or rollup is loaded.
+def users_etag(prefix, usernames, today_ist=None):
+    versions = task_store.get_versions()
+    parts = [prefix, today_ist.isoformat() if today_ist else ""]
+    parts.extend(f"{name}:{versions.get(name.lower(), 0)}" for name in usernames)
+    return f"{prefix}-" + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+
+def conditional_json(etag, build_payload):
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/users/<username>/tasks')
+def api_user_tasks(username):
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    etag = users_etag("tasks", [username])
+    return conditional_json(etag, lambda: {
+        "user": username,
+        "stars": get_all_user_data().get(username, {}).get("stars", 0),
+        "tasks": [task.to_dict() for task in get_user_tasks(username)]
+    })
+
+@app.route('/api/users/<username>/tasks/page')
+def api_user_tasks_page(username):
+    """Filtered, cursor-paginated tasks: ?status=a,b&due_from=&due_to=&category=&order=asc|desc&cursor=&limit="""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    try:
+        filters = task_query_args(request.args)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    limit = task_page_limit(request.args)
+    newest_first = request.args.get('order', 'asc') == 'desc'
+    etag = users_etag("tasks-page-" + hashlib.sha1(request.query_string).hexdigest()[:12], [username])
+
+    def build_page():
+        page, next_key = task_store.query_tasks(username, after=after, limit=limit,
+                                                newest_first=newest_first, **filters)
+        return {
+            "user": username,
+            "tasks": [task.to_dict() for task in page],
+            "next_cursor": encode_cursor(next_key) if next_key is not None else None
+        }
+    return conditional_json(etag, build_page)
+
+MAX_BATCH_OPERATIONS = 1000
+
+@app.route('/api/users/<username>/tasks:batch', methods=['POST'])
+def api_tasks_batch(username):
+    """Apply many add / complete / delete operations with one store write.
+
+    Body: {"operations": [{"op": "add", "description": "...", "due_date": "YYYY-MM-DD"},
+                          {"op": "complete", "id": "..."}, {"op": "delete", "id": "..."}]}
+    Adds and deletes need admin mode, like the single-task routes. Completes
+    go through complete_operations, so recurring occurrences work as in
+    complete_task. Stars for all completions are awarded in the same store
+    write (see apply_batch). The response has one {"op", "id", "success",
+    "message"} result per operation, in order.
+    """
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"success": False, "message": "Expected a non-empty 'operations' list."}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"success": False, "message": f"At most {MAX_BATCH_OPERATIONS} operations per batch."}), 400
+
+    is_admin = session.get('is_admin_mode', False)
+    completed_at = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    results = []
+    store_operations, store_positions = [], []
+    for position, item in enumerate(operations):
+        op = item.get('op') if isinstance(item, dict) else None
+        task_id = item.get('id') if isinstance(item, dict) else None
+        result = {"op": op, "id": task_id, "success": False}
+        results.append(result)
+        if op not in ('add', 'complete', 'delete'):
+            result["message"] = "Unknown operation."
+            continue
+        if op in ('add', 'delete') and not is_admin:
+            result["message"] = f"You need to be in admin mode to {op} tasks."
+            continue
+        if op == 'add':
+            description = item.get('description')
+            if not isinstance(description, str) or not description.strip():
+                result["message"] = "Task description cannot be empty."
+                continue
+            due_date_to_save = datetime.now(IST).date().isoformat()
+            if item.get('due_date'):
+                try:
+                    due_date_to_save = datetime.strptime(item['due_date'], '%Y-%m-%d').date().isoformat()
+                except (TypeError, ValueError):
+                    result["message"] = "Invalid due_date, expected YYYY-MM-DD."
+                    continue
+            store_operations.append(("add", new_task(description.strip(), due_date_to_save)))
+        elif not isinstance(task_id, str):
+            result["message"] = "Missing task id."
+            continue
+        elif op == 'complete':
+            for operation in complete_operations(username, task_id, completed_at):
+                store_operations.append(operation)
+                store_positions.append(position)
+            continue
+        else:
+            store_operations.append(("delete", task_id))
+        store_positions.append(position)
+
+    def applied_by_position(applied):
+        # An operation's first store result that isn't None, by position.
+        found = {}
+        for position, task in zip(store_positions, applied):
+            if task is not None:
+                found.setdefault(position, task)
+        return found
+
+    def stars_for(applied):
+        completions = sum(1 for position in applied_by_position(applied) if results[position]["op"] == 'complete')
+        return completions * STARS_PER_COMPLETION
+
+    applied = task_store.apply_batch(username, store_operations, award_stars=stars_for) if store_operations else []
+    found = applied_by_position(applied)
+    for position in dict.fromkeys(store_positions):
+        result = results[position]
+        task = found.get(position)
+        if task is None:
+            result["message"] = ("Task not found or not pending." if result["op"] == 'complete'
+                                 else "Task not found or already deleted.")
+            continue
+        result.update({"id": task['id'], "success": True})
+
+    stars_awarded = stars_for(applied)
+    if found:
+        page_cache.invalidate()
+        publish_event("sync", username)
+    return jsonify({
+        "success": all(result["success"] for result in results),
+        "results": results,
+        "stars_awarded": stars_awarded
+    })
+
+@app.route('/api/users/<username>/recurring', methods=['GET', 'POST'])
+def api_recurring(username):
+    """GET: the user's recurring templates. POST (admin): add one from
+    {"description", "freq": "daily"|"weekly", "start_date", "interval", "weekdays", "until", "category"}."""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    if request.method == 'GET':
+        return conditional_json(users_etag("recurring", [username]),
+                                lambda: {"user": username, "templates": task_store.recurring.get(username)})
+    if not session.get('is_admin_mode', False):
+        return jsonify({"success": False, "message": "You need to be in admin mode to add recurring tasks."}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "message": "Expected a JSON object."}), 400
+    try:
+        template = make_recurring_template(
+            data.get('description'), data.get('freq'), data.get('start_date') or datetime.now(IST).date().isoformat(),
+            interval=data.get('interval', 1), weekdays=data.get('weekdays'), until=data.get('until'),
+            category=data.get('category'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    task_store.recurring.add(username, template)
+    page_cache.invalidate()
+    publish_event("sync", username)
+    return jsonify({"success": True, "template": template}), 201
+
+@app.route('/api/users/<username>/occurrences')
+def api_occurrences(username):
+    """Recurring occurrences in ?from=&to= (IST dates, default today), completed or not."""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    today_ist = datetime.now(IST).date()
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else today_ist
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else start
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date, expected YYYY-MM-DD."}), 400
+    if not 0 <= (end - start).days < RECURRING_MAX_WINDOW_DAYS:
+        return jsonify({"success": False, "message": f"The range must be 1-{RECURRING_MAX_WINDOW_DAYS} days."}), 400
+    etag = users_etag(f"occurrences:{start}:{end}", [username], today_ist)
+    return conditional_json(etag, lambda: {
+        "user": username,
+        "occurrences": [{"date": day.isoformat(), "template_id": template["id"], "task": as_task(task).to_dict()}
+                        for day, template, task in get_occurrences(username, start, end)]
+    })
+
+@app.route('/api/users/<username>/star_history')
+def api_user_star_history(username):
+    """Newest-first page of a user's star ledger: ?before=<cursor>&limit="""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    before = request.args.get('before', type=int)
+    if before is not None and before < 0:
+        return jsonify({"success": False, "message": "Invalid cursor"}), 400
+    limit = max(1, min(request.args.get('limit', STAR_LEDGER_PAGE_SIZE, type=int), MAX_TASK_PAGE_SIZE))
+    etag = users_etag("star-history-" + hashlib.sha1(request.query_string).hexdigest()[:12], [username])
+
+    def build_page():
+        entries, next_before = task_store.get_star_ledger(username, before=before, limit=limit)
+        return {"user": username, "entries": entries, "next_before": next_before}
+    return conditional_json(etag, build_page)
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_ERROR_SAMPLE = 20
+
+def export_task_lines(username):
+    for task in task_store.iter_tasks(username):
+        yield json.dumps(task.to_dict()) + "\n"
+
+def import_task_lines(username, lines, batch_size=IMPORT_BATCH_SIZE):
+    """Validate NDJSON task lines and add them in batches (one apply_batch each).
+
+    Tasks whose id already exists are skipped, so an interrupted import can
+    simply be re-run. Returns {"imported", "skipped", "invalid", "errors"},
+    with the first IMPORT_ERROR_SAMPLE problems in "errors".
+    """
+    summary = {"imported": 0, "skipped": 0, "invalid": 0, "errors": []}
+    batch = []
+
+    def flush():
+        imported = sum(1 for task in task_store.apply_batch(username, [("add", task) for task in batch]) if task)
+        summary["imported"] += imported
+        summary["skipped"] += len(batch) - imported
+        batch.clear()
+
+    for line_number, line in enumerate(lines, 1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            task = validate_task_record(json.loads(line))
+        except ValueError as e:
+            summary["invalid"] += 1
+            if len(summary["errors"]) < IMPORT_ERROR_SAMPLE:
+                summary["errors"].append(f"line {line_number}: {e}")
+            continue
+        batch.append(task)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+@app.route('/api/users/<username>/tasks/export')
+def api_export_tasks(username):
+    """All of a user's tasks as NDJSON, one task per line, streamed."""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    return Response(stream_with_context(export_task_lines(username)), mimetype='application/x-ndjson',
+                    headers={"Content-Disposition": f"attachment; filename={username.lower()}_tasks.ndjson"})
+
+@app.route('/api/users/<username>/tasks/import', methods=['POST'])
+def api_import_tasks(username):
+    """Add the tasks in an NDJSON request body, read as a stream; see import_task_lines."""
+    if username not in users:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    if not session.get('is_admin_mode', False):
+        return jsonify({"success": False, "message": "You need to be in admin mode to import tasks."}), 403
+    summary = import_task_lines(username, request.stream)
+    if summary["imported"]:
+        page_cache.invalidate()
+        publish_event("sync", username)
+    return jsonify({"success": summary["invalid"] == 0, **summary})
+
+@app.route('/api/summary')
+def api_summary():
+    today_ist = datetime.now(IST).date()
+    etag = users_etag("summary", users, today_ist)
+    return conditional_json(etag, lambda: {
+        "date": today_ist.isoformat(),
+        "users": build_home_summary(today_ist)
+    })
+
+@app.route('/api/insights')
+def api_insights():
+    today_ist = datetime.now(IST).date()
+    etag = users_etag("insights", users, today_ist)
+    return conditional_json(etag, lambda: {
+        "date": today_ist.isoformat(),
+        "users": build_insights_data(today_ist)
+    })
+
+@app.route('/api/versions')
+def api_versions():
+    """Per-user version counters, polled by pages that don't hold an /events stream."""
+    etag = users_etag(f"versions:{users.version}", users)
+    return conditional_json(etag, lambda: {
+        "versions": {name: task_store.get_version(name) for name in users},
+        "users_version": users.version,
+        "poll_seconds": LIVE_POLL_SECONDS
+    })
+
+@app.route('/api/leaderboard')
+def api_leaderboard():
+    """Top users from the maintained leaderboard: ?by=stars|weekly_completions&limit="""
+    by = request.args.get('by', 'stars')
+    if by not in LEADERBOARD_METRICS:
+        return jsonify({"success": False, "message": f"'by' must be one of: {', '.join(LEADERBOARD_METRICS)}."}), 400
+    limit = max(1, min(request.args.get('limit', LEADERBOARD_DEFAULT_LIMIT, type=int), LEADERBOARD_MAX_SIZE))
+    payload = {"by": by, "week_start": start_of_week_utc().isoformat(), "entries": leaderboard.top(by, limit)}
+    # The ETag hashes the K entries themselves, so it costs O(K) like the read.
+    etag = "leaderboard-" + hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:20]
+    return conditional_json(etag, lambda: payload)
+
+@app.route('/api/search')
+def api_search():
+    """Search task descriptions, categories and reflection notes: ?q=&user=&status=a,b&limit="""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "message": "Missing search query 'q'."}), 400
+    usernames = [name for name in request.args.get('user', '').split(',') if name]
+    unknown = [name for name in usernames if name not in users]
+    if unknown:
+        return jsonify({"success": False, "message": f"User not found: {', '.join(unknown)}"}), 404
+    statuses = [value for value in request.args.get('status', '').split(',') if value]
+    limit = max(1, min(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), SEARCH_MAX_LIMIT))
+    started = time.perf_counter()
+    hits = search_index.search(query, usernames=usernames or None, statuses=statuses or None, limit=limit)
+    return jsonify({
+        "query": query,
+        "results": [{"user": username, "score": score, "task": task.to_dict()} for score, username, task in hits],
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+def due_query_args(args):
+    usernames = [name for name in args.get('user', '').split(',') if name]
+    unknown = [name for name in usernames if name not in users]
+    if unknown:
+        raise LookupError(f"User not found: {', '.join(unknown)}")
+    limit = max(1, min(args.get('limit', DUE_DEFAULT_LIMIT, type=int), DUE_MAX_LIMIT))
+    return usernames or None, limit
+
+@app.route('/api/overdue')
+def api_overdue():
+    """Pending tasks due before today (IST), most overdue first: ?user=a,b&limit="""
+    try:
+        usernames, limit = due_query_args(request.args)
+    except LookupError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    today_ist = datetime.now(IST).date()
+    etag = users_etag(f"overdue:{limit}", usernames or users, today_ist)
+    return conditional_json(etag, lambda: {
+        "date": today_ist.isoformat(),
+        **due_payload(*due_index.overdue(today_ist, usernames=usernames, limit=limit))
+    })
+
+@app.route('/api/upcoming')
+def api_upcoming():
+    """Pending tasks due from today (IST) through ?days= (default 7), soonest first: ?user=a,b&limit="""
+    try:
+        usernames, limit = due_query_args(request.args)
+    except LookupError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    days = max(0, min(request.args.get('days', DUE_UPCOMING_DAYS, type=int), 366))
+    today_ist = datetime.now(IST).date()
+    etag = users_etag(f"upcoming:{days}:{limit}", usernames or users, today_ist)
+    return conditional_json(etag, lambda: {
+        "date": today_ist.isoformat(),
+        "days": days,
+        **due_payload(*due_index.upcoming(today_ist, days=days, usernames=usernames, limit=limit))
+    })
+
+# --- CLI ---
+def _stress_worker(data_dir, backend, username, task_ids, tasks_to_add, result_queue):
+    # Runs in a child process: a fresh default tenant on the scratch dir, so the
+    # store and everything it owns (archive, recurring templates, user registry)
+    # and the indexes all start there, and no rollover runs.
+    global _daily_scheduler_pid
+    _daily_scheduler_pid = os.getpid()
+    tenant = Tenant(None, data_dir)
+    tenant.task_store = make_task_store(data_dir, backend)
+    tenants._tenants[None] = tenant
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['is_admin_mode'] = True
+    completed = 0
+    for i, task_id in enumerate(task_ids):
+        resp = client.post(f"/complete_task/{username}/{task_id}")
+        if resp.status_code == 200 and resp.get_json().get("success"):
+            completed += 1
+        if i < tasks_to_add:
+            client.post(f"/add_task/{username}", data={"task_description": f"stress {os.getpid()} {i}"})
+    result_queue.put(completed)
+
+def run_storage_stress(data_dir, username, workers=4, task_count=100, adds=20, backend=None):
+    """Race `workers` processes completing the same `task_count` pending tasks
+    (each also adding `adds` tasks) in an empty `data_dir`.
+
+    Returns (summary line, list of problems found); no problems means no
+    update was lost.
+    """
+    import multiprocessing
+
+    seed_store = make_task_store(data_dir, backend)
+    now_str = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    seed_tasks = [{
+        "id": str(uuid.uuid4()), "description": f"seed {i}", "status": "pending",
+        "created_at": now_str, "due_date": datetime.now(IST).date().isoformat(), "completed_at": None,
+        "category": None, "priority": None, "color_label": None,
+        "reflection_note": None, "reflection_emoji": None
+    } for i in range(task_count)]
+    seed_store.save_tasks(username, seed_tasks)
+    seed_store.save_user_data({username: {"stars": 0}})
+    write_json_atomic(os.path.join(data_dir, USER_REGISTRY_FILENAME), {"version": 1, "users": [username]})
+    seed_ids = [t["id"] for t in seed_tasks]
+
+    result_queue = multiprocessing.Queue()
+    processes = []
+    for n in range(workers):
+        # Each worker walks the ids from a different offset so they collide mid-list.
+        offset = (n * task_count) // max(workers, 1)
+        order = seed_ids[offset:] + seed_ids[:offset]
+        proc = multiprocessing.Process(target=_stress_worker,
+                                       args=(data_dir, backend, username, order, adds, result_queue))
+        proc.start()
+        processes.append(proc)
+    completions = sum(result_queue.get() for _ in processes)
+    for proc in processes:
+        proc.join()
+
+    check_store = make_task_store(data_dir, backend)
+    final_tasks = check_store.get_tasks(username)
+    final_stars = check_store.get_user_data()[username]["stars"]
+    final_ids = [t["id"] for t in final_tasks]
+    problems = []
+    if completions != task_count:
+        problems.append(f"{completions} successful completions for {task_count} tasks")
+    if len(final_tasks) != task_count + workers * adds:
+        problems.append(f"{len(final_tasks)} tasks on disk, expected {task_count + workers * adds}")
+    if len(set(final_ids)) != len(final_ids):
+        problems.append("duplicate task ids on disk")
+    still_pending = sum(1 for t in final_tasks if t["id"] in set(seed_ids) and t["status"] == "pending")
+    if still_pending:
+        problems.append(f"{still_pending} seeded tasks lost their completion")
+    if final_stars != completions:
+        problems.append(f"star count drifted: {final_stars} stars for {completions} completions")
+    rollup_problems = _rollup_diff(check_store.get_rollup(username), bucket_task_activity(final_tasks))
+    if rollup_problems:
+        problems.append(f"daily rollup out of sync on {len(rollup_problems)} days")
+    summary = (f"{workers} workers, {task_count} contested tasks, {workers * adds} adds: "
+               f"{completions} completions, {len(final_tasks)} tasks, {final_stars} stars.")
+    return summary, problems
+
+@app.cli.command('stress-storage')
+@click.option('--workers', default=4, show_default=True, help='Number of concurrent processes.')
+@click.option('--tasks', 'task_count', default=100, show_default=True, help='Pending tasks every worker races to complete.')
+@click.option('--adds', default=20, show_default=True, help='Tasks each worker adds while racing.')
+def stress_storage_command(workers, task_count, adds):
+    """Race several processes against a scratch data dir and check for lost updates."""
+    scratch_dir = tempfile.mkdtemp(prefix='taskstar-stress-')
+    try:
+        summary, problems = run_storage_stress(scratch_dir, users[0], workers, task_count, adds)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    click.echo(summary)
+    if problems:
+        for problem in problems:
+            click.echo(f"FAIL: {problem}", err=True)
+        raise SystemExit(1)
+    click.echo("OK: no lost updates.")
+
+@app.cli.command('migrate-to-sqlite')
+@click.option('--force', is_flag=True, help='Replace tasks already present in the database.')
+def migrate_to_sqlite_command(force):
+    """Copy data/*_tasks.json and users.json into the SQLite database.
+
+    Run once, then start the app with TASKSTAR_STORAGE=sqlite. The JSON files
+    are left untouched.
+    """
+    json_store = TaskStore(DATA_DIR)
+    sqlite_store = SqliteTaskStore(DATA_DIR)
+    existing = sqlite_store.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    if existing and not force:
+        raise click.ClickException(f"{sqlite_store.db_path} already holds {existing} tasks; pass --force to re-import.")
+
+    suffix = "_tasks.json"
+    migrated_tasks = 0
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if not filename.endswith(suffix):
+            continue
+        user_key = filename[:-len(suffix)]
+        tasks = json_store.get_tasks(user_key)
+        sqlite_store.save_tasks(user_key, tasks)
+        migrated_tasks += len(tasks)
+        click.echo(f"  {user_key}: {len(tasks)} tasks")
+    try:
+        user_data = json_store.get_user_data()
+    except (FileNotFoundError, json.JSONDecodeError):
+        user_data = {}
+    sqlite_store.save_user_data(user_data)
+    click.echo(f"Migrated {migrated_tasks} tasks and {len(user_data)} users into {sqlite_store.db_path}.")
+
+def _rollup_diff(stored, scanned):
+    problems = []
+    for day in sorted(set(stored) | set(scanned)):
+        empty = {"created": 0, "completed": 0, "closed": 0}
+        if stored.get(day, empty) != scanned.get(day, empty):
+            problems.append(f"{day}: rollup {stored.get(day, empty)} != scan {scanned.get(day, empty)}")
+    return problems
+
+@app.cli.command('rollup-rebuild')
+@click.argument('usernames', nargs=-1)
+def rollup_rebuild_command(usernames):
+    """Rebuild the per-day rollup from a full scan (all users by default)."""
+    for username in usernames or users:
+        buckets = task_store.rebuild_rollup(username)
+        click.echo(f"{username}: {len(buckets)} days")
+
+@app.cli.command('rollup-check')
+@click.argument('usernames', nargs=-1)
+def rollup_check_command(usernames):
+    """Compare the stored per-day rollup with a full scan of the tasks, archive included."""
+    failed = False
+    for username in usernames or users:
+        problems = _rollup_diff(task_store.get_rollup(username), bucket_task_activity(get_user_tasks_for_range(username)))
+        if problems:
+            failed = True
+            click.echo(f"{username}: {len(problems)} mismatched days", err=True)
+            for problem in problems:
+                click.echo(f"  {problem}", err=True)
+        else:
+            click.echo(f"{username}: OK")
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('export-tasks')
+@click.argument('username')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='File to write (default: stdout).')
+def export_tasks_command(username, output):
+    """Stream a user's tasks as NDJSON."""
+    if username not in users:
+        raise click.ClickException(f"Unknown user '{username}'.")
+    count = 0
+    for line in export_task_lines(username):
+        output.write(line)
+        count += 1
+    click.echo(f"Exported {count} tasks for {username}.", err=True)
+
+@app.cli.command('import-tasks')
+@click.argument('username')
+@click.argument('source', type=click.File('r'))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Tasks per store write.')
+def import_tasks_command(username, source, batch_size):
+    """Add tasks from an NDJSON file ('-' for stdin), skipping ids that already exist."""
+    if username not in users:
+        raise click.ClickException(f"Unknown user '{username}'.")
+    summary = import_task_lines(username, source, batch_size)
+    click.echo(f"{username}: imported {summary['imported']}, skipped {summary['skipped']} existing, "
+               f"{summary['invalid']} invalid.")
+    for error in summary["errors"]:
+        click.echo(f"  {error}", err=True)
+    if summary["invalid"]:
+        raise SystemExit(1)
+
+@app.cli.command('archive-tasks')
+@click.argument('usernames', nargs=-1)
+@click.option('--days', default=ARCHIVE_HORIZON_DAYS, show_default=True,
+              help='Archive tasks completed more than this many days ago.')
+def archive_tasks_command(usernames, days):
+    """Move old completed tasks to data/archive/ (all users by default)."""
+    for username in usernames or users:
+        click.echo(f"{username}: archived {archive_old_tasks(username, horizon_days=days)} tasks")
+
+@app.cli.command('compact-journals')
+@click.argument('usernames', nargs=-1)
+def compact_journals_command(usernames):
+    """Fold the task and star journals into fresh snapshots (all users by default)."""
+    for username in usernames or users:
+        click.echo(f"{username}: folded {task_store.compact(username)} journal bytes")
+    if not usernames:
+        click.echo(f"users: folded {task_store.compact()} journal bytes")
+
+@app.cli.command('create-tenant')
+@click.argument('name')
+@click.option('--user', 'usernames', multiple=True, help='A first user (repeatable; default: the default users).')
+def create_tenant_command(name, usernames):
+    """Create a tenant's data directory, served under /t/<name>/."""
+    if not _TENANT_NAME_RE.fullmatch(name):
+        raise click.ClickException("Tenant names are 1-40 lowercase letters, digits or dashes.")
+    if Tenants.exists(name):
+        raise click.ClickException(f"Tenant '{name}' already exists.")
+    os.makedirs(Tenants.data_dir(name))
+    with use_tenant(name):
+        if usernames:
+            users.replace([username.capitalize() for username in usernames])
+        init_data()
+        click.echo(f"Created tenant '{name}' in {task_store.data_dir} with users: {', '.join(users)}.")
+
+def init_data():
+    """Create the (current tenant's) data directory and every user's files; run once at startup."""
+    if not os.path.exists(task_store.data_dir):
+        os.makedirs(task_store.data_dir)
     for user_name_init in users:
-        user_task_file = os.path.join(DATA_DIR, f"{user_name_init.lower()}_tasks.json")
-        if not os.path.exists(user_task_file):
-            with open(user_task_file, 'w') as f:
-                json.dump([], f)
+        task_store.ensure_user(user_name_init)
     get_all_user_data()
+
+# Development server. For production see asgi.py (uvicorn, async event
+# streams) or any WSGI server pointed at app:app.
+if __name__ == '__main__':
+    init_data()
     app.run(debug=True)
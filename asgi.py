@@ -0,0 +1,157 @@
+"""ASGI entry point for production: many open connections per process.
+
+    pip install asgiref uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4 --timeout-graceful-shutdown 5
+
+Flask views still run synchronously. Each request runs on its own worker
+thread, so its file and SQLite I/O never blocks the event loop. At most
+TASKSTAR_ASGI_THREADS requests (default 32) run at once per process, and
+the rest wait on the loop without holding a thread. /events is served
+natively on the event loop: an open dashboard costs a small coroutine and
+queue instead of a thread, so one process can hold thousands of them. The
+only blocking work a stream does is its version poll, which is handed to
+the thread pool.
+
+Pages open their /events stream here by default: Flask sees a
+multithreaded server, which is what TASKSTAR_LIVE_UPDATES=auto asks for.
+
+Tenants (see app.py) are resolved the same way for /events as for every
+other route: by /t/<tenant>/ prefix or subdomain.
+
+With several workers, each one's streams see the others' writes through
+the version poll, as with the WSGI server. Event streams never finish on
+their own before EVENTS_MAX_STREAM_SECONDS, so give the server a graceful
+shutdown timeout (as above) or it waits for them on restart; browsers
+reconnect by themselves.
+"""
+import asyncio
+import os
+
+try:
+    from asgiref.sync import ThreadSensitiveContext
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:  # optional dependency, only needed for this entry point
+    raise ImportError("asgi.py needs asgiref (and an ASGI server): pip install asgiref uvicorn") from e
+
+import app as taskstar
+
+ASGI_THREADS = int(os.environ.get("TASKSTAR_ASGI_THREADS", 32))
+SSE_HEADERS = [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+               (b"x-accel-buffering", b"no")]
+
+flask_asgi = WsgiToAsgi(taskstar.app)
+_flask_slots = None
+
+
+class AsyncSubscription:
+    """Event broker subscription feeding an asyncio.Queue from publishing threads."""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put_nowait(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # loop closed; the stream is gone
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass  # covered by the stream's version poll, as for queue.Full
+
+
+async def call_flask(scope, receive, send):
+    # asgiref runs sync code on one shared thread unless each call has its
+    # own ThreadSensitiveContext; the semaphore bounds how many run at once.
+    async with _flask_slots:
+        async with ThreadSensitiveContext():
+            await flask_asgi(scope, receive, send)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def local_tenant_path(scope):
+    """(tenant, path within it) when this node serves the request's tenant, else (None, None)."""
+    host = dict(scope["headers"]).get(b"host", b"").decode("latin-1")
+    try:
+        tenant, _, path = taskstar.resolve_tenant(scope["path"], host)
+    except LookupError:
+        return None, None  # Flask answers with the 404
+    if not taskstar.tenant_is_local(tenant):
+        return None, None  # Flask answers with the redirect or 404
+    return tenant, path
+
+
+async def event_stream(tenant, scope, receive, send):
+    # Tasks and to_thread() calls copy the context, so the whole stream sees the tenant.
+    with taskstar.use_tenant(tenant):
+        await _event_stream(scope, receive, send)
+
+
+async def _event_stream(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    subscription = taskstar.event_broker.subscribe(AsyncSubscription(loop, taskstar.EVENTS_QUEUE_SIZE))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        state = taskstar.EventStream(await asyncio.to_thread(taskstar.task_store.get_versions))
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        await send({"type": "http.response.body", "body": state.hello().encode(), "more_body": True})
+        deadline = loop.time() + taskstar.EVENTS_MAX_STREAM_SECONDS
+        next_poll = loop.time() + taskstar.EVENTS_POLL_SECONDS
+        while loop.time() < deadline:
+            getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=max(0, next_poll - loop.time()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+            if disconnected.done():
+                break
+            pending = [getter.result()] if getter in done else []
+            while not subscription.queue.empty():
+                pending.append(subscription.queue.get_nowait())
+            out = state.render(pending)
+            if loop.time() >= next_poll:
+                next_poll = loop.time() + taskstar.EVENTS_POLL_SECONDS
+                out += state.sync_events(await asyncio.to_thread(taskstar.task_store.get_versions))
+                out = out or ": keepalive\n\n"
+            if out:
+                await send({"type": "http.response.body", "body": out.encode(), "more_body": True})
+        if not disconnected.done():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        disconnected.cancel()
+        taskstar.event_broker.unsubscribe(subscription)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.to_thread(taskstar.init_data)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    global _flask_slots
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if _flask_slots is None:  # created on the server's loop
+        _flask_slots = asyncio.Semaphore(ASGI_THREADS)
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "GET":
+        tenant, path = local_tenant_path(scope)
+        if path == "/events":
+            await event_stream(tenant, scope, receive, send)
+            return
+    await call_flask(scope, receive, send)
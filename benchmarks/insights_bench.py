@@ -0,0 +1,82 @@
+"""Compare the old per-day insights scans with the single-pass aggregation.
+
+Usage (from the repo root):
+
+    python benchmarks/insights_bench.py               # 10k and 100k tasks per user
+    python benchmarks/insights_bench.py --sizes 50000 --days 365
+
+Both approaches are run on the same synthetic task list and their results are
+checked for equality before timings are reported.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as taskstar  # noqa: E402
+from synthetic import make_tasks  # noqa: E402
+
+
+def insights_by_scans(tasks, today, start_of_week):
+    yesterday = today - timedelta(days=1)
+    result = {
+        "pending": taskstar.get_pending_tasks_on_date_ist(tasks, today),
+        "today": taskstar.get_completed_on_date_ist(tasks, today),
+        "yesterday": taskstar.get_completed_on_date_ist(tasks, yesterday),
+        "week": taskstar.get_tasks_completed_this_week_ist(tasks, start_of_week, today),
+        "days": [],
+    }
+    for d in range(7):
+        day = start_of_week + timedelta(days=d)
+        result["days"].append((taskstar.get_completed_on_date_ist(tasks, day),
+                               taskstar.get_pending_tasks_on_date_ist(tasks, day)))
+    return result
+
+
+def insights_single_pass(tasks, today, start_of_week):
+    yesterday = today - timedelta(days=1)
+    week = [start_of_week + timedelta(days=d) for d in range(7)]
+    activity = taskstar.bucket_task_activity(tasks)
+    pending = taskstar.pending_counts_as_of(activity, week + [today])
+    return {
+        "pending": pending[today],
+        "today": taskstar.completed_on(activity, today),
+        "yesterday": taskstar.completed_on(activity, yesterday),
+        "week": taskstar.completed_between(activity, start_of_week, today),
+        "days": [(taskstar.completed_on(activity, day), pending[day]) for day in week],
+    }
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--days', type=int, default=180, help='days of history to spread tasks over')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    today = datetime.now(taskstar.IST).date()
+    start_of_week = today - timedelta(days=today.weekday())
+    print(f"{'tasks':>8} {'scans (s)':>10} {'single pass (s)':>16} {'speedup':>8}")
+    for size in args.sizes:
+        tasks = taskstar.load_tasks(make_tasks(size, args.days))
+        old_time, old_result = best_of(lambda: insights_by_scans(tasks, today, start_of_week), args.repeat)
+        new_time, new_result = best_of(lambda: insights_single_pass(tasks, today, start_of_week), args.repeat)
+        if old_result != new_result:
+            sys.exit(f"Results differ at {size} tasks:\n  scans:       {old_result}\n  single pass: {new_result}")
+        print(f"{size:>8} {old_time:>10.3f} {new_time:>16.3f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""Drive every route and the main helpers against synthetic data and report latency.
+
+Usage (from the repo root):
+
+    python benchmarks/routes_bench.py > run.json         # 4 users x 2000 tasks, JSON backend
+    python benchmarks/routes_bench.py --users 10 --tasks 20000 --days 365 --backend sqlite
+    python benchmarks/routes_bench.py --data-dir /tmp/taskstar-data   # from benchmarks/synthetic.py
+    python benchmarks/routes_bench.py --baseline run.json --fail-on-regression
+
+Each scenario runs --warmup untimed times, then --iterations timed times.
+Anything a scenario needs (a fresh pending task, enough stars, a cold cache)
+is prepared outside the timed call. The report has p50/p95/p99 and mean
+latency, throughput and the process's peak RSS after the scenario. The table
+goes to stderr and the JSON report to stdout (or --output).
+
+Routes the app registers but no scenario exercises are listed under
+"uncovered_routes", so a new endpoint doesn't go unmeasured unnoticed.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as taskstar  # noqa: E402
+from synthetic import build_data_dir, make_tasks  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile.
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Context:
+    """What the scenarios share: the test client and the benchmarked user."""
+
+    def __init__(self, client, users):
+        self.client = client
+        self.users = users
+        self.user = users[0]
+        self.counter = 0
+
+    def unique(self):
+        self.counter += 1
+        return self.counter
+
+    def ensure_admin(self):
+        with self.client.session_transaction() as sess:
+            sess['is_admin_mode'] = True
+
+    def pending_task(self, description="bench"):
+        return taskstar.task_store.add_task(self.user, taskstar.new_task(description, None))['id']
+
+    def recurring_template(self, description="bench"):
+        template = taskstar.make_recurring_template(description, "daily", datetime.now(taskstar.IST).date().isoformat())
+        return taskstar.task_store.recurring.add(self.user, template)['id']
+
+    def get(self, url, expect=200, **kwargs):
+        response = self.client.get(url, **kwargs)
+        response.get_data()  # drain streamed bodies inside the timed call
+        if response.status_code != expect:
+            raise AssertionError(f"GET {url}: {response.status_code}, expected {expect}")
+        return response
+
+    def post(self, url, expect=200, **kwargs):
+        response = self.client.post(url, **kwargs)
+        if response.status_code != expect:
+            raise AssertionError(f"POST {url}: {response.status_code}, expected {expect}")
+        return response
+
+
+def cold(ctx):
+    taskstar.page_cache.invalidate()
+
+
+def open_event_stream(ctx, _):
+    # The stream never ends on its own: time up to the first event, then hang up.
+    # Streams are only served by multithreaded servers (LIVE_UPDATES=auto).
+    response = ctx.client.get("/events", environ_overrides={"wsgi.multithread": True})
+    if not next(iter(response.response)).startswith(b"retry:"):
+        raise AssertionError("GET /events: no hello event")
+    response.close()
+
+
+def scenarios():
+    """(name, endpoint or None for helpers, setup(ctx) -> arg, run(ctx, arg))."""
+    today = lambda: datetime.now(taskstar.IST).date()  # noqa: E731
+    return [
+        # Pages, with and without the rendered-page cache.
+        ("GET / (cold)", "index", cold, lambda ctx, _: ctx.get("/")),
+        ("GET / (cached)", "index", None, lambda ctx, _: ctx.get("/")),
+        ("GET /dashboard (cold)", "dashboard", cold, lambda ctx, _: ctx.get("/dashboard")),
+        ("GET /dashboard (cached)", "dashboard", None, lambda ctx, _: ctx.get("/dashboard")),
+        ("GET /insights (cold)", "insights_page", cold, lambda ctx, _: ctx.get("/insights")),
+        ("GET /insights (cached)", "insights_page", None, lambda ctx, _: ctx.get("/insights")),
+        ("GET /task_view (all users)", "main_app_view", None, lambda ctx, _: ctx.get("/task_view")),
+        ("GET /task_view?user", "main_app_view", None,
+         lambda ctx, _: ctx.get(f"/task_view?user={ctx.user}")),
+        ("GET /task_view?user&filters", "main_app_view", None,
+         lambda ctx, _: ctx.get(f"/task_view?user={ctx.user}&status=done_yesterday&category=work")),
+        ("GET /settings", "settings", None, lambda ctx, _: ctx.get("/settings")),
+        ("GET /daily_update_status", "daily_update_status", None, lambda ctx, _: ctx.get("/daily_update_status")),
+        ("GET /cache_stats", "cache_stats", None, lambda ctx, _: ctx.get("/cache_stats")),
+        ("GET /metrics", "metrics", None, lambda ctx, _: ctx.get("/metrics")),
+        ("GET /events (until hello)", "events", None, open_event_stream),
+        ("GET /api/versions", "api_versions", None, lambda ctx, _: ctx.get("/api/versions")),
+        ("GET /edit_task_form", "edit_task_form", lambda ctx: (ctx.ensure_admin(), ctx.pending_task())[1],
+         lambda ctx, task_id: ctx.get(f"/edit_task_form/{ctx.user}/{task_id}")),
+
+        # JSON API.
+        ("GET /api/users/<u>/tasks", "api_user_tasks", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/tasks")),
+        ("GET /api/users/<u>/tasks (304)", "api_user_tasks",
+         lambda ctx: ctx.get(f"/api/users/{ctx.user}/tasks").headers['ETag'],
+         lambda ctx, etag: ctx.get(f"/api/users/{ctx.user}/tasks", expect=304, headers={"If-None-Match": etag})),
+        ("GET /api/users/<u>/tasks/page", "api_user_tasks_page", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/tasks/page?limit=100")),
+        ("GET /api/users/<u>/tasks/page (desc, filtered)", "api_user_tasks_page", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/tasks/page?order=desc&status=done_yesterday&category=home")),
+        ("GET /api/users/<u>/star_history", "api_user_star_history", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/star_history")),
+        ("GET /api/users/<u>/tasks/export", "api_export_tasks", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/tasks/export")),
+        ("GET /api/summary", "api_summary", None, lambda ctx, _: ctx.get("/api/summary")),
+        ("GET /api/insights", "api_insights", None, lambda ctx, _: ctx.get("/api/insights")),
+        ("GET /api/leaderboard", "api_leaderboard", None, lambda ctx, _: ctx.get("/api/leaderboard")),
+        ("GET /api/leaderboard (weekly, top 3)", "api_leaderboard", None,
+         lambda ctx, _: ctx.get("/api/leaderboard?by=weekly_completions&limit=3")),
+        ("GET /api/search", "api_search", None, lambda ctx, _: ctx.get("/api/search?q=synthetic+task")),
+        ("GET /api/search (prefix, one user)", "api_search", None,
+         lambda ctx, _: ctx.get(f"/api/search?q=synth&user={ctx.user}&status=pending")),
+        ("GET /api/overdue", "api_overdue", None, lambda ctx, _: ctx.get("/api/overdue")),
+        ("GET /api/upcoming", "api_upcoming", None, lambda ctx, _: ctx.get("/api/upcoming?days=14")),
+        ("GET /api/users/<u>/recurring", "api_recurring", None, lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/recurring")),
+        ("GET /api/users/<u>/occurrences (week)", "api_occurrences", None,
+         lambda ctx, _: ctx.get(f"/api/users/{ctx.user}/occurrences?from={today()}&to={today() + timedelta(days=6)}")),
+
+        # Mutations.
+        ("POST /complete_task", "complete_task", lambda ctx: ctx.pending_task(),
+         lambda ctx, task_id: ctx.post(f"/complete_task/{ctx.user}/{task_id}")),
+        ("POST /add_task", "add_task", lambda ctx: ctx.ensure_admin(),
+         lambda ctx, _: ctx.post(f"/add_task/{ctx.user}", expect=302,
+                                 data={"task_description": "bench add", "task_due_date": "2030-01-01"})),
+        ("POST /update_task", "update_task", lambda ctx: (ctx.ensure_admin(), ctx.pending_task())[1],
+         lambda ctx, task_id: ctx.post(f"/update_task/{ctx.user}/{task_id}", expect=302,
+                                       data={"task_description": "bench edit"})),
+        ("POST /delete_task", "delete_task", lambda ctx: (ctx.ensure_admin(), ctx.pending_task())[1],
+         lambda ctx, task_id: ctx.post(f"/delete_task/{ctx.user}/{task_id}", expect=302)),
+        ("POST /api/users/<u>/recurring", "api_recurring", lambda ctx: ctx.ensure_admin(),
+         lambda ctx, _: ctx.post(f"/api/users/{ctx.user}/recurring", expect=201,
+                                 json={"description": "bench repeat", "freq": "weekly", "weekdays": [0, 3]})),
+        ("POST /delete_recurring", "delete_recurring", lambda ctx: (ctx.ensure_admin(), ctx.recurring_template())[1],
+         lambda ctx, template_id: ctx.post(f"/delete_recurring/{ctx.user}/{template_id}", expect=302)),
+        ("POST /settings/purchase", "handle_purchase", lambda ctx: taskstar.task_store.add_stars(ctx.user, 25),
+         lambda ctx, _: ctx.post(f"/settings/purchase/{ctx.user}", json={"item_type": "accentColor", "value": "#123456"})),
+        ("POST tasks:batch (50 completes)", "api_tasks_batch",
+         lambda ctx: [{"op": "complete", "id": ctx.pending_task()} for _ in range(50)],
+         lambda ctx, operations: ctx.post(f"/api/users/{ctx.user}/tasks:batch", json={"operations": operations})),
+        ("POST tasks/import (100 tasks)", "api_import_tasks",
+         lambda ctx: (ctx.ensure_admin(), "".join(json.dumps(t) + "\n" for t in make_tasks(100, 30, seed=ctx.unique())))[1],
+         lambda ctx, body: ctx.post(f"/api/users/{ctx.user}/tasks/import", data=body,
+                                    content_type="application/x-ndjson")),
+        ("POST /admin/trigger_daily_update", "trigger_daily_update", lambda ctx: ctx.ensure_admin(),
+         lambda ctx, _: ctx.post("/admin/trigger_daily_update", expect=302)),
+        ("POST /admin_login", "admin_login_global", None,
+         lambda ctx, _: ctx.post("/admin_login", expect=302, data={"admin_password": taskstar.ADMIN_PASSWORD})),
+        ("POST /admin_logout", "admin_logout_global", lambda ctx: ctx.ensure_admin(),
+         lambda ctx, _: ctx.post("/admin_logout", expect=302)),
+        ("POST /add_user_admin", "add_user_admin", lambda ctx: (ctx.ensure_admin(), f"Bench{ctx.unique()}")[1],
+         lambda ctx, name: ctx.post("/add_user_admin", expect=302, data={"new_username": name})),
+        ("POST /admin/delete_user", "delete_user_admin",
+         lambda ctx: (ctx.ensure_admin(), ctx.post("/add_user_admin", expect=302,
+                                                    data={"new_username": f"Gone{ctx.unique()}"}), taskstar.users[-1])[2],
+         lambda ctx, name: ctx.post(f"/admin/delete_user/{name}", expect=302)),
+
+        # Helpers called directly.
+        ("task_store.get_tasks (cold)", None, lambda ctx: taskstar.task_store.invalidate(),
+         lambda ctx, _: taskstar.task_store.get_tasks(ctx.user)),
+        ("task_store.get_tasks (cached)", None, None, lambda ctx, _: taskstar.task_store.get_tasks(ctx.user)),
+        ("task_store.query_tasks", None, None,
+         lambda ctx, _: taskstar.task_store.query_tasks(ctx.user, statuses=["pending"], limit=100)),
+        ("task_store.get_rollup", None, None, lambda ctx, _: taskstar.task_store.get_rollup(ctx.user)),
+        ("load_tasks", None, lambda ctx: [t.to_dict() for t in taskstar.task_store.get_tasks(ctx.user)],
+         lambda ctx, raw: taskstar.load_tasks(raw)),
+        ("bucket_task_activity", None, None,
+         lambda ctx, _: taskstar.bucket_task_activity(taskstar.task_store.get_tasks(ctx.user))),
+        ("build_home_summary", None, None, lambda ctx, _: taskstar.build_home_summary(today())),
+        ("build_insights_data", None, None, lambda ctx, _: taskstar.build_insights_data(today())),
+        ("get_all_user_data", None, None, lambda ctx, _: taskstar.get_all_user_data()),
+    ]
+
+
+def run_scenario(ctx, setup, run, iterations, warmup):
+    timings = []
+    for i in range(warmup + iterations):
+        arg = setup(ctx) if setup else None
+        start = time.perf_counter()
+        run(ctx, arg)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    total = sum(timings)
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "mean_ms": round(total / len(timings) * 1000, 3),
+        "throughput_per_s": round(len(timings) / total, 1) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """{scenario: {"p50_ratio", "verdict"}} for scenarios present in both runs."""
+    comparison = {}
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"]
+        verdict = "regression" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        comparison[name] = {"p50_ratio": round(ratio, 3), "verdict": verdict}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=2000, help='tasks per user')
+    parser.add_argument('--days', type=int, default=180, help='days of history to spread tasks over')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--data-dir', help='use (a copy of) an existing synthetic data dir instead of generating one')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', help='run only scenarios whose name contains this text')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 change that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+    # The app prints progress (daily updates, warnings); keep stdout for the report.
+    report_stream, sys.stdout = sys.stdout, sys.stderr
+
+    scratch = tempfile.mkdtemp(prefix='taskstar-bench-')
+    try:
+        data_dir = os.path.join(scratch, 'data')
+        if args.data_dir:
+            shutil.copytree(args.data_dir, data_dir)
+        else:
+            build_data_dir(data_dir, args.users, args.tasks, args.days, args.backend)
+
+        taskstar.app.config['TESTING'] = True
+        # Point the default tenant at the scratch directory; its user registry follows the store.
+        taskstar.tenants.get(None).task_store = taskstar.make_task_store(data_dir, args.backend)
+        names = list(taskstar.users)
+        taskstar.page_cache.invalidate()
+        ctx = Context(taskstar.app.test_client(), names)
+
+        covered, results = set(), {}
+        for name, endpoint, setup, run in scenarios():
+            if args.only and args.only not in name:
+                continue
+            covered.add(endpoint)
+            results[name] = run_scenario(ctx, setup, run, args.iterations, args.warmup)
+            r = results[name]
+            print(f"{name:<48} p50 {r['p50_ms']:>9.3f} ms  p95 {r['p95_ms']:>9.3f}  p99 {r['p99_ms']:>9.3f}  "
+                  f"{r['throughput_per_s'] or 0:>9.1f}/s  rss {r['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    endpoints = {rule.endpoint for rule in taskstar.app.url_map.iter_rules() if rule.endpoint != 'static'}
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "users": len(names),
+            "tasks_per_user": None if args.data_dir else args.tasks,
+            "days": None if args.data_dir else args.days,
+            "data_dir": args.data_dir,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+        "uncovered_routes": [] if args.only else sorted(endpoints - covered),
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(results, json.load(f), args.threshold)
+        for name, item in report["comparison"].items():
+            if item["verdict"] != "same":
+                print(f"{item['verdict']:>10}: {name} ({item['p50_ratio']}x baseline p50)", file=sys.stderr)
+        regressions = [name for name, item in report["comparison"].items() if item["verdict"] == "regression"]
+    if report["uncovered_routes"]:
+        print(f"Uncovered routes: {', '.join(report['uncovered_routes'])}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, report_stream, indent=2)
+        print(file=report_stream)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
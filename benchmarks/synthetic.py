@@ -0,0 +1,94 @@
+"""Build a synthetic data directory for benchmarking.
+
+Usage (from the repo root):
+
+    python benchmarks/synthetic.py /tmp/taskstar-data --users 4 --tasks 10000 --days 365
+    python benchmarks/synthetic.py /tmp/taskstar-data --backend sqlite
+
+The directory gets the files the app itself writes (task snapshots, rollups,
+users.json and the user registry, version counters and star ledgers, or
+taskstar.db for SQLite), so an app pointed at it behaves as it would on real
+data of that size.
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as taskstar  # noqa: E402
+
+CATEGORIES = [None, None, "work", "home", "health", "study"]
+LEDGER_ENTRIES_PER_USER = 40
+
+
+def user_names(count):
+    return [f"User{i:03d}" for i in range(count)]
+
+
+def make_tasks(count, days, seed=0, now=None):
+    """`count` task dicts created over the last `days` days; about 20% pending."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    tasks = []
+    for _ in range(count):
+        created = now - timedelta(seconds=rng.randint(0, days * 86400))
+        status, completed = 'pending', None
+        if rng.random() >= 0.2:
+            completed = min(now, created + timedelta(seconds=rng.randint(0, 3 * 86400)))
+            status = 'completed' if completed.date() == now.date() else 'done_yesterday'
+        tasks.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "description": f"Synthetic task {rng.randrange(10 ** 6)}",
+            "status": status,
+            "created_at": created.isoformat().replace('+00:00', 'Z'),
+            "due_date": (created + timedelta(days=rng.randint(0, 14))).date().isoformat(),
+            "completed_at": completed.isoformat().replace('+00:00', 'Z') if completed else None,
+            "category": rng.choice(CATEGORIES),
+            "priority": None, "color_label": None,
+            "reflection_note": None, "reflection_emoji": None,
+        })
+    return tasks
+
+
+def build_data_dir(path, users=4, tasks_per_user=1000, days=180, backend="json", seed=0):
+    """Populate `path` for `users` synthetic users and return their names."""
+    os.makedirs(path, exist_ok=True)
+    store = taskstar.make_task_store(path, backend)
+    rng = random.Random(seed)
+    names = user_names(users)
+    for n, name in enumerate(names):
+        store.save_tasks(name, make_tasks(tasks_per_user, days, seed=seed + n))
+        balance = 0
+        entries = []
+        for _ in range(LEDGER_ENTRIES_PER_USER):
+            balance += rng.randint(1, 30)
+            entries.append(taskstar.star_ledger_entry("Synthetic purchase", -rng.randint(1, 10), balance))
+        store.append_star_ledger(name, entries)
+    store.save_user_data({name: {"stars": rng.randint(0, 500)} for name in names})
+    taskstar.write_json_atomic(os.path.join(path, taskstar.USER_REGISTRY_FILENAME), {"version": 1, "users": names})
+    # Mark today's rollover as done so the background scheduler stays idle.
+    taskstar.write_json_atomic(os.path.join(path, taskstar.DAILY_UPDATE_MARKER_FILENAME),
+                               {"last_run_date": datetime.now(taskstar.IST).date().isoformat()})
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='directory to create or fill')
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=1000, help='tasks per user')
+    parser.add_argument('--days', type=int, default=180, help='days of history to spread tasks over')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = build_data_dir(args.path, args.users, args.tasks, args.days, args.backend, args.seed)
+    print(f"Wrote {len(names)} users x {args.tasks} tasks over {args.days} days to {args.path} ({args.backend}).")
+
+
+if __name__ == '__main__':
+    main()
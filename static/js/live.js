@@ -0,0 +1,83 @@
+// Live updates over server-sent events from /events.
+//
+// Pages call TaskstarLive.connect({task, stars, sync}, root, stream) with handlers that
+// take the event's data; `root` is the tenant's URL prefix (request.script_root). "task" events carry the task ({"id": ...} for deletes) and
+// "stars" events the new balance; "sync" means the user changed somewhere this
+// worker couldn't describe (another worker, a batch, the daily rollover) and
+// the page should refetch that user. Adding or removing users reloads the page.
+//
+// The last version seen per user is remembered, so after a reconnect any user
+// whose version moved on while the stream was down gets a sync.
+//
+// `stream` is false when the server can't spare a worker per open page (see
+// LIVE_UPDATES in app.py). The page then polls /api/versions instead, which
+// is ETag-cached, and every change arrives as a sync.
+const TaskstarLive = {
+    connected: false,
+    versions: {},
+    usersVersion: null,
+
+    connect(handlers, root = '', stream = true) {
+        if (!stream || !window.EventSource) {
+            this.poll(handlers, root);
+            return;
+        }
+        const source = new EventSource(`${root}/events`);
+
+        source.addEventListener('hello', event => {
+            const data = JSON.parse(event.data);
+            this.connected = true;
+            this.catchUp(data.versions, handlers);
+        });
+
+        for (const type of ['task', 'stars', 'sync']) {
+            source.addEventListener(type, event => {
+                const data = JSON.parse(event.data);
+                const seen = this.versions[data.user] || 0;
+                // A sync for a version whose event already arrived has nothing new.
+                if (type === 'sync' && data.version <= seen) { return; }
+                this.versions[data.user] = Math.max(seen, data.version);
+                if (handlers[type]) { handlers[type](data); }
+            });
+        }
+
+        source.addEventListener('users', () => window.location.reload());
+        source.onerror = () => { this.connected = false; };
+    },
+
+    // Records `versions`; on any call but the first, syncs users that moved on.
+    catchUp(versions, handlers) {
+        const known = Object.keys(this.versions).length > 0;
+        for (const [user, version] of Object.entries(versions)) {
+            if (known && version > (this.versions[user] || 0) && handlers.sync) {
+                handlers.sync({ type: 'sync', user: user, version: version });
+            }
+            this.versions[user] = Math.max(this.versions[user] || 0, version);
+        }
+    },
+
+    poll(handlers, root) {
+        const check = () => fetch(`${root}/api/versions`)
+            .then(response => response.json())
+            .then(data => {
+                if (this.usersVersion !== null && data.users_version !== this.usersVersion) {
+                    window.location.reload();
+                    return;
+                }
+                this.usersVersion = data.users_version;
+                this.catchUp(data.versions, handlers);
+                setTimeout(check, data.poll_seconds * 1000);
+            })
+            .catch(() => setTimeout(check, 30000));
+        check();
+    },
+
+    // Collapses a burst of events into one call, `delay` ms after the last.
+    debounce(fn, delay) {
+        let timer = null;
+        return (...args) => {
+            clearTimeout(timer);
+            timer = setTimeout(() => fn(...args), delay);
+        };
+    }
+};
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as taskstar  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client whose default tenant and tenants live under tmp_path."""
+    monkeypatch.setattr(taskstar, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(taskstar, "TENANTS_DIR", str(tmp_path / "data" / "tenants"))
+    monkeypatch.setattr(taskstar.tenant_map, "path", str(tmp_path / "data" / "tenant_map.json"))
+    monkeypatch.setattr(taskstar.tenants, "_tenants", {})
+    monkeypatch.setattr(taskstar, "_daily_scheduler_pid", os.getpid())  # no background rollover
+    # The middleware clears the request's tenant when the response is closed;
+    # responses a test never closes would leave it set for the next test.
+    taskstar._current_tenant.set(None)
+    taskstar.page_cache.invalidate()
+    taskstar.app.config['TESTING'] = True
+    yield taskstar.app.test_client()
+    taskstar._current_tenant.set(None)
+    taskstar.page_cache.invalidate()
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import app as taskstar
+
+
+def completed_task(description, days_ago):
+    done = datetime.now(taskstar.timezone.utc) - timedelta(days=days_ago)
+    task = taskstar.new_task(description, None)
+    task.update(status="completed", created_at=done.isoformat().replace('+00:00', 'Z'),
+                completed_at=done.isoformat().replace('+00:00', 'Z'))
+    return task
+
+
+def test_archiving_moves_old_completions_out_of_the_active_store(client):
+    user = next(iter(taskstar.users))
+    old = taskstar.task_store.add_task(user, completed_task("old", 200))
+    recent = taskstar.task_store.add_task(user, completed_task("recent", 2))
+    pending = taskstar.task_store.add_task(user, taskstar.new_task("pending", None))
+    rollup = dict(taskstar.task_store.get_rollup(user))
+
+    assert taskstar.archive_old_tasks(user, horizon_days=90) == 1
+    assert [task.id for task in taskstar.task_store.get_tasks(user)] == [recent.id, pending.id]
+    assert [task.id for task in taskstar.task_store.archive.iter_tasks(user)] == [old.id]
+    # Analytics still see it, and the rollup keeps counting it.
+    assert old.id in {task.id for task in taskstar.get_user_tasks_for_range(user)}
+    assert taskstar.task_store.get_rollup(user) == rollup
+    assert taskstar.archive_old_tasks(user, horizon_days=90) == 0
+
+
+def test_range_reads_open_only_the_months_they_touch(client):
+    user = next(iter(taskstar.users))
+    old = taskstar.task_store.add_task(user, completed_task("old", 200))
+    taskstar.archive_old_tasks(user, horizon_days=90)
+    today = datetime.now(taskstar.IST).date()
+    assert old.id not in {task.id for task in taskstar.get_user_tasks_for_range(user, today - timedelta(days=7), today)}
+    assert old.id in {task.id for task in taskstar.get_user_tasks_for_range(user, old.completed_date_ist, today)}
+
+
+def test_readers_skip_copies_left_by_an_interrupted_run(client):
+    user = next(iter(taskstar.users))
+    old = taskstar.task_store.add_task(user, completed_task("old", 200))
+    # A run that crashed after writing the archive but before removing the task...
+    taskstar.task_store.archive.append(user, [old])
+    assert [task.id for task in taskstar.get_user_tasks_for_range(user)].count(old.id) == 1
+    # ...is completed by the next one, which may write a second copy.
+    assert taskstar.archive_old_tasks(user, horizon_days=90) == 1
+    assert [task.id for task in taskstar.task_store.archive.iter_tasks(user)] == [old.id]
@@ -0,0 +1,31 @@
+import app as taskstar
+
+
+def run_workload(store):
+    tasks = [store.add_task("alice", taskstar.new_task(f"task {n}", f"2026-01-{n + 1:02d}")) for n in range(6)]
+    store.update_task("alice", tasks[0]["id"], {"status": "completed", "completed_at": tasks[0]["created_at"]})
+    store.update_task("alice", tasks[1]["id"], {"description": "renamed"})
+    store.delete_task("alice", tasks[2]["id"])
+    assert store.update_task("alice", tasks[0]["id"], {"status": "completed"}, only_if_status="pending") is None
+    store.add_stars("alice", 3)
+
+
+def test_sqlite_backend_matches_the_json_store(tmp_path):
+    json_store = taskstar.make_task_store(str(tmp_path / "json"), "json")
+    sqlite_store = taskstar.make_task_store(str(tmp_path / "sqlite"), "sqlite")
+    run_workload(json_store)
+    run_workload(sqlite_store)
+
+    def normalised(store):
+        return sorted((task["description"], task["status"], task["due_date"]) for task in store.get_tasks("alice"))
+    assert normalised(json_store) == normalised(sqlite_store)
+    assert json_store.get_rollup("alice") == sqlite_store.get_rollup("alice")
+    assert json_store.get_user_data()["alice"]["stars"] == sqlite_store.get_user_data()["alice"]["stars"] == 3
+    assert json_store.get_version("alice") == sqlite_store.get_version("alice")
+
+    def page_descriptions(store, **filters):
+        page, _ = store.query_tasks("alice", limit=10, **filters)
+        return [task["description"] for task in page]
+    for filters in ({}, {"statuses": ["pending"]}, {"due_from": "2026-01-03", "due_to": "2026-01-05"},
+                    {"newest_first": True}):
+        assert page_descriptions(json_store, **filters) == page_descriptions(sqlite_store, **filters)
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+import app as taskstar
+
+
+def overdue(client):
+    return [item["task"]["description"] for item in client.get("/api/overdue").json["tasks"]]
+
+
+def test_record_skips_entries_another_write_moved_on(client, monkeypatch):
+    user = next(iter(taskstar.users))
+    with client.session_transaction() as session:
+        session["is_admin_mode"] = True
+    yesterday = (datetime.now(taskstar.IST).date() - timedelta(days=1)).isoformat()
+    mine = taskstar.task_store.add_task(user, taskstar.new_task("mine", yesterday))
+    theirs = taskstar.task_store.add_task(user, taskstar.new_task("theirs", yesterday))
+    overdue(client)
+    assert sorted(overdue(client)) == ["mine", "theirs"]  # the first request seeds users.json
+
+    # Another worker completes its task right before this request's delete lands.
+    apply_batch = taskstar.task_store.apply_batch
+
+    def racing_apply_batch(username, operations, award_stars=None):
+        monkeypatch.setattr(taskstar.task_store, "apply_batch", apply_batch)
+        apply_batch(username, [("update", theirs["id"], {"status": "completed"}, None)])
+        return apply_batch(username, operations, award_stars)
+    monkeypatch.setattr(taskstar.task_store, "apply_batch", racing_apply_batch)
+
+    client.post(f"/delete_task/{user}/{mine['id']}")
+    assert overdue(client) == []
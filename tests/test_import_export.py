@@ -0,0 +1,39 @@
+import json
+
+import app as taskstar
+
+
+def test_export_round_trips_through_import(client):
+    users = list(taskstar.users)
+    source, target = users[0], users[1]
+    with client.session_transaction() as session:
+        session["is_admin_mode"] = True
+    for n in range(3):
+        taskstar.task_store.add_task(source, taskstar.new_task(f"task {n}", None))
+    exported = client.get(f"/api/users/{source}/tasks/export")
+    assert exported.mimetype == "application/x-ndjson"
+    lines = exported.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [task.id for task in taskstar.task_store.get_tasks(source)]
+
+    body = "\n".join(lines) + "\n"
+    first = client.post(f"/api/users/{target}/tasks/import", data=body).json
+    again = client.post(f"/api/users/{target}/tasks/import", data=body).json
+    assert (first["imported"], first["skipped"]) == (3, 0)
+    assert (again["imported"], again["skipped"]) == (0, 3)  # re-running an import is harmless
+    assert [task.to_dict() for task in taskstar.task_store.get_tasks(target)][-3:] == [json.loads(line) for line in lines]
+
+
+def test_import_reports_invalid_lines_and_keeps_the_rest(client):
+    user = next(iter(taskstar.users))
+    good = taskstar.new_task("good", None)
+    lines = [json.dumps(good), "not json", json.dumps({**taskstar.new_task("bad", None), "status": "maybe"}), ""]
+    summary = taskstar.import_task_lines(user, lines, batch_size=1)
+    assert (summary["imported"], summary["invalid"]) == (1, 2)
+    assert [error.split(":")[0] for error in summary["errors"]] == ["line 2", "line 3"]
+    assert taskstar.task_store.find_task(user, good["id"]) is not None
+
+
+def test_import_needs_admin_mode(client):
+    user = next(iter(taskstar.users))
+    response = client.post(f"/api/users/{user}/tasks/import", data=json.dumps(taskstar.new_task("x", None)))
+    assert response.status_code == 403
@@ -0,0 +1,100 @@
+import json
+import os
+
+import app as taskstar
+
+
+def lines(path):
+    with open(path, 'rb') as f:
+        return f.read().split(b"\n")
+
+
+def test_append_truncates_a_torn_last_line(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    taskstar.append_jsonl(path, [{"n": 1}])
+    with open(path, 'ab') as f:
+        f.write(b'{"n": 2, "tor')  # a crash mid-append
+    _, size = taskstar.append_jsonl(path, [{"n": 3}])
+    assert [json.loads(line) for line in lines(path) if line] == [{"n": 1}, {"n": 3}]
+    assert size == (tmp_path / "log.jsonl").stat().st_size
+
+
+def test_task_journal_and_star_ledger_recover_the_same_way(tmp_path):
+    store = taskstar.make_task_store(str(tmp_path), "json")
+    first = store.add_task("alice", taskstar.new_task("first", None))
+    store.append_star_ledger("alice", [taskstar.star_ledger_entry("first", 1, 1)])
+    for path in (store.journal_file("alice"), store.star_ledger_file("alice")):
+        with open(path, 'ab') as f:
+            f.write(b'{"torn')
+
+    fresh = taskstar.make_task_store(str(tmp_path), "json")
+    second = fresh.add_task("alice", taskstar.new_task("second", None))
+    fresh.append_star_ledger("alice", [taskstar.star_ledger_entry("second", 1, 2)])
+
+    for path in (fresh.journal_file("alice"), fresh.star_ledger_file("alice")):
+        assert b'{"torn' not in b"\n".join(lines(path))
+    reread = taskstar.make_task_store(str(tmp_path), "json")
+    assert [task.id for task in reread.get_tasks("alice")] == [first.id, second.id]
+    assert [entry["reason"] for entry in reread.get_star_ledger("alice")[0]] == ["second", "first"]
+
+
+def complete(store, username, task):
+    now = taskstar.datetime.now(taskstar.timezone.utc).isoformat().replace('+00:00', 'Z')
+    return store.update_task(username, task["id"], {"status": "completed", "completed_at": now})
+
+
+def test_writes_append_rollup_and_version_changes_instead_of_rewriting(tmp_path):
+    store = taskstar.make_task_store(str(tmp_path), "json")
+    store.save_tasks("alice", [taskstar.new_task(f"old {n}", None) for n in range(200)])
+    snapshots = [store.rollup_file("alice"), store.versions_file]
+    before = [os.stat(path).st_mtime_ns for path in snapshots]
+    journals = [store.journal_file("alice"), store.versions_journal_file]
+
+    growth = []
+    for n in range(5):
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in journals]
+        complete(store, "alice", store.add_task("alice", taskstar.new_task(f"new {n}", None)))
+        growth.append([os.path.getsize(path) - size for path, size in zip(journals, sizes)])
+
+    assert [os.stat(path).st_mtime_ns for path in snapshots] == before
+    for column in zip(*growth):  # bytes per write don't grow with the history
+        assert max(column) - min(column) < 16
+    assert store.get_version("alice") == 11
+
+
+def test_rollup_and_versions_survive_replay_and_compaction(tmp_path):
+    store = taskstar.make_task_store(str(tmp_path), "json")
+    tasks = [store.add_task("alice", taskstar.new_task(f"task {n}", None)) for n in range(6)]
+    complete(store, "alice", tasks[0])
+    complete(store, "alice", tasks[1])
+    store.delete_task("alice", tasks[2]["id"])
+    expected = taskstar.bucket_task_activity(store.get_tasks("alice"))
+    assert store.get_rollup("alice") == expected
+
+    fresh = taskstar.make_task_store(str(tmp_path), "json")
+    assert fresh.get_rollup("alice") == expected
+    assert fresh.get_versions() == store.get_versions() == {"alice": 9}
+
+    assert fresh.compact("alice") > 0
+    complete(fresh, "alice", tasks[3])
+    expected = taskstar.bucket_task_activity(fresh.get_tasks("alice"))
+    for reader in (fresh, taskstar.make_task_store(str(tmp_path), "json")):
+        assert reader.get_rollup("alice") == expected
+        assert reader.get_version("alice") == 10
+
+
+def test_rollup_written_before_the_journal_carried_deltas_still_loads(tmp_path):
+    store = taskstar.make_task_store(str(tmp_path), "json")
+    first = store.add_task("alice", taskstar.new_task("first", None))
+    legacy = {day.isoformat(): counts for day, counts in store.get_rollup("alice").items()}
+    with open(store.rollup_file("alice"), 'w') as f:
+        json.dump(legacy, f)
+    entries = [json.loads(line) for line in lines(store.journal_file("alice")) if line]
+    with open(store.journal_file("alice"), 'w') as f:
+        for entry in entries:
+            entry.pop("rollup")
+            f.write(json.dumps(entry) + "\n")
+
+    fresh = taskstar.make_task_store(str(tmp_path), "json")
+    complete(fresh, "alice", first)
+    assert fresh.get_rollup("alice") == taskstar.bucket_task_activity(fresh.get_tasks("alice"))
@@ -0,0 +1,40 @@
+import re
+
+import app as taskstar
+
+
+def test_dashboard_shows_every_user_in_order(client):
+    for n in range(12):
+        taskstar.users.add(f"Extra{n:02d}")
+    ranked = list(taskstar.users)[-1]
+    taskstar.get_all_user_data()
+    taskstar.task_store.add_stars(ranked, 7)
+
+    html = client.get("/dashboard").get_data(as_text=True)
+    board = re.findall(r'class="leaderboard-name">([^<]+)<', html)
+    graph = re.findall(r'class="bar-label">([^<]+)<', html)
+    assert board[0] == ranked and sorted(board) == sorted(taskstar.users)
+    assert board[1:] == [name for name in taskstar.users if name != ranked]  # ties keep the users order
+    assert graph == list(taskstar.users)
+
+
+def test_record_skips_an_entry_another_write_moved_on(client, monkeypatch):
+    user = next(iter(taskstar.users))
+    mine = taskstar.task_store.add_task(user, taskstar.new_task("mine", None))
+    theirs = taskstar.task_store.add_task(user, taskstar.new_task("theirs", None))
+    client.get("/api/leaderboard")  # seeds users.json, which moves every version
+    client.get("/api/leaderboard")  # the entry is current
+
+    # Another worker completes a task right before this request's write lands.
+    apply_batch = taskstar.task_store.apply_batch
+
+    def racing_apply_batch(username, operations, award_stars=None):
+        monkeypatch.setattr(taskstar.task_store, "apply_batch", apply_batch)
+        apply_batch(username, [("update", theirs["id"], {"status": "completed", "completed_at": mine["created_at"]}, None)])
+        return apply_batch(username, operations, award_stars)
+    monkeypatch.setattr(taskstar.task_store, "apply_batch", racing_apply_batch)
+
+    assert client.post(f"/complete_task/{user}/{mine['id']}").json["success"]
+    entry = next(entry for entry in client.get("/api/leaderboard?by=weekly_completions").json["entries"]
+                 if entry["user"] == user)
+    assert entry["weekly_completions"] == 2
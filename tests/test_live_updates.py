@@ -0,0 +1,38 @@
+import app as taskstar
+
+THREADED = {"wsgi.multithread": True}
+
+
+def test_sync_workers_get_polling_pages_and_no_stream(client):
+    assert client.get("/events").status_code == 204
+    assert b"false);" in client.get("/").data
+    versions = client.get("/api/versions")
+    assert versions.status_code == 200 and set(versions.json["versions"]) == set(taskstar.users)
+
+
+def test_threaded_servers_stream(client):
+    page = client.get("/", environ_overrides=THREADED)
+    assert b"true);" in page.data
+    response = client.get("/events", environ_overrides=THREADED)
+    assert response.status_code == 200
+    assert next(iter(response.response)).startswith(b"retry:")
+    response.close()
+
+
+def test_live_updates_config_overrides_the_server(client, monkeypatch):
+    monkeypatch.setattr(taskstar, "LIVE_UPDATES", "0")
+    assert client.get("/events", environ_overrides=THREADED).status_code == 204
+    monkeypatch.setattr(taskstar, "LIVE_UPDATES", "1")
+    response = client.get("/events")
+    assert response.status_code == 200
+    response.close()
+
+
+def test_versions_poll_is_conditional(client):
+    first = client.get("/api/versions")
+    assert client.get("/api/versions", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    user = next(iter(taskstar.users))
+    taskstar.task_store.add_task(user, taskstar.new_task("poll me", None))
+    changed = client.get("/api/versions", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.json["versions"][user] == first.json["versions"][user] + 1
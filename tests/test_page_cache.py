@@ -0,0 +1,20 @@
+import app as taskstar
+
+
+def test_a_tenant_reached_two_ways_gets_its_own_prefix(client, monkeypatch):
+    assert taskstar.app.test_cli_runner().invoke(args=["create-tenant", "alpha"]).exit_code == 0
+    monkeypatch.setattr(taskstar, "TENANT_DOMAIN", "example.test")
+    by_prefix = client.get("/t/alpha/")
+    by_subdomain = client.get("/", headers={"Host": "alpha.example.test"})
+    assert b'"/t/alpha"' in by_prefix.data
+    assert b'"/t/alpha"' not in by_subdomain.data
+
+
+def test_index_is_shared_across_admin_mode(client):
+    client.get("/")  # the first request seeds the user data
+    client.get("/")
+    hits = taskstar.page_cache.stats()["hits"]
+    with client.session_transaction() as session:
+        session["is_admin_mode"] = True
+    client.get("/")
+    assert taskstar.page_cache.stats()["hits"] == hits + 1
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import app as taskstar
+
+
+def test_completed_occurrences_stay_done_with_a_short_archive_horizon(client, monkeypatch):
+    monkeypatch.setattr(taskstar, "ARCHIVE_HORIZON_DAYS", 5)
+    today = datetime.now(taskstar.IST).date()
+    user = next(iter(taskstar.users))
+    template = taskstar.task_store.recurring.add(user, taskstar.make_recurring_template(
+        "water the plants", "daily", (today - timedelta(days=30)).isoformat()))
+
+    # The completion window shrinks to the archive horizon.
+    too_old = today - timedelta(days=10)
+    assert taskstar.materialize_occurrence(user, taskstar.occurrence_id(template["id"], too_old),
+                                           f"{too_old.isoformat()}T06:00:00Z") is None
+
+    day = today - timedelta(days=4)
+    task_id = taskstar.occurrence_id(template["id"], day)
+    assert taskstar.materialize_occurrence(user, task_id, f"{day.isoformat()}T06:00:00Z") is not None
+    # Even `archive-tasks --days 1` keeps it while it can still be completed...
+    assert taskstar.archive_old_tasks(user, horizon_days=1) == 0
+    stars = taskstar.get_all_user_data()[user]["stars"]
+    assert client.post(f"/complete_task/{user}/{task_id}").json["success"] is False
+    assert taskstar.get_all_user_data()[user]["stars"] == stars
+
+    # ...and archives it once it can't.
+    later = today + timedelta(days=2)
+    assert taskstar.archive_old_tasks(user, horizon_days=5, today_ist=later) == 1
+    assert taskstar.materialize_occurrence(user, task_id, f"{later.isoformat()}T06:00:00Z", today_ist=later) is None
+
+
+def test_occurrences_count_as_pending_on_their_own_day_only(client):
+    today = datetime.now(taskstar.IST).date()
+    user = next(iter(taskstar.users))
+    template = taskstar.task_store.recurring.add(user, taskstar.make_recurring_template(
+        "stretch", "daily", (today - timedelta(days=4)).isoformat()))
+    late = today - timedelta(days=3)
+    now = datetime.now(taskstar.timezone.utc).isoformat().replace('+00:00', 'Z')
+    assert taskstar.materialize_occurrence(user, taskstar.occurrence_id(template["id"], late), now) is not None
+
+    days = [today - timedelta(days=n) for n in range(5)]
+    rollup = taskstar.pending_counts_as_of(taskstar.task_store.get_rollup(user), days)
+    open_occurrences = taskstar.unmaterialized_pending_counts(user, days)
+    tasks = taskstar.task_store.get_tasks(user)
+    for day in days:
+        # One occurrence a day, whether it was completed late or not at all.
+        assert rollup[day] + open_occurrences[day] == 1
+        assert taskstar.get_pending_tasks_on_date_ist(tasks, day) == (1 if day == late else 0)
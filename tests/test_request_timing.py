@@ -0,0 +1,17 @@
+import os
+
+import app as taskstar
+
+
+def test_aggregation_inside_a_store_call_counts_as_compute(tmp_path):
+    store = taskstar.make_task_store(str(tmp_path), "json")
+    store.save_tasks("alice", [taskstar.new_task(f"task {n}", None) for n in range(50)])
+    os.remove(store.rollup_file("alice"))  # get_rollup rebuilds it from a scan
+
+    timer = taskstar.RequestTimer()
+    token = taskstar._request_timer.set(timer)
+    try:
+        store.get_rollup("alice")
+    finally:
+        taskstar._request_timer.reset(token)
+    assert timer.phases["storage"] > 0 and timer.phases["compute"] > 0
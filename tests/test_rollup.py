@@ -0,0 +1,30 @@
+import app as taskstar
+
+
+def test_rollup_check_flags_drift_and_rollup_rebuild_repairs_it(client):
+    user = next(iter(taskstar.users))
+    runner = taskstar.app.test_cli_runner()
+    task = taskstar.task_store.add_task(user, taskstar.new_task("count me", None))
+    assert runner.invoke(args=["rollup-check", user]).exit_code == 0
+
+    drifted = {day: dict(counts) for day, counts in taskstar.task_store.get_rollup(user).items()}
+    drifted[task.created_date_ist]["created"] += 5
+    with taskstar.task_store.locked(taskstar.user_lock_name(user)):
+        taskstar.task_store._save_rollup(user, drifted)
+    result = runner.invoke(args=["rollup-check", user])
+    assert result.exit_code == 1 and "1 mismatched days" in result.output
+
+    assert runner.invoke(args=["rollup-rebuild", user]).exit_code == 0
+    assert runner.invoke(args=["rollup-check", user]).exit_code == 0
+
+
+def test_rollup_follows_completions_and_deletes(client):
+    user = next(iter(taskstar.users))
+    tasks = [taskstar.task_store.add_task(user, taskstar.new_task(f"task {n}", None)) for n in range(3)]
+    client.post(f"/complete_task/{user}/{tasks[0]['id']}")
+    taskstar.task_store.delete_task(user, tasks[1]["id"])
+    today = tasks[0].created_date_ist
+    rollup = taskstar.task_store.get_rollup(user)
+    assert taskstar.completed_on(rollup, today) == 1
+    assert taskstar.pending_counts_as_of(rollup, [today])[today] == len(
+        [task for task in taskstar.task_store.get_tasks(user) if task.status == "pending"])
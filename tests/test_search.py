@@ -0,0 +1,76 @@
+import pytest
+
+import app as taskstar
+
+
+def found(client, query):
+    return [hit["task"]["description"] for hit in client.get(f"/api/search?q={query}").json["results"]]
+
+
+def test_record_skips_docs_another_write_moved_on(client, monkeypatch):
+    user = next(iter(taskstar.users))
+    with client.session_transaction() as session:
+        session["is_admin_mode"] = True
+    mine = taskstar.task_store.add_task(user, taskstar.new_task("mine", None))
+    theirs = taskstar.task_store.add_task(user, taskstar.new_task("theirs", None))
+    found(client, "mine")
+    found(client, "mine")  # the first request seeds users.json, which moves every version
+
+    # Another worker renames its task right before this request's write lands.
+    apply_batch = taskstar.task_store.apply_batch
+
+    def racing_apply_batch(username, operations, award_stars=None):
+        monkeypatch.setattr(taskstar.task_store, "apply_batch", apply_batch)
+        apply_batch(username, [("update", theirs["id"], {"description": "walk the dog"}, None)])
+        return apply_batch(username, operations, award_stars)
+    monkeypatch.setattr(taskstar.task_store, "apply_batch", racing_apply_batch)
+
+    client.post(f"/update_task/{user}/{mine['id']}", data={"task_description": "feed the cat"})
+    assert found(client, "cat") == ["feed the cat"]
+    assert found(client, "dog") == ["walk the dog"]
+
+
+def test_index_is_rebuilt_periodically(client):
+    user = next(iter(taskstar.users))
+    taskstar.task_store.add_task(user, taskstar.new_task("water the plants", None))
+    assert found(client, "plants") == ["water the plants"]
+    taskstar.search_index._drop_user(user, False)  # drift no version tells about
+    assert found(client, "plants") == []
+    taskstar.search_index._rebuilt_at -= taskstar.SEARCH_MAX_AGE_SECONDS + 1
+    assert found(client, "plants") == ["water the plants"]
+
+
+def add(user, description, **fields):
+    task = taskstar.new_task(description, None)
+    task.update(fields)
+    return taskstar.task_store.add_task(user, task)
+
+
+def test_ranking_weighs_fields_and_whole_words(client):
+    user = next(iter(taskstar.users))
+    add(user, "roses bloom", category="errands")
+    add(user, "call mom", category="bloom")
+    add(user, "read", reflection_note="the bloom was lovely")
+    # Description, category and reflection note weigh 3 : 2 : 1.
+    hits = client.get("/api/search?q=bloom").json["results"]
+    assert [hit["task"]["description"] for hit in hits] == ["roses bloom", "call mom", "read"]
+    assert hits[0]["score"] == pytest.approx(3 * hits[2]["score"], rel=1e-3)
+
+    # A prefix match counts half as much as the whole word.
+    add(user, "garden hose")
+    add(user, "gardening gloves")
+    hits = client.get("/api/search?q=garden").json["results"]
+    assert [hit["task"]["description"] for hit in hits] == ["garden hose", "gardening gloves"]
+    assert hits[0]["score"] == pytest.approx(2 * hits[1]["score"], rel=1e-3)
+
+
+def test_every_query_word_must_match_and_filters_apply(client):
+    first, second = list(taskstar.users)[:2]
+    add(first, "buy milk", category="shopping")
+    add(first, "buy bread", status="completed")
+    add(second, "buy milk and eggs")
+    assert sorted(found(client, "buy mi")) == ["buy milk", "buy milk and eggs"]
+    assert found(client, f"buy&user={second}") == ["buy milk and eggs"]
+    assert found(client, "buy&status=completed") == ["buy bread"]
+    assert found(client, "milk shopping") == ["buy milk"]
+    assert found(client, "m") == []  # one-letter words only match whole words
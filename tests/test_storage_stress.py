@@ -0,0 +1,16 @@
+import pytest
+
+import app as taskstar
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_workers_lose_no_updates(tmp_path, backend):
+    summary, problems = taskstar.run_storage_stress(str(tmp_path), "Veer", workers=4, task_count=40, adds=5,
+                                                    backend=backend)
+    assert problems == [], summary
+
+    store = taskstar.make_task_store(str(tmp_path), backend)
+    tasks = store.get_tasks("Veer")
+    assert len(tasks) == 40 + 4 * 5
+    assert sum(1 for task in tasks if task.status == "completed") == 40
+    assert store.get_user_data()["Veer"]["stars"] == 40 * taskstar.STARS_PER_COMPLETION
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as taskstar
+
+
+def batch(client, user, *operations):
+    return client.post(f"/api/users/{user}/tasks:batch", json={"operations": list(operations)})
+
+
+def stars(user):
+    return taskstar.get_all_user_data()[user]["stars"]
+
+
+def test_batch_reports_each_operation_and_awards_stars_once(client):
+    user = next(iter(taskstar.users))
+    with client.session_transaction() as session:
+        session["is_admin_mode"] = True
+    added = batch(client, user, {"op": "add", "description": "first"}, {"op": "add", "description": "second"})
+    first, second = (result["id"] for result in added.json["results"])
+    before, version = stars(user), taskstar.task_store.get_version(user)
+
+    response = batch(client, user,
+                     {"op": "complete", "id": first},
+                     {"op": "delete", "id": second},
+                     {"op": "complete", "id": first},
+                     {"op": "add", "description": "third"},
+                     {"op": "complete", "id": "no-such-task"},
+                     {"op": "rename", "id": first})
+    assert [result["success"] for result in response.json["results"]] == [True, True, False, True, False, False]
+    assert response.json["stars_awarded"] == taskstar.STARS_PER_COMPLETION
+    assert stars(user) == before + taskstar.STARS_PER_COMPLETION
+    assert taskstar.task_store.get_version(user) == version + 1  # tasks and stars in one write
+
+
+def test_batch_adds_and_deletes_need_admin_mode(client):
+    user = next(iter(taskstar.users))
+    response = batch(client, user, {"op": "add", "description": "sneaky"}, {"op": "delete", "id": "anything"})
+    assert [result["success"] for result in response.json["results"]] == [False, False]
+    assert all("admin mode" in result["message"] for result in response.json["results"])
+    assert not any(task.description == "sneaky" for task in taskstar.task_store.get_tasks(user))
+
+
+def test_batch_completes_recurring_occurrences_like_complete_task(client):
+    user = next(iter(taskstar.users))
+    today = datetime.now(taskstar.IST).date()
+    template = taskstar.task_store.recurring.add(user, taskstar.make_recurring_template(
+        "stretch", "daily", (today - timedelta(days=3)).isoformat()))
+    task_id = taskstar.occurrence_id(template["id"], today - timedelta(days=1))
+    before = stars(user)
+
+    response = batch(client, user, {"op": "complete", "id": task_id}, {"op": "complete", "id": task_id})
+    assert [result["success"] for result in response.json["results"]] == [True, False]
+    assert taskstar.task_store.find_task(user, task_id).status == "completed"
+    assert stars(user) == before + taskstar.STARS_PER_COMPLETION
+    assert client.post(f"/complete_task/{user}/{task_id}").json["success"] is False
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_apply_batch_awards_stars_with_the_write(tmp_path, backend):
+    store = taskstar.make_task_store(str(tmp_path), backend)
+    task = store.add_task("alice", taskstar.new_task("one", None))
+    version = store.get_version("alice")
+    results = store.apply_batch("alice", [("update", task["id"], {"status": "completed"}, "pending"),
+                                          ("delete", "missing")],
+                                award_stars=lambda results: 2 * sum(result is not None for result in results))
+    assert results.stars == 2 and store.get_user_data()["alice"]["stars"] == 2
+    assert store.get_version("alice") == version + 1
+    assert store.apply_batch("alice", [("delete", "missing")], award_stars=lambda results: 0).stars is None
+    assert store.get_version("alice") == version + 1
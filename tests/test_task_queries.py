@@ -0,0 +1,95 @@
+import random
+import sqlite3
+
+import pytest
+
+import app as taskstar
+
+
+def make_store(tmp_path, backend, count=300):
+    store = taskstar.make_task_store(str(tmp_path), backend)
+    rng = random.Random(0)
+    tasks = []
+    for n in range(count):
+        task = taskstar.new_task(f"task {n}", None)
+        task["created_at"] = f"2026-0{rng.randint(1, 9)}-{rng.randint(10, 28)}T00:00:00Z"
+        task["status"] = rng.choice(["pending", "completed", "done_yesterday"])
+        tasks.append(task)
+    store.save_tasks("alice", tasks)
+    return store
+
+
+def all_pages(store, **kwargs):
+    ids, after = [], None
+    while True:
+        page, after = store.query_tasks("alice", after=after, limit=17, **kwargs)
+        ids.extend(task.id for task in page)
+        if after is None:
+            return ids
+
+
+def expected(store, statuses=None, newest_first=False):
+    tasks = [task for task in store.get_tasks("alice") if not statuses or task.status in statuses]
+    return [task.id for task in sorted(tasks, key=taskstar.task_sort_key, reverse=newest_first)]
+
+
+def assert_pages_sorted(store):
+    for statuses in (None, ["pending"], ["pending", "completed"]):
+        for newest_first in (False, True):
+            assert all_pages(store, statuses=statuses, newest_first=newest_first) == \
+                expected(store, statuses, newest_first)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_pages_stay_sorted_across_writes(tmp_path, backend):
+    store = make_store(tmp_path, backend)
+    rng = random.Random(1)
+    assert_pages_sorted(store)
+    for n in range(60):
+        ids = [task.id for task in store.get_tasks("alice")]
+        store.add_task("alice", taskstar.new_task(f"new {n}", None))
+        store.update_task("alice", rng.choice(ids), {"status": rng.choice(["pending", "completed"]),
+                                                     "created_at": f"2026-0{rng.randint(1, 9)}-01T00:00:00Z"})
+        store.delete_task("alice", rng.choice(ids))
+        if n % 10 == 0:
+            assert_pages_sorted(store)
+    assert_pages_sorted(store)
+
+
+def test_json_pages_follow_another_workers_writes(tmp_path):
+    store = make_store(tmp_path, "json")
+    other = taskstar.make_task_store(str(tmp_path), "json")
+    assert_pages_sorted(store)
+    ids = [task.id for task in other.get_tasks("alice")]
+    other.update_task("alice", ids[0], {"status": "pending", "created_at": "2025-01-01T00:00:00Z"})
+    other.add_task("alice", taskstar.new_task("from another worker", None))
+    other.delete_task("alice", ids[1])
+    assert_pages_sorted(store)
+
+
+@pytest.mark.parametrize("query", [
+    {},
+    {"newest_first": True},
+    {"statuses": ["pending"]},
+    {"statuses": ["pending"], "after": ("2026-05-01T00:00:00Z", "x"), "newest_first": True},
+    {"after": ("2026-05-01T00:00:00Z", "x")},
+])
+def test_sqlite_pages_walk_an_index(tmp_path, query):
+    store = make_store(tmp_path, "sqlite", count=10)
+    args = {"statuses": None, "due_from": None, "due_to": None, "category": None, "after": None,
+            "limit": taskstar.TASK_PAGE_SIZE, "newest_first": False, **query}
+    sql, params = store._page_query("alice", **args)
+    plan = " ".join(row[-1] for row in store.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "TEMP B-TREE" not in plan
+    assert "idx_tasks_user_" in plan and "created_id" in plan
+
+
+def test_sqlite_migrates_null_created_at(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / taskstar.SQLITE_FILENAME))
+    conn.executescript(taskstar.SqliteTaskStore.SCHEMA.replace("created_at TEXT NOT NULL DEFAULT ''", "created_at TEXT"))
+    conn.execute("INSERT INTO tasks (user, id, status, created_at, data) VALUES ('alice', 'a', 'pending', NULL, ?)",
+                 ('{"id": "a", "status": "pending", "description": "old"}',))
+    conn.commit()
+    conn.close()
+    store = taskstar.make_task_store(str(tmp_path), "sqlite")
+    assert [task.id for task in store.query_tasks("alice")[0]] == ["a"]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as taskstar
+
+
+@pytest.fixture
+def two_tenants(client):
+    """alpha and beta, each with a user Veer holding one overdue task, so
+    both tenants' version counters move in step."""
+    runner = taskstar.app.test_cli_runner()
+    yesterday = (datetime.now(taskstar.IST).date() - timedelta(days=1)).isoformat()
+    task_ids = {}
+    for tenant, description in (("alpha", "alpha secret plan"), ("beta", "beta groceries")):
+        assert runner.invoke(args=["create-tenant", tenant, "--user", "veer"]).exit_code == 0
+        with client.session_transaction(f"/t/{tenant}/") as session:
+            session["is_admin_mode"] = True
+        client.post(f"/t/{tenant}/add_task/Veer", data={"task_description": description, "task_due_date": yesterday})
+        with taskstar.use_tenant(tenant):
+            task_ids[tenant] = taskstar.task_store.get_tasks("Veer")[0].id
+    with taskstar.use_tenant("alpha"):
+        alpha_versions = taskstar.task_store.get_versions()
+    with taskstar.use_tenant("beta"):
+        assert taskstar.task_store.get_versions() == alpha_versions
+    return task_ids
+
+
+def descriptions(results):
+    return [result["task"]["description"] for result in results]
+
+
+def test_tenants_have_their_own_indexes(two_tenants):
+    for tenant in ("alpha", "beta"):
+        current = taskstar.tenants.get(tenant)
+        assert isinstance(current.leaderboard, taskstar.Leaderboard)
+        assert isinstance(current.search_index, taskstar.SearchIndex)
+        assert isinstance(current.due_index, taskstar.DueIndex)
+        assert isinstance(current.event_broker, taskstar.EventBroker)
+    assert taskstar.tenants.get("alpha").search_index is not taskstar.tenants.get("beta").search_index
+
+
+def test_search_is_per_tenant(client, two_tenants):
+    assert descriptions(client.get("/t/alpha/api/search?q=secret").json["results"]) == ["alpha secret plan"]
+    assert client.get("/t/beta/api/search?q=secret").json["results"] == []
+    assert descriptions(client.get("/t/beta/api/search?q=groceries").json["results"]) == ["beta groceries"]
+
+
+def test_due_dates_are_per_tenant(client, two_tenants):
+    assert descriptions(client.get("/t/alpha/api/overdue").json["tasks"]) == ["alpha secret plan"]
+    assert descriptions(client.get("/t/beta/api/overdue").json["tasks"]) == ["beta groceries"]
+
+
+def test_leaderboard_is_per_tenant(client, two_tenants):
+    def veer_stars(tenant):
+        entries = client.get(f"/t/{tenant}/api/leaderboard?by=stars").json["entries"]
+        return next(entry["stars"] for entry in entries if entry["user"] == "Veer")
+
+    assert veer_stars("alpha") == veer_stars("beta") == 0
+    client.post(f"/t/alpha/complete_task/Veer/{two_tenants['alpha']}")
+    assert veer_stars("alpha") > 0
+    # Catch beta's version up without earning stars, so only the tenant tells them apart.
+    with taskstar.use_tenant("alpha"):
+        target = taskstar.task_store.get_version("Veer")
+    with taskstar.use_tenant("beta"):
+        while taskstar.task_store.get_version("Veer") < target:
+            taskstar.task_store.bump_version("Veer")
+    assert veer_stars("beta") == 0
+
+
+def test_events_are_per_tenant(client, two_tenants):
+    subscriptions = {}
+    for tenant in ("alpha", "beta"):
+        with taskstar.use_tenant(tenant):
+            subscriptions[tenant] = taskstar.event_broker.subscribe()
+    try:
+        client.post(f"/t/alpha/complete_task/Veer/{two_tenants['alpha']}")
+        assert subscriptions["alpha"].get_nowait()["task"]["description"] == "alpha secret plan"
+        assert subscriptions["beta"].empty()
+    finally:
+        for tenant, subscription in subscriptions.items():
+            with taskstar.use_tenant(tenant):
+                taskstar.event_broker.unsubscribe(subscription)